@@ -1,99 +1,360 @@
 import os
+import re
 import requests
 import json
-from typing import Dict, Optional
+import sqlite3
+from typing import Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 import time
-from datetime import datetime, timedelta
 import hashlib
+from urllib.parse import urlparse
+from rate_limiter import AdaptiveLimiter, TokenBucket, backoff_delay
+from explanation_cache import ExplanationCache
+from diff_condenser import condense_diff, estimate_tokens, fallback_explanation
+from http_client import HttpClient
+from metrics import (API_COST, API_REQUESTS, API_RETRIES, API_TOKENS, BUDGET_EXHAUSTED, CACHE_LOOKUPS,
+                     CACHE_TIER_HITS, TRIVIAL_COMMITS, record_count, record_time, timed)
+from model_router import ModelRouter, ModelSpec
+from token_budget import BudgetExceeded, TokenBudget, current_request_budget, reserve
 
 load_dotenv()
 
+SYSTEM_PROMPT = "You are a helpful assistant that explains Git commits in simple terms."
+DEFAULT_MODEL = "gpt-3.5-turbo"
+DIFF_TOKEN_BUDGET = 200  # Estimated tokens of condensed diff sent to the model per commit
+MAX_TOKENS_PER_EXPLANATION = 150
+API_TIMEOUT = (5, 15)  # Connect and read timeouts in seconds for OpenRouter calls
+PROMPT_VERSION = "2"  # Bump when prompts change so stale explanations are not reused
+LEGACY_KEY_PREFIX = "legacy:"
+PATCH_KEY_PREFIX = "patch:"
+# Lines that differ between copies of the same change and are dropped before comparing messages
+MESSAGE_TRAILER = re.compile(
+    r'^(\(cherry picked from commit [0-9a-f]+\)|'
+    r'(signed-off-by|co-authored-by|reviewed-by|acked-by|tested-by|change-id):.*)$',
+    re.IGNORECASE
+)
+
+
+def normalize_message(message: str) -> str:
+    """Normalize a commit message so cherry-picked and rebased copies compare equal"""
+    lines = [line.strip() for line in message.strip().splitlines()]
+    return ' '.join(' '.join(line for line in lines if not MESSAGE_TRAILER.match(line)).split())
+
+
+class ExplanationError(Exception):
+    """Raised when the API could not produce an explanation"""
+    pass
+
 class AIExplainer:
-    def __init__(self):
+    """Explains commits through the OpenRouter chat completion API.
+
+    Each commit is routed to a model by its estimated prompt size. Every
+    request first reserves its estimated tokens and cost in the current
+    request's budget and in the shared ``budget``; the reservation is then
+    settled with the usage the API reports. Commits that don't fit are left
+    unexplained rather than failing the analysis.
+    """
+
+    def __init__(self, rate_limiter: Optional[TokenBucket] = None, max_batch_size: int = 8,
+                 batch_token_budget: int = 3000, cache: Optional[ExplanationCache] = None,
+                 http_client: Optional[HttpClient] = None, max_concurrency: int = 8,
+                 router: Optional[ModelRouter] = None, budget: Optional[TokenBudget] = None,
+                 max_tokens_per_explanation: int = MAX_TOKENS_PER_EXPLANATION):
         self.api_key = os.getenv('OPENROUTER_API_KEY')
         if not self.api_key:
             raise ValueError("OPENROUTER_API_KEY environment variable is not set")
 
         self.cache_dir = os.path.join(os.path.dirname(__file__), 'cache')
-        os.makedirs(self.cache_dir, exist_ok=True)
+        default_cache_path = os.path.join(self.cache_dir, 'explanations.db')
+        self.cache = cache or ExplanationCache(default_cache_path)
+        # Migrate entries from the old one-file-per-commit JSON cache, which lived next to the default database
+        if self.cache.db_path == os.path.abspath(default_cache_path):
+            imported = self.cache.import_legacy_json(self.cache_dir, LEGACY_KEY_PREFIX)
+            if imported:
+                print(f"Imported {imported} legacy cache entries")
+        self.has_legacy_entries = self.cache.has_prefix(LEGACY_KEY_PREFIX)
 
-        self.api_url = "https://openrouter.ai/api/v1/chat/completions"
+        self.api_url = os.getenv("OPENROUTER_API_URL", "https://openrouter.ai/api/v1/chat/completions")
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
             "HTTP-Referer": "http://localhost:8000",
             "X-Title": "CommitMind"
         }
-        self.last_request_time = 0
-        self.min_request_interval = 1  # Minimum time between requests in seconds
+        self.router = router or ModelRouter(ModelSpec(DEFAULT_MODEL))
+        self.model = self.router.small.name  # Default model; see _model_for
+        self.budget = budget
+        self.max_tokens_per_explanation = max_tokens_per_explanation
+        # Pooled keep-alive connections, shared with other callers when provided
+        self.http_client = http_client or HttpClient(timeouts={urlparse(self.api_url).hostname: API_TIMEOUT})
+        # Batched prompts are capped by commit count and estimated input tokens
+        self.max_batch_size = max_batch_size
+        self.batch_token_budget = batch_token_budget
+
+        # Shared across worker threads; defaults to one request per second
+        self.rate_limiter = rate_limiter or TokenBucket(rate=1, capacity=1)
+        # Adapts concurrency to the provider's responses within the rate limit
+        self.limiter = AdaptiveLimiter(self.rate_limiter, max_concurrency=max_concurrency)
+
+    def _commit_tokens(self, commit_data: Dict) -> int:
+        """Estimated prompt tokens of a commit's message and condensed diff"""
+        return self._estimate_tokens(commit_data['message']) + self._estimate_tokens(self._prepare_diff(commit_data))
+
+    def _model_for(self, commit_data: Dict) -> ModelSpec:
+        """The model that explains a commit"""
+        return self.router.route(self._commit_tokens(commit_data))
 
     def _get_cache_key(self, commit_data: Dict) -> str:
-        """Generate a unique cache key for a commit"""
+        """Generate a cache key from the commit hash, prompt version and model"""
+        return f"{commit_data['hash']}:{PROMPT_VERSION}:{self._model_for(commit_data).name}"
+
+    def _get_patch_cache_key(self, commit_data: Dict) -> Optional[str]:
+        """Content key shared by every copy of a change: its patch id plus the normalized message.
+
+        Returns None for commits without a patch id (empty or truncated diffs).
+        """
+        if not commit_data.get('patch_id') or commit_data.get('diff_truncated'):
+            return None
+        message_hash = hashlib.sha1(normalize_message(commit_data['message']).encode()).hexdigest()
+        return f"{PATCH_KEY_PREFIX}{commit_data['patch_id']}:{message_hash}:{PROMPT_VERSION}:" \
+            f"{self._model_for(commit_data).name}"
+
+    def _get_legacy_cache_key(self, commit_data: Dict) -> Optional[str]:
+        """Key used by the old JSON file cache, kept so imported entries stay reachable.
+
+        The old key hashed the full diff text, which condensed commits no
+        longer carry; they are found through the SHA and patch id keys instead.
+        """
+        if 'diff' not in commit_data:
+            return None
         content = f"{commit_data['hash']}{commit_data['message']}{commit_data['diff']}"
-        return hashlib.md5(content.encode()).hexdigest()
+        return LEGACY_KEY_PREFIX + hashlib.md5(content.encode()).hexdigest()
 
     def _get_cached_response(self, cache_key: str) -> Optional[str]:
         """Get cached response if it exists and is not expired"""
-        cache_file = os.path.join(self.cache_dir, f"{cache_key}.json")
-        if os.path.exists(cache_file):
-            try:
-                with open(cache_file, 'r') as f:
-                    cached_data = json.load(f)
-                    # Check if cache is still valid (24 hours)
-                    if datetime.fromisoformat(cached_data['timestamp']) > datetime.now() - timedelta(hours=24):
-                        return cached_data['explanation']
-            except (json.JSONDecodeError, KeyError, ValueError):
-                # If cache file is corrupted, ignore it
-                pass
-        return None
-
-    def _cache_response(self, cache_key: str, explanation: str):
+        try:
+            return self.cache.get(cache_key)
+        except sqlite3.Error as e:
+            print(f"Warning: Failed to read cache: {str(e)}")
+            return None
+
+    def _cache_response(self, commit_data: Dict, explanation: str):
         """Cache the response"""
-        cache_file = os.path.join(self.cache_dir, f"{cache_key}.json")
-        cache_data = {
-            'timestamp': datetime.now().isoformat(),
-            'explanation': explanation
-        }
+        self._cache_responses([(commit_data, explanation)])
+
+    def _cache_responses(self, explained: List[Tuple[Dict, str]]):
+        """Cache several responses in a single transaction"""
+        entries = []
+        for commit, explanation in explained:
+            entries.append((self._get_cache_key(commit), commit['hash'], explanation))
+            patch_key = self._get_patch_cache_key(commit)
+            if patch_key:
+                entries.append((patch_key, commit['hash'], explanation))
         try:
-            with open(cache_file, 'w') as f:
-                json.dump(cache_data, f)
-        except Exception as e:
+            self.cache.put_many(entries)
+        except sqlite3.Error as e:
             print(f"Warning: Failed to cache response: {str(e)}")
 
+    def get_cached_explanations(self, commits: List[Dict], record_stats: bool = True) -> Dict[str, str]:
+        """Look up cached explanations for a whole commit list, keyed by commit hash.
+
+        Trivial commits (see commit_classifier) are answered from their
+        template without touching the cache. For the others the content tier
+        (patch id plus message) is consulted first, so the same change under
+        another SHA in a fork, cherry-pick or rebase is reused; then the SHA
+        tier and the legacy entries. Trivial commits, hits and misses are
+        counted in the metrics unless ``record_stats`` is False, which callers
+        use when re-checking commits already counted.
+        """
+        tiers = [('patch_id', self._get_patch_cache_key), ('sha', self._get_cache_key)]
+        if self.has_legacy_entries:
+            tiers.append(('legacy', self._get_legacy_cache_key))
+
+        trivial = {commit['hash']: commit['trivial'] for commit in commits if commit.get('trivial')}
+        cached: Dict[str, str] = {commit_hash: entry['explanation'] for commit_hash, entry in trivial.items()}
+        tier_hits: Dict[str, int] = {}
+        try:
+            with timed('cache_lookup'):
+                for tier, get_key in tiers:
+                    keys = {}
+                    for commit in commits:
+                        if commit['hash'] not in cached:
+                            key = get_key(commit)
+                            if key:
+                                keys[key] = commit
+                    if not keys:
+                        continue
+                    for key, explanation in self.cache.get_many(list(keys)).items():
+                        if keys[key]['hash'] not in cached:
+                            cached[keys[key]['hash']] = explanation
+                            tier_hits[tier] = tier_hits.get(tier, 0) + 1
+        except sqlite3.Error as e:
+            print(f"Warning: Failed to read cache: {str(e)}")
+            cached = {commit_hash: entry['explanation'] for commit_hash, entry in trivial.items()}
+            tier_hits = {}
+
+        if record_stats:
+            for entry in trivial.values():
+                record_count(TRIVIAL_COMMITS, 'trivial_commits', category=entry['category'])
+            looked_up = {commit['hash'] for commit in commits} - set(trivial)
+            hits = len(looked_up & set(cached))
+            record_count(CACHE_LOOKUPS, 'cache_hits', hits, result='hit')
+            record_count(CACHE_LOOKUPS, 'cache_misses', len(looked_up) - hits, result='miss')
+            for tier, count in tier_hits.items():
+                record_count(CACHE_TIER_HITS, f'{tier}_hits', count, tier=tier)
+        return cached
+
     def _rate_limit(self):
-        """Implement rate limiting"""
-        current_time = time.time()
-        time_since_last_request = current_time - self.last_request_time
-        if time_since_last_request < self.min_request_interval:
-            sleep_time = self.min_request_interval - time_since_last_request
-            time.sleep(sleep_time)
-        self.last_request_time = time.time()
+        """Wait until the adaptive limiter lets another request through"""
+        wait = self.limiter.acquire()
+        if wait >= 0.001:
+            record_time('rate_limit_wait', wait)
+
+    def get_cached_explanation(self, commit_data: Dict) -> Optional[str]:
+        """Return the cached explanation for a commit without calling the API"""
+        return self.get_cached_explanations([commit_data]).get(commit_data['hash'])
+
+    def _prepare_diff(self, commit_data: Dict) -> str:
+        """Return the condensed diff for the prompt, condensing on demand if needed"""
+        if 'diff_summary' in commit_data:
+            return commit_data['diff_summary']
+        return condense_diff(commit_data.get('diff', ''), DIFF_TOKEN_BUDGET)['text']
+
+    def _estimate_tokens(self, text: str) -> int:
+        """Rough token estimate (about four characters per token)"""
+        return estimate_tokens(text)
+
+    def _complete(self, payload: Dict, label: str, model: ModelSpec) -> str:
+        """Send a chat completion request within the token budgets and return the message content.
+
+        The prompt's estimated tokens plus ``max_tokens`` are reserved
+        before sending and replaced by the reported usage afterwards.
+        Raises BudgetExceeded, without calling the API, when the request
+        doesn't fit a budget, and ExplanationError when it fails.
+        """
+        prompt_tokens = sum(self._estimate_tokens(message['content']) for message in payload['messages'])
+        estimate = prompt_tokens + payload['max_tokens']
+        try:
+            reservation = reserve([current_request_budget(), self.budget], estimate, model.cost(estimate))
+        except BudgetExceeded as e:
+            print(f"Skipping API request for {label}: {str(e)}")
+            record_count(BUDGET_EXHAUSTED, 'budget_exhausted', scope=e.scope)
+            raise
+
+        try:
+            content, usage = self._request_completion(payload, label)
+        except Exception:
+            reservation.release()
+            raise
+
+        # Fall back to estimates if the provider doesn't report usage
+        prompt_tokens = usage.get('prompt_tokens') or prompt_tokens
+        completion_tokens = usage.get('completion_tokens') or self._estimate_tokens(content)
+        cost = model.cost(prompt_tokens + completion_tokens)
+        reservation.settle(prompt_tokens + completion_tokens, cost)
+        record_count(API_TOKENS, 'prompt_tokens', prompt_tokens, model=model.name, kind='prompt')
+        record_count(API_TOKENS, 'completion_tokens', completion_tokens, model=model.name, kind='completion')
+        record_count(API_COST, 'cost_usd', cost, model=model.name)
+        return content
+
+    def _request_completion(self, payload: Dict, label: str) -> Tuple[str, Dict]:
+        """Send a chat completion request with retries and return the message content and usage.
+
+        Every response is reported to the adaptive limiter, which holds back
+        all workers after a 429 or an exhausted quota, so a rate-limited
+        request is retried without sleeping here. Timeouts and other errors
+        are retried after a jittered exponential backoff.
+        Raises ExplanationError with a user-facing message when every attempt fails.
+        """
+        max_retries = 3
+        base_delay = 2
+        for attempt in range(max_retries):
+            self._rate_limit()  # Apply rate limiting
+            status, headers, delay = None, None, None
+            unreachable = False  # Timed out or couldn't connect, a sign of overload
+            try:
+                print(f"Making API request for {label} (attempt {attempt + 1}/{max_retries})")
+
+                with timed('api_request'):
+                    response = self.http_client.post(
+                        self.api_url,
+                        headers=self.headers,
+                        json=payload
+                    )
+                status, headers = response.status_code, response.headers
+                record_count(API_REQUESTS, 'api_requests', status=response.status_code)
+
+                if response.status_code == 429:  # Rate limit exceeded
+                    record_count(API_RETRIES, 'rate_limited', reason='rate_limited')
+                    print(f"Rate limit exceeded for {label}, retrying when the quota resets")
+                    continue
+
+                response.raise_for_status()
+                data = response.json()
+                content = data['choices'][0]['message']['content']
+                print(f"Got response for {label}")
+                return content, data.get('usage') or {}
+
+            except requests.exceptions.Timeout:
+                unreachable = True
+                print(f"Request timed out for {label}")
+                record_count(API_REQUESTS, 'api_timeouts', status='timeout')
+                if attempt == max_retries - 1:
+                    raise ExplanationError("Error: Request timed out. Please try again later.")
+                record_count(API_RETRIES, 'retries', reason='timeout')
+                delay = backoff_delay(attempt, base_delay)
+
+            except requests.exceptions.RequestException as e:
+                unreachable = isinstance(e, requests.exceptions.ConnectionError)
+                print(f"API request failed for {label}: {str(e)}")
+                if attempt == max_retries - 1:
+                    raise ExplanationError(f"Error: Could not generate explanation. {str(e)}")
+                record_count(API_RETRIES, 'retries', reason='error')
+                delay = backoff_delay(attempt, base_delay)
+
+            except Exception as e:
+                print(f"Unexpected error for {label}: {str(e)}")
+                raise ExplanationError("Error: An unexpected error occurred. Please try again later.")
+
+            finally:
+                if status is None and not unreachable:
+                    # Failed before getting a response, which says nothing about the provider's load
+                    self.limiter.cancel()
+                else:
+                    self.limiter.release(status, headers)
+
+            # Back off outside the limiter so the wait doesn't hold a concurrency slot
+            print(f"Retrying in {delay:.1f} seconds...")
+            with timed('retry_wait'):
+                time.sleep(delay)
+
+        raise ExplanationError("Error: Rate limit exceeded. Please try again later.")
 
     def explain_commit(self, commit_data: Dict) -> str:
         """Generate an explanation for a commit using OpenRouter API with caching and improved error handling"""
         # Check cache first
-        cache_key = self._get_cache_key(commit_data)
-        cached_response = self._get_cached_response(cache_key)
+        cached_response = self.get_cached_explanation(commit_data)
         if cached_response:
             print(f"Using cached response for commit {commit_data['hash'][:7]}")
             return cached_response
+        return self._explain_single(commit_data) or fallback_explanation(commit_data)
 
-        # Limit the diff size to avoid token limits
-        diff = commit_data['diff']
-        if len(diff) > 500:
-            diff = diff[:500] + "\n... (diff truncated for length)"
+    def _explain_single(self, commit_data: Dict) -> Optional[str]:
+        """Explain one commit with its own request, without checking the cache.
 
+        Returns None when the request doesn't fit the token budgets.
+        """
+        model = self._model_for(commit_data)
         content = f"""Briefly explain this Git commit (2-3 sentences max):
 Commit: {commit_data['message']}
-Changes: {diff}"""
+Changes: {self._prepare_diff(commit_data)}"""
 
         payload = {
-            "model": "gpt-3.5-turbo",
+            "model": model.name,
             "messages": [
                 {
                     "role": "system",
-                    "content": "You are a helpful assistant that explains Git commits in simple terms."
+                    "content": SYSTEM_PROMPT
                 },
                 {
                     "role": "user",
@@ -101,55 +362,147 @@ Changes: {diff}"""
                 }
             ],
             "temperature": 0.3,
-            "max_tokens": 150
+            "max_tokens": self.max_tokens_per_explanation
         }
 
-        max_retries = 3
-        base_delay = 2
-        for attempt in range(max_retries):
-            try:
-                self._rate_limit()  # Apply rate limiting
-                print(f"Making API request for commit {commit_data['hash'][:7]} (attempt {attempt + 1}/{max_retries})")
+        try:
+            explanation = self._complete(payload, f"commit {commit_data['hash'][:7]}", model)
+        except BudgetExceeded:
+            return None
+        except ExplanationError as e:
+            return str(e)
 
-                response = requests.post(
-                    self.api_url,
-                    headers=self.headers,
-                    json=payload,
-                    timeout=15
-                )
+        # Cache successful response
+        self._cache_response(commit_data, explanation)
+        return explanation
 
-                if response.status_code == 429:  # Rate limit exceeded
-                    retry_after = int(response.headers.get('Retry-After', base_delay * (attempt + 1)))
-                    print(f"Rate limit exceeded. Waiting {retry_after} seconds...")
-                    time.sleep(retry_after)
-                    continue
+    def plan_batches(self, commits: List[Dict]) -> List[List[Dict]]:
+        """Group commits into batches that fit the prompt context budget.
 
-                response.raise_for_status()
-                explanation = response.json()['choices'][0]['message']['content']
+        Commits routed to different models never share a batch. Within each
+        model, commits are packed in order; a batch is closed when adding the
+        next commit would exceed either ``batch_token_budget`` or
+        ``max_batch_size``.
+        """
+        by_model: Dict[str, List[Tuple[Dict, int]]] = {}
+        for commit in commits:
+            tokens = self._commit_tokens(commit)
+            by_model.setdefault(self.router.route(tokens).name, []).append((commit, tokens))
 
-                # Cache successful response
-                self._cache_response(cache_key, explanation)
-                print(f"Got response for commit {commit_data['hash'][:7]}")
-                return explanation
+        batches: List[List[Dict]] = []
+        for sized in by_model.values():
+            current: List[Dict] = []
+            current_tokens = 0
+            for commit, tokens in sized:
+                if current and (current_tokens + tokens > self.batch_token_budget
+                                or len(current) >= self.max_batch_size):
+                    batches.append(current)
+                    current, current_tokens = [], 0
+                current.append(commit)
+                current_tokens += tokens
+            if current:
+                batches.append(current)
+        return batches
 
-            except requests.exceptions.Timeout:
-                print(f"Request timed out for commit {commit_data['hash'][:7]}")
-                if attempt < max_retries - 1:
-                    delay = base_delay * (2 ** attempt)  # Exponential backoff
-                    print(f"Retrying in {delay} seconds...")
-                    time.sleep(delay)
-                    continue
-                return "Error: Request timed out. Please try again later."
+    def _parse_batch_response(self, content: str, ids: List[str]) -> Dict[str, str]:
+        """Map commit ids to explanations from a batched JSON response"""
+        content = content.strip()
+        # Some models wrap JSON in a Markdown code fence despite the instructions
+        if content.startswith('```'):
+            content = content.strip('`')
+            if content.startswith('json'):
+                content = content[4:]
+        data = json.loads(content)
+        entries = data.get('explanations', []) if isinstance(data, dict) else data
 
-            except requests.exceptions.RequestException as e:
-                print(f"API request failed for commit {commit_data['hash'][:7]}: {str(e)}")
-                if attempt < max_retries - 1:
-                    delay = base_delay * (2 ** attempt)  # Exponential backoff
-                    print(f"Retrying in {delay} seconds...")
-                    time.sleep(delay)
-                    continue
-                return f"Error: Could not generate explanation. {str(e)}"
+        explanations = {}
+        for entry in entries:
+            commit_id = str(entry.get('id', ''))
+            explanation = entry.get('explanation')
+            if commit_id in ids and isinstance(explanation, str) and explanation.strip():
+                explanations[commit_id] = explanation.strip()
+        return explanations
 
-            except Exception as e:
-                print(f"Unexpected error for commit {commit_data['hash'][:7]}: {str(e)}")
-                return "Error: An unexpected error occurred. Please try again later."
\ No newline at end of file
+    def _explain_batch(self, commits: List[Dict]) -> Dict[str, str]:
+        """Explain several commits with one request, returning explanations by commit hash.
+
+        The commits must share a model, as batches from plan_batches do.
+        Returns an empty dict when the response can't be parsed; raises
+        BudgetExceeded and ExplanationError like _complete.
+        """
+        model = self._model_for(commits[0])
+        ids = [commit['hash'][:12] for commit in commits]
+        sections = []
+        for commit_id, commit in zip(ids, commits):
+            sections.append(f"""### id: {commit_id}
+Commit: {commit['message']}
+Changes: {self._prepare_diff(commit)}""")
+
+        content = f"""Briefly explain each of the following Git commits (2-3 sentences max each).
+Respond with only a JSON object of the form {{"explanations": [{{"id": "<id>", "explanation": "<text>"}}]}}, with one entry per commit id.
+
+""" + "\n\n".join(sections)
+
+        payload = {
+            "model": model.name,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": SYSTEM_PROMPT
+                },
+                {
+                    "role": "user",
+                    "content": content
+                }
+            ],
+            "temperature": 0.3,
+            "max_tokens": self.max_tokens_per_explanation * len(commits),
+            "response_format": {"type": "json_object"}
+        }
+
+        response = self._complete(payload, f"batch of {len(commits)} commits", model)
+        try:
+            explanations = self._parse_batch_response(response, ids)
+        except (ValueError, AttributeError, TypeError) as e:
+            print(f"Could not parse batch response, falling back to single requests: {str(e)}")
+            return {}
+
+        return {commit['hash']: explanations[commit_id]
+                for commit_id, commit in zip(ids, commits) if commit_id in explanations}
+
+    def explain_commits(self, commits: List[Dict], record_stats: bool = True) -> List[Optional[str]]:
+        """Explain a list of commits, packing cache misses into batched requests.
+
+        Results are returned in input order. Commits missing from a batched
+        response, or whose response couldn't be parsed, are retried
+        individually. When a batch request fails, each of its commits gets
+        the error; when it doesn't fit the token budgets they get None,
+        without spending more requests one commit at a time.
+        """
+        cached = self.get_cached_explanations(commits, record_stats)
+        results: List[Optional[str]] = [cached.get(commit['hash']) for commit in commits]
+        misses = [commit for commit in commits if commit['hash'] not in cached]
+
+        explained: Dict[str, Optional[str]] = {}
+        for batch in self.plan_batches(misses):
+            if len(batch) == 1:
+                continue
+            try:
+                batch_results = self._explain_batch(batch)
+            except BudgetExceeded:
+                explained.update((commit['hash'], None) for commit in batch)
+                continue
+            except ExplanationError as e:
+                explained.update((commit['hash'], str(e)) for commit in batch)
+                continue
+            self._cache_responses([(commit, batch_results[commit['hash']])
+                                   for commit in batch if commit['hash'] in batch_results])
+            explained.update(batch_results)
+
+        for i, commit in enumerate(commits):
+            if results[i] is None:
+                if commit['hash'] in explained:
+                    results[i] = explained[commit['hash']]
+                else:
+                    results[i] = self._explain_single(commit)
+        return results
@@ -0,0 +1,78 @@
+import os
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    repo_key TEXT PRIMARY KEY,
+    version TEXT NOT NULL,
+    head TEXT NOT NULL,
+    results TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_analyses_updated_at ON analyses (updated_at);
+"""
+
+
+class AnalysisIndex:
+    """SQLite-backed record of the last analysis of each repository.
+
+    For every repository it keeps the HEAD that was analyzed and the
+    successful per-commit results, so a later request only has to read and
+    explain commits that are not in the stored set. Entries written with a
+    different ``version`` (prompt version and model) are ignored, entries
+    expire after ``ttl_seconds``, and only the ``max_repos`` most recently
+    updated repositories are kept.
+    """
+
+    def __init__(self, db_path: str, ttl_seconds: float = 24 * 3600, max_repos: int = 10000):
+        self.db_path = os.path.abspath(db_path)
+        self.ttl_seconds = ttl_seconds
+        self.max_repos = max_repos
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, repo_key: str, version: str) -> Optional[Dict]:
+        """Return {'head', 'results'} for the repository, with results keyed by commit hash"""
+        row = self._connect().execute(
+            "SELECT head, results FROM analyses WHERE repo_key = ? AND version = ? AND updated_at > ?",
+            (repo_key, version, time.time() - self.ttl_seconds)
+        ).fetchone()
+        if row is None:
+            return None
+        try:
+            results = json.loads(row[1])
+        except ValueError:
+            return None
+        return {'head': row[0], 'results': {result['hash']: result for result in results}}
+
+    def put(self, repo_key: str, version: str, head: str, results: List[Dict]):
+        """Replace the stored analysis of a repository"""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO analyses (repo_key, version, head, results, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (repo_key, version, head, json.dumps(results), time.time())
+            )
+            conn.execute(
+                "DELETE FROM analyses WHERE updated_at <= ? OR repo_key IN ("
+                "SELECT repo_key FROM analyses ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (time.time() - self.ttl_seconds, self.max_repos)
+            )
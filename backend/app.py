@@ -1,53 +1,231 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-from git_parser import GitParser
-from ai_explainer import AIExplainer
+from analysis_index import AnalysisIndex
+from explain_scheduler import collect_errors
+from repo_cache import CLONE_STRATEGIES, GitError, is_local_source, normalize_repo_url, resolve_local_source
+from jobs import Job, JobManager, JobStore
+from lazy import Lazy
+from result_cache import ResultCache, etag_matches
+from diff_condenser import condense_commits
+from metrics import ANALYSES, REGISTRY, RESULT_CACHE_LOOKUPS, Gauge, timed, track_request
+from token_budget import request_budget
 import os
+import json
+import base64
+import hashlib
 import traceback
 import socket
-from typing import Optional, List, Dict, Tuple
+from typing import Optional, List, Dict, Iterator, Tuple
 from urllib.parse import urlparse
 import re
-import requests
+import threading
 from dotenv import load_dotenv
 import atexit
 
 # Load environment variables
 load_dotenv()
 
-app = Flask(__name__)
-CORS(app)
+api = Blueprint('api', __name__)
 
-# Rate limiting configuration
+# Rate limiting configuration; in-memory counters are kept by each server worker on its
+# own, so several workers need shared storage (e.g. redis://localhost:6379, see create_app)
+RATELIMIT_STORAGE_URI = os.getenv('RATELIMIT_STORAGE_URI', 'memory://')
+RATELIMIT_ENABLED = os.getenv('RATELIMIT_ENABLED', 'true').lower() != 'false'
 limiter = Limiter(
-    app=app,
     key_func=get_remote_address,
-    default_limits=["100 per day", "10 per hour"]
+    default_limits=["100 per day", "10 per hour"],
+    storage_uri=RATELIMIT_STORAGE_URI,
+    enabled=RATELIMIT_ENABLED
 )
 
 # Configuration
 DEFAULT_PORT = 5001
 MAX_PORT_ATTEMPTS = 10
-MAX_COMMITS = 20  # Maximum number of commits to analyze
+MAX_COMMITS = 20  # Maximum number of commits to analyze per page
+MAX_HISTORY_DEPTH = int(os.getenv('MAX_HISTORY_DEPTH', '5000'))  # How far shallow mirrors may be deepened
+REPO_CACHE_DIR = os.getenv('REPO_CACHE_DIR')  # Defaults to ../repo_cache
+REPO_CACHE_MAX_BYTES = int(os.getenv('REPO_CACHE_MAX_MB', '2048')) * 1024 * 1024
+CLONE_STRATEGY = os.getenv('CLONE_STRATEGY', 'full')  # full, blobless or treeless
+# Directories whose repositories and .bundle files may be analyzed by path; empty disables local sources
+ALLOWED_LOCAL_ROOTS = [root for root in os.getenv('ALLOWED_LOCAL_ROOTS', '').split(os.pathsep) if root]
+EXPLAIN_WORKERS = int(os.getenv('EXPLAIN_WORKERS', '4'))  # Concurrent OpenRouter calls
+OPENROUTER_RATE_LIMIT = float(os.getenv('OPENROUTER_RATE_LIMIT', '2'))  # Requests per second
+OPENROUTER_RATE_BURST = int(os.getenv('OPENROUTER_RATE_BURST', '4'))
+# Prompts estimated at LARGE_MODEL_MIN_TOKENS or more go to the large model, if one is set
+OPENROUTER_MODEL = os.getenv('OPENROUTER_MODEL', 'gpt-3.5-turbo')
+OPENROUTER_LARGE_MODEL = os.getenv('OPENROUTER_LARGE_MODEL')
+LARGE_MODEL_MIN_TOKENS = int(os.getenv('LARGE_MODEL_MIN_TOKENS', '400'))
+OPENROUTER_MODEL_PRICE = float(os.getenv('OPENROUTER_MODEL_PRICE', '0'))  # USD per million tokens
+OPENROUTER_LARGE_MODEL_PRICE = float(os.getenv('OPENROUTER_LARGE_MODEL_PRICE', '0'))
+EXPLANATION_MAX_TOKENS = int(os.getenv('EXPLANATION_MAX_TOKENS', '150'))  # Completion tokens per commit
+# Token and cost budgets per analysis and per period (0 = unlimited); commits
+# that don't fit get a summary of their commit message instead
+REQUEST_TOKEN_BUDGET = int(os.getenv('REQUEST_TOKEN_BUDGET', '0'))
+REQUEST_COST_BUDGET = float(os.getenv('REQUEST_COST_BUDGET', '0'))
+PERIOD_TOKEN_BUDGET = int(os.getenv('PERIOD_TOKEN_BUDGET', '0'))
+PERIOD_COST_BUDGET = float(os.getenv('PERIOD_COST_BUDGET', '0'))
+BUDGET_PERIOD = float(os.getenv('BUDGET_PERIOD_HOURS', '24')) * 3600
+# Server processes sharing the OpenRouter budget; set by gunicorn.conf.py
+SERVER_WORKERS = max(1, int(os.getenv('SERVER_WORKERS', '1')))
+EXPLANATION_CACHE_PATH = os.getenv('EXPLANATION_CACHE_PATH',
+                                   os.path.join(os.path.dirname(__file__), 'cache', 'explanations.db'))
+EXPLANATION_CACHE_TTL = float(os.getenv('EXPLANATION_CACHE_TTL_HOURS', '24')) * 3600
+EXPLANATION_CACHE_MAX_ENTRIES = int(os.getenv('EXPLANATION_CACHE_MAX_ENTRIES', '100000'))
+ANALYSIS_INDEX_PATH = os.getenv('ANALYSIS_INDEX_PATH',
+                                os.path.join(os.path.dirname(__file__), 'cache', 'analysis_index.db'))
+RESULT_CACHE_PATH = os.getenv('RESULT_CACHE_PATH',
+                              os.path.join(os.path.dirname(__file__), 'cache', 'results.db'))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv('RESULT_CACHE_MAX_ENTRIES', '1000'))
+ANALYSIS_WORKERS = int(os.getenv('ANALYSIS_WORKERS', '2'))  # Concurrent background jobs
+JOB_TTL = float(os.getenv('JOB_TTL_SECONDS', '3600'))  # How long finished jobs are kept
+JOB_STORE_PATH = os.getenv('JOB_STORE_PATH', os.path.join(os.path.dirname(__file__), 'cache', 'jobs.db'))
+# Repositories whose default view is kept warm in the background (comma-separated URLs or
+# local paths under ALLOWED_LOCAL_ROOTS); empty disables warming
+WATCH_REPOS = [repo.strip() for repo in os.getenv('WATCH_REPOS', '').split(',') if repo.strip()]
+WARM_INTERVAL = float(os.getenv('WARM_INTERVAL_MINUTES', '15')) * 60
+# Cached analyses older than this fraction of EXPLANATION_CACHE_TTL_HOURS are refreshed before they expire
+WARM_REFRESH_AFTER = float(os.getenv('WARM_REFRESH_AFTER', '0.75'))
+WARM_WORKERS = int(os.getenv('WARM_WORKERS', '2'))  # Watched repositories warmed at once
+WARM_EXPLAIN_WORKERS = int(os.getenv('WARM_EXPLAIN_WORKERS', '2'))  # Concurrent OpenRouter calls for warming
+# Share of the OpenRouter rate limit set aside for warming; requests get the rest
+WARM_RATE_SHARE = float(os.getenv('WARM_RATE_SHARE', '0.25')) if WATCH_REPOS else 0.0
+WARM_LOCK_PATH = os.path.join(os.path.dirname(os.path.abspath(RESULT_CACHE_PATH)), 'warmer.lock')
+DIFF_TOKEN_BUDGET = int(os.getenv('DIFF_TOKEN_BUDGET', '200'))  # Condensed diff size per commit
+# Explain merges, version bumps, lockfile, whitespace and typo commits from templates instead of the API
+TEMPLATE_TRIVIAL_COMMITS = os.getenv('TEMPLATE_TRIVIAL_COMMITS', 'true').lower() != 'false'
+MAX_DIFF_BYTES = int(os.getenv('MAX_DIFF_KB', '256')) * 1024  # Raw diff kept per commit
+MAX_REQUEST_DIFF_BYTES = int(os.getenv('MAX_REQUEST_DIFF_KB', '4096')) * 1024  # Raw diff kept per request
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '10'))  # Keep-alive connections per host
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+OPENROUTER_TIMEOUT = float(os.getenv('OPENROUTER_TIMEOUT', '15'))  # Read timeout for completions
+GITHUB_TIMEOUT = float(os.getenv('GITHUB_TIMEOUT', '10'))
 GITHUB_CLIENT_ID = os.getenv('GITHUB_CLIENT_ID')
 GITHUB_CLIENT_SECRET = os.getenv('GITHUB_CLIENT_SECRET')
 
 if not GITHUB_CLIENT_ID or not GITHUB_CLIENT_SECRET:
     print("Warning: GitHub OAuth credentials not configured. Private repository analysis will be disabled.")
 
-git_parser = GitParser()
-ai_explainer = AIExplainer()
+# Services are built on first use, so importing this module (and booting a
+# worker) doesn't load GitPython or requests, touch the disk or need an API key.
+# The factories import their modules themselves for the same reason.
+
+def create_git_parser():
+    from git_parser import GitParser
+    return GitParser(mirror_dir=REPO_CACHE_DIR, mirror_max_bytes=REPO_CACHE_MAX_BYTES,
+                     clone_strategy=CLONE_STRATEGY, max_history_depth=MAX_HISTORY_DEPTH,
+                     allowed_local_roots=ALLOWED_LOCAL_ROOTS)
+
+def create_http_client():
+    from http_client import HttpClient
+    return HttpClient(pool_size=HTTP_POOL_SIZE, timeouts={
+        'openrouter.ai': (HTTP_CONNECT_TIMEOUT, OPENROUTER_TIMEOUT),
+        'github.com': (HTTP_CONNECT_TIMEOUT, GITHUB_TIMEOUT),
+        'api.github.com': (HTTP_CONNECT_TIMEOUT, GITHUB_TIMEOUT),
+    }, default_timeout=(HTTP_CONNECT_TIMEOUT, OPENROUTER_TIMEOUT))
+
+def create_period_budget():
+    from token_budget import TokenBudget
+    # Each worker process gets an equal share; its requests and warming draw from the same budget
+    return TokenBudget(PERIOD_TOKEN_BUDGET // SERVER_WORKERS, PERIOD_COST_BUDGET / SERVER_WORKERS, BUDGET_PERIOD)
+
+def build_ai_explainer(rate_limit: float, rate_burst: int, max_concurrency: int):
+    """An explainer with its own share of the OpenRouter rate limit"""
+    from ai_explainer import AIExplainer
+    from explanation_cache import ExplanationCache
+    from model_router import ModelRouter, ModelSpec
+    from rate_limiter import TokenBucket
+    cache = ExplanationCache(EXPLANATION_CACHE_PATH, ttl_seconds=EXPLANATION_CACHE_TTL,
+                             max_entries=EXPLANATION_CACHE_MAX_ENTRIES)
+    router = ModelRouter(ModelSpec(OPENROUTER_MODEL, OPENROUTER_MODEL_PRICE),
+                         ModelSpec(OPENROUTER_LARGE_MODEL, OPENROUTER_LARGE_MODEL_PRICE)
+                         if OPENROUTER_LARGE_MODEL else None, LARGE_MODEL_MIN_TOKENS)
+    return AIExplainer(rate_limiter=TokenBucket(rate_limit, max(1, rate_burst)),
+                       cache=cache, http_client=http_client.load(), max_concurrency=max_concurrency,
+                       router=router, max_tokens_per_explanation=EXPLANATION_MAX_TOKENS,
+                       budget=period_budget.load())
+
+def create_ai_explainer():
+    # Each worker process gets an equal share of what warming leaves of the OpenRouter request budget
+    return build_ai_explainer(OPENROUTER_RATE_LIMIT * (1 - WARM_RATE_SHARE) / SERVER_WORKERS,
+                              OPENROUTER_RATE_BURST // SERVER_WORKERS, EXPLAIN_WORKERS)
+
+def create_warm_explainer():
+    # Only one process warms at a time (see CacheWarmer), so the warming share isn't divided
+    return build_ai_explainer(OPENROUTER_RATE_LIMIT * WARM_RATE_SHARE,
+                              int(OPENROUTER_RATE_BURST * WARM_RATE_SHARE), WARM_EXPLAIN_WORKERS)
+
+def create_explanation_scheduler():
+    from explain_scheduler import ExplanationScheduler
+    return ExplanationScheduler(ai_explainer.load(), max_workers=EXPLAIN_WORKERS)
+
+def create_warm_scheduler():
+    from explain_scheduler import ExplanationScheduler
+    return ExplanationScheduler(warm_explainer.load(), max_workers=WARM_EXPLAIN_WORKERS)
+
+def create_cache_warmer():
+    from cache_warmer import CacheWarmer
+    return CacheWarmer(warm_repository, WATCH_REPOS, WARM_INTERVAL, max_workers=WARM_WORKERS,
+                       lock_path=WARM_LOCK_PATH)
+
+git_parser = Lazy(create_git_parser)
+http_client = Lazy(create_http_client)
+period_budget = Lazy(create_period_budget)
+ai_explainer = Lazy(create_ai_explainer)
+explanation_scheduler = Lazy(create_explanation_scheduler)
+warm_explainer = Lazy(create_warm_explainer)
+warm_scheduler = Lazy(create_warm_scheduler)
+cache_warmer = Lazy(create_cache_warmer)
+analysis_index = Lazy(lambda: AnalysisIndex(ANALYSIS_INDEX_PATH, ttl_seconds=EXPLANATION_CACHE_TTL))
+result_cache = Lazy(lambda: ResultCache(RESULT_CACHE_PATH, ttl_seconds=EXPLANATION_CACHE_TTL,
+                                        max_entries=RESULT_CACHE_MAX_ENTRIES))
+REGISTRY.register(Gauge('commitmind_openrouter_concurrency_limit',
+                        'Concurrent OpenRouter requests currently allowed by the adaptive limiter',
+                        lambda: ai_explainer.limiter.limit if ai_explainer.loaded else 0))
+
+_shutdown_lock = threading.Lock()
+_shut_down = False
+
+def shutdown(wait: bool = False):
+    """Stop background work and clean up temporary files, once per process.
+
+    With ``wait``, running jobs and explanations are allowed to finish
+    first; gunicorn's worker_exit hook uses this for graceful shutdown, and
+    the atexit handler then finds nothing left to do.
+    """
+    global _shut_down
+    with _shutdown_lock:
+        if _shut_down:
+            return
+        _shut_down = True
+        try:
+            # Services that were never used have nothing to clean up
+            if cache_warmer.loaded:
+                cache_warmer.shutdown(wait=wait)
+            if warm_scheduler.loaded:
+                warm_scheduler.shutdown(wait=wait)
+            if job_manager.loaded:
+                job_manager.shutdown(wait=wait)
+            if explanation_scheduler.loaded:
+                explanation_scheduler.shutdown(wait=wait)
+            if http_client.loaded:
+                http_client.close()
+            if git_parser.loaded:
+                git_parser.cleanup()
+        except Exception as e:
+            print(f"Error during cleanup: {e}")
+
+def start_background_tasks():
+    """Start warming the watched repositories; called once in each serving process"""
+    if WATCH_REPOS:
+        cache_warmer.start()
 
 # Register cleanup on application shutdown
 @atexit.register
 def cleanup_on_exit():
     """Clean up temporary files on application shutdown"""
-    try:
-        git_parser.cleanup()
-    except Exception as e:
-        print(f"Error during cleanup: {e}")
+    shutdown()
 
 def validate_github_url(url: str) -> Tuple[bool, str]:
     """
@@ -115,7 +293,7 @@ def format_error_response(error: str, status_code: int = 500) -> tuple:
         'status_code': status_code
     }), status_code
 
-@app.route('/health', methods=['GET'])
+@api.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({
@@ -124,105 +302,549 @@ def health_check():
         'version': '1.0.0'
     })
 
-@app.route('/analyze', methods=['POST'])
-@limiter.limit("5 per minute")  # Rate limit for analysis endpoint
-def analyze_repo():
+class AnalysisError(Exception):
+    """Raised when a repository can't be analyzed, carrying the HTTP status to report"""
+    def __init__(self, message: str, status_code: int = 500):
+        super().__init__(message)
+        self.status_code = status_code
+
+def parse_local_source(repo_path) -> str:
+    """Validate a local repository path or .bundle file against ALLOWED_LOCAL_ROOTS and return its real path"""
+    if not isinstance(repo_path, str) or not os.path.isabs(repo_path.strip()):
+        raise AnalysisError('repo_path must be an absolute path', 400)
     try:
-        data = request.get_json()
-        if not data:
-            return format_error_response('Request body is required', 400)
+        return resolve_local_source(repo_path.strip(), ALLOWED_LOCAL_ROOTS)
+    except GitError as e:
+        raise AnalysisError(str(e), 404 if 'not found' in str(e).lower() else 403)
+
+def parse_analyze_request() -> Tuple[str, Optional[str], Dict]:
+    """Extract and validate the repository URL, token and options from an analyze request.
 
+    A ``repo_path`` (a checkout, bare repository or .bundle file under
+    ALLOWED_LOCAL_ROOTS) may be given instead of ``repo_url``; it is
+    returned in place of the URL, and a token and clone strategy don't apply.
+    """
+    data = request.get_json(silent=True)
+    if not data:
+        raise AnalysisError('Request body is required', 400)
+
+    if data.get('repo_path'):
+        if data.get('repo_url'):
+            raise AnalysisError('repo_url and repo_path cannot be combined', 400)
+        repo_url = parse_local_source(data['repo_path'])
+        github_token = None
+        options = {}
+    else:
         repo_url = data.get('repo_url', '').strip()
         github_token = data.get('github_token')
 
         # Validate GitHub URL
         is_valid, error_message = validate_github_url(repo_url)
         if not is_valid:
-            return format_error_response(error_message, 400)
-
-        print(f"Cloning repository: {repo_url}")
-        try:
-            # Pass GitHub token to clone_repo
-            repo_path = git_parser.clone_repo(repo_url, github_token)
-        except GitError as e:
-            error_msg = str(e)
-            if "not found" in error_msg.lower():
-                return format_error_response("Repository not found. Please check if the URL is correct and the repository exists.", 404)
-            elif "permission denied" in error_msg.lower() or "authentication" in error_msg.lower():
-                return format_error_response("Access denied. Please make sure you have access to this repository and are properly authenticated.", 403)
-            else:
-                return format_error_response(f'Failed to clone repository: {error_msg}', 400)
-        except Exception as e:
-            return format_error_response(f'Failed to clone repository: {str(e)}', 500)
+            raise AnalysisError(error_message, 400)
+
+        clone_strategy = data.get('clone_strategy') or CLONE_STRATEGY
+        if clone_strategy not in CLONE_STRATEGIES:
+            raise AnalysisError(f"clone_strategy must be one of: {', '.join(CLONE_STRATEGIES)}", 400)
+        options = {'clone_strategy': clone_strategy}
+
+    # Commit selection and pagination
+    limit = data.get('limit', MAX_COMMITS)
+    if not isinstance(limit, int) or isinstance(limit, bool) or not 1 <= limit <= MAX_COMMITS:
+        raise AnalysisError(f'limit must be an integer between 1 and {MAX_COMMITS}', 400)
+    options['limit'] = limit
+    for name in ('ref', 'range', 'path', 'cursor'):
+        value = data.get(name)
+        if value is None or value == '':
+            continue
+        if not isinstance(value, str):
+            raise AnalysisError(f'{name} must be a string', 400)
+        options[name] = value.strip()
+    if 'ref' in options and 'range' in options:
+        raise AnalysisError('ref and range cannot be combined', 400)
+    if 'range' in options and '..' not in options['range']:
+        raise AnalysisError('range must have the form <from>..<to>', 400)
+    if 'cursor' in options:
+        decode_cursor(options['cursor'])
+    return repo_url, github_token, options
+
+def default_request_options(repo_url: str) -> Dict:
+    """The options parse_analyze_request gives a request for the first page of the default branch"""
+    options = {} if is_local_source(repo_url) else {'clone_strategy': CLONE_STRATEGY}
+    options['limit'] = MAX_COMMITS
+    return options
+
+def encode_cursor(revs: List[str], paths: List[str], skip: int) -> str:
+    """Encode the position after a page; revisions are pinned to hashes so pages stay stable"""
+    data = json.dumps({'revs': revs, 'paths': paths, 'skip': skip}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> Dict:
+    """Decode and validate a cursor produced by encode_cursor"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        revs, paths, skip = data['revs'], data['paths'], data['skip']
+    except (ValueError, TypeError, KeyError):
+        raise AnalysisError('Invalid cursor', 400)
+    # Only commit hashes are accepted, so a cursor can't smuggle options into git
+    if not isinstance(revs, list) or not revs or \
+            not all(isinstance(rev, str) and re.fullmatch(r'\^?[0-9a-f]{40}([0-9a-f]{24})?', rev) for rev in revs) or \
+            not isinstance(paths, list) or not all(isinstance(path, str) for path in paths) or \
+            not isinstance(skip, int) or skip < 0:
+        raise AnalysisError('Invalid cursor', 400)
+    return {'revs': revs, 'paths': paths, 'skip': skip}
+
+def is_default_view(options: Dict) -> bool:
+    """Whether a request asks for the full first page of the default branch.
+
+    A smaller ``limit`` is not the default view, so it never replaces the
+    stored results of the whole page with only its first few commits.
+    """
+    return options.get('limit', MAX_COMMITS) == MAX_COMMITS and \
+        not any(options.get(name) for name in ('ref', 'range', 'path', 'cursor'))
 
-        print("Getting recent commits...")
-        try:
-            commits = git_parser.get_recent_commits(repo_path)[:MAX_COMMITS]
-            print(f"Found {len(commits)} commits")
+def select_commits(repo_path: str, options: Dict) -> Tuple[List[str], List[str], int]:
+    """Resolve the requested ref, range, path and cursor to (revs, paths, skip) for git log"""
+    if options.get('cursor'):
+        cursor = decode_cursor(options['cursor'])
+        return cursor['revs'], cursor['paths'], cursor['skip']
 
-            if not commits:
-                return format_error_response('No commits found in the repository', 404)
+    paths = [options['path']] if options.get('path') else []
+    try:
+        if options.get('range'):
+            start, end = options['range'].split('..', 1)
+            if not start:
+                raise AnalysisError('range must have the form <from>..<to>', 400)
+            revs = [f"^{git_parser.resolve_revision(repo_path, start)}",
+                    git_parser.resolve_revision(repo_path, end or 'HEAD')]
+        else:
+            revs = [git_parser.resolve_revision(repo_path, options.get('ref') or 'HEAD')]
+    except GitError as e:
+        raise AnalysisError(str(e), 404)
+    return revs, paths, 0
+
+def repository_error(error: GitError) -> AnalysisError:
+    """Map a repository access failure to the error reported to clients"""
+    error_msg = str(error)
+    if "not found" in error_msg.lower():
+        return AnalysisError("Repository not found. Please check if the URL is correct and the repository exists.", 404)
+    elif "permission denied" in error_msg.lower() or "authentication" in error_msg.lower():
+        return AnalysisError("Access denied. Please make sure you have access to this repository and are properly authenticated.", 403)
+    else:
+        return AnalysisError(f'Failed to clone repository: {error_msg}', 400)
+
+def analysis_version() -> str:
+    """Stored analyses are only reused for the same prompt version, models and templates"""
+    from ai_explainer import PROMPT_VERSION
+    from commit_classifier import CLASSIFIER_VERSION
+    version = f"{PROMPT_VERSION}:{ai_explainer.router.signature}"
+    return f"{version}:t{CLASSIFIER_VERSION}" if TEMPLATE_TRIVIAL_COMMITS else version
+
+def load_commits(repo_url: str, github_token: Optional[str] = None, options: Optional[Dict] = None,
+                 stats: Optional[Dict] = None) -> Tuple[List[Dict], Dict[str, Dict], Dict]:
+    """Sync the repository mirror and read one page of commits to analyze.
+
+    Returns the commits in log order, the stored results of the previous
+    analysis that are still valid, keyed by hash, and the page info with
+    the cursor of the next page. Commits with a stored result are not read
+    from git again; they appear in the list as their stored result.
+    ``stats`` receives the clone strategy, sync time, bytes transferred,
+    the analyzed HEAD and how many results were reused.
+    """
+    options = options or {}
+    stats = stats if stats is not None else {}
+    print(f"Syncing repository mirror: {repo_url}")
+    try:
+        # Pass GitHub token so private mirrors are only served to authorized callers
+        with git_parser.open_repo(repo_url, github_token, options.get('clone_strategy'), stats) as repo_path:
+            print("Getting recent commits...")
+            try:
+                revs, paths, skip = select_commits(repo_path, options)
+                limit = options.get('limit', MAX_COMMITS)
+                branch, hashes = git_parser.list_commits(repo_path, limit, revs, skip, paths)
+                previous = analysis_index.get(normalize_repo_url(repo_url), analysis_version())
+                reused: Dict[str, Dict] = {}
+                if previous and hashes and is_default_view(options):
+                    # Results are kept only for commits still in the window, so commits
+                    # dropped by a force-push are invalidated along with the old HEAD
+                    reused = {h: previous['results'][h] for h in hashes if h in previous['results']}
+                    stats['history_rewritten'] = previous['head'] != hashes[0] and \
+                        not git_parser.is_ancestor(repo_path, previous['head'], hashes[0])
+                elif previous:
+                    reused = {h: previous['results'][h] for h in hashes if h in previous['results']}
+                fresh = git_parser.get_commits(repo_path, [h for h in hashes if h not in reused], branch,
+                                               MAX_DIFF_BYTES, MAX_REQUEST_DIFF_BYTES)
+                git_parser.add_patch_ids(repo_path, fresh)
+            except AnalysisError:
+                raise
+            except Exception as e:
+                raise AnalysisError(f'Failed to fetch commits: {str(e)}', 500)
+    except GitError as e:
+        raise repository_error(e)
+    except AnalysisError:
+        raise
+    except Exception as e:
+        raise AnalysisError(f'Failed to clone repository: {str(e)}', 500)
+
+    print(f"Found {len(hashes)} commits, {len(fresh)} new since the last analysis")
+    if not hashes:
+        if skip:
+            raise AnalysisError('No more commits', 404)
+        raise AnalysisError('No commits found in the repository', 404)
+    stats.update({'head': revs[-1], 'new_commits': len(fresh), 'reused_commits': len(reused)})
+    page = {
+        'offset': skip,
+        'limit': limit,
+        # A full page may be followed by more commits
+        'next_cursor': encode_cursor(revs, paths, skip + len(hashes)) if len(hashes) == limit else None
+    }
+
+    with timed('condense'):
+        condense_commits(fresh, DIFF_TOKEN_BUDGET, classify=TEMPLATE_TRIVIAL_COMMITS)
+    fresh_by_hash = {commit['hash']: commit for commit in fresh}
+    return [reused.get(h) or fresh_by_hash[h] for h in hashes], reused, page
+
+def iter_results(commits: List[Dict], reused: Dict[str, Dict],
+                 scheduler=None) -> Iterator[Tuple[int, Dict]]:
+    """Yield (index, result) pairs: reused results first, then new explanations as they finish"""
+    if scheduler is None:
+        scheduler = explanation_scheduler
+    fresh = []
+    for i, commit in enumerate(commits):
+        if commit['hash'] in reused:
+            yield i, reused[commit['hash']]
+        else:
+            fresh.append(i)
+    for j, result in scheduler.iter_explanations([commits[i] for i in fresh]):
+        yield fresh[j], result
+
+def explain_commits(commits: List[Dict], reused: Dict[str, Dict],
+                    scheduler=None) -> Tuple[List[Dict], List[str]]:
+    """Explain all commits, returning results in order plus error messages"""
+    results: List[Optional[Dict]] = [None] * len(commits)
+    for i, result in iter_results(commits, reused, scheduler):
+        results[i] = result
+    return results, collect_errors(results)
+
+def save_analysis(repo_url: str, options: Dict, stats: Dict, results: List[Dict]):
+    """Record the analyzed HEAD and the successful results of the default view for the next request"""
+    if not is_default_view(options):
+        return
+    try:
+        analysis_index.put(normalize_repo_url(repo_url), analysis_version(), stats['head'],
+                           [result for result in results if result['status'] == 'success'])
+    except Exception as e:
+        print(f"Warning: Failed to save analysis: {str(e)}")
 
-        except Exception as e:
-            return format_error_response(f'Failed to fetch commits: {str(e)}', 500)
+def request_key(repo_url: str, github_token: Optional[str], options: Dict, head: str) -> str:
+    """Identify a request for one repository state.
 
-        print("Generating explanations...")
-        explained_commits = []
-        errors = []
+    The token identity is part of the key so results of private
+    repositories are only ever served back to the same token.
+    """
+    token_id = hashlib.sha256(github_token.encode()).hexdigest() if github_token else ''
+    return (f"{normalize_repo_url(repo_url)}@{head}#{token_id}?{json.dumps(options, sort_keys=True)}"
+            f"|{analysis_version()}")
 
-        for i, commit in enumerate(commits):
-            print(f"Processing commit {i+1}/{len(commits)}: {commit['hash'][:7]}")
-            try:
-                explanation = ai_explainer.explain_commit(commit)
-                if explanation.startswith('Error:'):
-                    errors.append(explanation)
-                explained_commits.append({
-                    'hash': commit['hash'],
-                    'message': commit['message'],
-                    'author': commit['author'],
-                    'date': commit['date'],
-                    'explanation': explanation
-                })
-            except Exception as e:
-                error_msg = str(e)
-                print(f"Error explaining commit {commit['hash'][:7]}: {error_msg}")
-                print(traceback.format_exc())
-                errors.append(f"Failed to explain commit {commit['hash']}: {error_msg}")
-                explained_commits.append({
-                    'hash': commit['hash'],
-                    'message': commit['message'],
-                    'author': commit['author'],
-                    'date': commit['date'],
-                    'explanation': 'Error generating explanation',
-                    'status': 'error',
-                    'error': error_msg
-                })
+def resolve_result_key(repo_url: str, github_token: Optional[str], options: Dict) -> Tuple[Optional[str], Optional[str]]:
+    """Return (result cache key, expected HEAD) for a request, or (None, None) if it can't be cached.
 
-        print("Cleaning up...")
-        git_parser.cleanup()
+    Named refs and ranges can move without HEAD moving, so only requests
+    for HEAD (optionally filtered by path) and cursor pages, which pin
+    their commits, are cached. HEAD is resolved with git ls-remote, before
+    any clone or fetch.
+    """
+    if options.get('ref') or options.get('range'):
+        return None, None
+    if options.get('cursor'):
+        return request_key(repo_url, github_token, options, 'cursor'), None
+    try:
+        with timed('ls_remote'):
+            head = git_parser.resolve_head(repo_url, github_token)
+    except GitError as e:
+        raise repository_error(e)
+    return request_key(repo_url, github_token, options, head), head
+
+def lookup_result(result_key: Optional[str]) -> Optional[Tuple[str, Dict]]:
+    """Return the cached (etag, response) for a result key, counting hits and misses"""
+    if result_key is None:
+        return None
+    cached = result_cache.get(result_key)
+    RESULT_CACHE_LOOKUPS.inc(result='hit' if cached else 'miss')
+    return cached
+
+def store_result(result_key: Optional[str], head: Optional[str], stats: Dict, response: Dict) -> Optional[str]:
+    """Cache a complete response and return its ETag.
+
+    Responses with failed or degraded commits are not cached so those
+    commits are retried, and neither are responses for a HEAD that moved
+    between ls-remote and the fetch.
+    """
+    if result_key is None or response['failed_commits'] or response['degraded_commits'] or \
+            (head is not None and stats.get('head') != head):
+        return None
+    try:
+        return result_cache.put(result_key, response)
+    except Exception as e:
+        print(f"Warning: Failed to cache result: {str(e)}")
+        return None
+
+def not_modified(endpoint: str, etag: str) -> Response:
+    """Tell a client whose copy of the result is current to keep using it"""
+    ANALYSES.inc(endpoint=endpoint, outcome='not_modified')
+    return Response(status=304, headers={'ETag': etag})
+
+def summarize_results(explained_commits: List[Dict], errors: List[str]) -> Dict:
+    """Build the summary fields shared by the JSON and streaming responses"""
+    return {
+        'total_commits': len(explained_commits),
+        'successful_commits': len([c for c in explained_commits if c['status'] == 'success']),
+        # Summarized from the commit message because the token budget ran out
+        'degraded_commits': len([c for c in explained_commits if c['status'] == 'degraded']),
+        'failed_commits': len(errors),
+        'errors': errors if errors else None
+    }
+
+@api.route('/metrics', methods=['GET'])
+@limiter.exempt  # Scraped periodically by monitoring
+def metrics():
+    """Expose this worker's stage timings, cache and API counters in the Prometheus text format"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@api.route('/analyze', methods=['POST'])
+@limiter.limit("5 per minute")  # Rate limit for analysis endpoint
+def analyze_repo():
+    try:
+        with track_request() as timings, request_budget(REQUEST_TOKEN_BUDGET, REQUEST_COST_BUDGET):
+            repo_url, github_token, options = parse_analyze_request()
+            result_key, head = resolve_result_key(repo_url, github_token, options)
+            cached = lookup_result(result_key)
+            if cached:
+                etag, result = cached
+                if etag_matches(request.headers.get('If-None-Match'), etag):
+                    return not_modified('analyze', etag)
+                print("Serving cached analysis")
+            else:
+                repository_stats: Dict = {}
+                commits, reused, page = load_commits(repo_url, github_token, options, repository_stats)
+
+                print("Generating explanations...")
+                with timed('explain'):
+                    explained_commits, errors = explain_commits(commits, reused)
+                save_analysis(repo_url, options, repository_stats, explained_commits)
+                result = {
+                    'commits': explained_commits,
+                    'repository': repository_stats,
+                    'page': page,
+                    **summarize_results(explained_commits, errors)
+                }
+                etag = store_result(result_key, head, repository_stats, result)
 
         print("Done! Sending response...")
-        return jsonify({
-            'success': True,
-            'commits': explained_commits,
-            'total_commits': len(commits),
-            'successful_commits': len([c for c in explained_commits if c['status'] == 'success']),
-            'failed_commits': len(errors),
-            'errors': errors if errors else None
-        })
-
+        ANALYSES.inc(endpoint='analyze', outcome='success')
+        response = jsonify({'success': True, 'cached': bool(cached), **result, 'timings': timings.to_dict()})
+        if etag:
+            response.headers['ETag'] = etag
+        return response
+
+    except AnalysisError as e:
+        ANALYSES.inc(endpoint='analyze', outcome='error')
+        return format_error_response(str(e), e.status_code)
     except Exception as e:
+        ANALYSES.inc(endpoint='analyze', outcome='error')
         print(f"Error in analyze_repo: {str(e)}")
         print(traceback.format_exc())
         return format_error_response(f'Internal server error: {str(e)}', 500)
-    finally:
-        # Ensure cleanup happens even if an error occurs
+
+def format_sse(event: str, data: Dict) -> str:
+    """Format a Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@api.route('/analyze/stream', methods=['POST'])
+@limiter.limit("5 per minute")  # Shares the analysis rate limit budget
+def analyze_repo_stream():
+    """Stream analysis progress and each explained commit as Server-Sent Events.
+
+    Events: ``status`` (progress stage), ``commits`` (commit list ready),
+    ``commit`` (one explained commit with its index), ``done`` (summary)
+    and ``error``.
+    """
+    try:
+        repo_url, github_token, options = parse_analyze_request()
+        result_key, head = resolve_result_key(repo_url, github_token, options)
+        cached = lookup_result(result_key)
+    except AnalysisError as e:
+        return format_error_response(str(e), e.status_code)
+    if cached and etag_matches(request.headers.get('If-None-Match'), cached[0]):
+        return not_modified('stream', cached[0])
+
+    def replay(result: Dict):
+        """Send a cached analysis as the same sequence of events"""
+        yield format_sse('status', {'stage': 'cloned', 'repository': result['repository'], 'cached': True})
+        yield format_sse('commits', {
+            'total': len(result['commits']),
+            'page': result['page'],
+            'commits': [{key: commit[key] for key in ('hash', 'message', 'author', 'date')}
+                        for commit in result['commits']]
+        })
+        for i, commit in enumerate(result['commits']):
+            yield format_sse('commit', {'index': i, 'commit': commit})
+        ANALYSES.inc(endpoint='stream', outcome='success')
+        yield format_sse('done', {'success': True, 'cached': True, 'etag': cached[0],
+                                  **{key: value for key, value in result.items()
+                                     if key not in ('commits', 'repository', 'page')}})
+
+    def generate():
         try:
-            git_parser.cleanup()
+            with track_request() as timings, request_budget(REQUEST_TOKEN_BUDGET, REQUEST_COST_BUDGET):
+                yield format_sse('status', {'stage': 'cloning'})
+                repository_stats: Dict = {}
+                commits, reused, page = load_commits(repo_url, github_token, options, repository_stats)
+                yield format_sse('status', {'stage': 'cloned', 'repository': repository_stats})
+                yield format_sse('commits', {
+                    'total': len(commits),
+                    'page': page,
+                    'commits': [{key: commit[key] for key in ('hash', 'message', 'author', 'date')}
+                                for commit in commits]
+                })
+
+                explained_commits: List[Optional[Dict]] = [None] * len(commits)
+                with timed('explain'):
+                    for i, result in iter_results(commits, reused):
+                        explained_commits[i] = result
+                        yield format_sse('commit', {'index': i, 'commit': result})
+                save_analysis(repo_url, options, repository_stats, explained_commits)
+
+            summary = summarize_results(explained_commits, collect_errors(explained_commits))
+            etag = store_result(result_key, head, repository_stats,
+                                {'commits': explained_commits, 'repository': repository_stats,
+                                 'page': page, **summary})
+            ANALYSES.inc(endpoint='stream', outcome='success')
+            yield format_sse('done', {'success': True, 'etag': etag, 'timings': timings.to_dict(), **summary})
+
+        except AnalysisError as e:
+            ANALYSES.inc(endpoint='stream', outcome='error')
+            yield format_sse('error', {'error': str(e), 'status_code': e.status_code})
         except Exception as e:
-            print(f"Error during cleanup: {e}")
+            ANALYSES.inc(endpoint='stream', outcome='error')
+            print(f"Error in analyze_repo_stream: {str(e)}")
+            print(traceback.format_exc())
+            yield format_sse('error', {'error': f'Internal server error: {str(e)}', 'status_code': 500})
+
+    headers = {
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Disable proxy buffering so events arrive immediately
+    }
+    if cached:
+        headers['ETag'] = cached[0]
+    return Response(stream_with_context(replay(cached[1]) if cached else generate()),
+                    mimetype='text/event-stream', headers=headers)
+
+def run_analysis_job(job: Job) -> Dict:
+    """Worker entry point: analyze the repository and record results as they arrive"""
+    with track_request() as timings, request_budget(REQUEST_TOKEN_BUDGET, REQUEST_COST_BUDGET):
+        job.set_stage('cloning')
+        repository_stats: Dict = {}
+        try:
+            commits, reused, page = load_commits(job.params['repo_url'], job.params.get('github_token'),
+                                                 job.params['options'], repository_stats)
+        except Exception:
+            ANALYSES.inc(endpoint='jobs', outcome='error')
+            raise
+
+        job.set_stage('explaining')
+        job.set_commits(len(commits))
+        explained_commits: List[Optional[Dict]] = [None] * len(commits)
+        with timed('explain'):
+            for i, result in iter_results(commits, reused):
+                explained_commits[i] = result
+                job.add_result(i, result)
+        save_analysis(job.params['repo_url'], job.params['options'], repository_stats, explained_commits)
+
+    ANALYSES.inc(endpoint='jobs', outcome='success')
+    return {'repository': repository_stats, 'page': page, 'timings': timings.to_dict(),
+            **summarize_results(explained_commits, collect_errors(explained_commits))}
+
+def warm_repository(repo_url: str) -> Dict:
+    """Bring the cached default view of a watched repository up to date.
+
+    Nothing is done while the cached response for the current HEAD is
+    younger than WARM_REFRESH_AFTER of its TTL. Otherwise the repository is
+    analyzed like an /analyze request, reusing stored results, on the
+    warming explainer: new commits are explained before anyone asks for
+    them, and the response cache and analysis index are rewritten before
+    they expire, so user requests keep finding them warm.
+    """
+    if is_local_source(repo_url):
+        repo_url = resolve_local_source(repo_url, ALLOWED_LOCAL_ROOTS)
+    options = default_request_options(repo_url)
+    with track_request() as timings, request_budget(REQUEST_TOKEN_BUDGET, REQUEST_COST_BUDGET):
+        result_key, head = resolve_result_key(repo_url, None, options)
+        age = result_cache.age(result_key)
+        if age is not None and age < EXPLANATION_CACHE_TTL * WARM_REFRESH_AFTER:
+            return {'outcome': 'fresh', 'head': head}
+
+        repository_stats: Dict = {}
+        commits, reused, page = load_commits(repo_url, None, options, repository_stats)
+        with timed('explain'):
+            explained_commits, errors = explain_commits(commits, reused, warm_scheduler)
+        save_analysis(repo_url, options, repository_stats, explained_commits)
+        summary = summarize_results(explained_commits, errors)
+        etag = store_result(result_key, head, repository_stats,
+                            {'commits': explained_commits, 'repository': repository_stats, 'page': page, **summary})
+
+    print(f"Warmed {repo_url}: {repository_stats.get('new_commits', 0)} new commits")
+    # Failed or degraded commits keep the response out of the cache; the next round retries them
+    return {'outcome': 'refreshed' if etag else 'incomplete', 'head': repository_stats.get('head'),
+            'new_commits': repository_stats.get('new_commits'), 'failed_commits': summary['failed_commits'],
+            'degraded_commits': summary['degraded_commits'], 'timings': timings.to_dict()}
+
+# Job state lives in SQLite so any server worker can report on any job
+job_manager = Lazy(lambda: JobManager(run_analysis_job, max_workers=ANALYSIS_WORKERS, job_ttl=JOB_TTL,
+                                      store=JobStore(JOB_STORE_PATH)))
+
+@api.route('/jobs', methods=['POST'])
+@limiter.limit("5 per minute")  # Shares the analysis rate limit budget
+def create_job():
+    """Queue a repository analysis and return its job id immediately"""
+    try:
+        repo_url, github_token, options = parse_analyze_request()
+        try:
+            head = git_parser.resolve_head(repo_url, github_token)
+        except GitError as e:
+            raise repository_error(e)
+
+        # Identical requests for the same repository state share one job
+        key = request_key(repo_url, github_token, options, head)
+        job, created = job_manager.submit(key, {'repo_url': repo_url, 'github_token': github_token,
+                                                'options': options})
 
-@app.route('/auth/callback', methods=['POST'])
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'status': job.to_dict(include_results=False)['status'],
+            'deduplicated': not created,
+            'status_url': f"/jobs/{job.id}"
+        }), 202
+
+    except AnalysisError as e:
+        return format_error_response(str(e), e.status_code)
+    except Exception as e:
+        print(f"Error in create_job: {str(e)}")
+        print(traceback.format_exc())
+        return format_error_response(f'Internal server error: {str(e)}', 500)
+
+@api.route('/jobs/<job_id>', methods=['GET'])
+@limiter.exempt  # Clients poll this endpoint
+def get_job(job_id: str):
+    """Return the status and the results produced so far for a job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return format_error_response('Job not found', 404)
+    include_results = request.args.get('results', 'true').lower() != 'false'
+    return jsonify({'success': True, **job.to_dict(include_results=include_results)})
+
+@api.route('/auth/callback', methods=['POST'])
 @limiter.limit("10 per minute")  # Rate limit for auth callback
 def github_callback():
     """Handle GitHub OAuth callback"""
@@ -237,7 +859,7 @@ def github_callback():
         code = data['code']
 
         # Exchange code for access token
-        response = requests.post(
+        response = http_client.post(
             'https://github.com/login/oauth/access_token',
             headers={'Accept': 'application/json'},
             data={
@@ -259,7 +881,7 @@ def github_callback():
             return format_error_response('No access token received', 400)
 
         # Get user information
-        user_response = requests.get(
+        user_response = http_client.get(
             'https://api.github.com/user',
             headers={
                 'Authorization': f'Bearer {access_token}',
@@ -284,15 +906,38 @@ def github_callback():
         print(traceback.format_exc())
         return format_error_response(f'Internal server error: {str(e)}', 500)
 
+def create_app() -> Flask:
+    """Build the Flask application; the services it uses are created on first request.
+
+    Raises RuntimeError when several server workers would each keep their
+    own in-memory rate limit counters, multiplying every limit.
+    """
+    if SERVER_WORKERS > 1 and RATELIMIT_ENABLED and RATELIMIT_STORAGE_URI.startswith('memory://'):
+        raise RuntimeError(
+            f"{SERVER_WORKERS} server workers need shared rate limit storage: set RATELIMIT_STORAGE_URI "
+            "(e.g. redis://localhost:6379), or run one worker (GUNICORN_WORKERS=1)"
+        )
+    app = Flask(__name__)
+    CORS(app, expose_headers=['ETag'])
+    limiter.init_app(app)
+    app.register_blueprint(api)
+    return app
+
 def run_app():
-    """Run the Flask app with automatic port selection"""
+    """Run the Flask development server with automatic port selection.
+
+    For production, serve ``wsgi:app`` with gunicorn (see gunicorn.conf.py).
+    """
     port = find_available_port(DEFAULT_PORT, MAX_PORT_ATTEMPTS)
     if port is None:
         print(f"Could not find an available port in range {DEFAULT_PORT}-{DEFAULT_PORT + MAX_PORT_ATTEMPTS - 1}")
         return
 
     print(f"Starting server on port {port}")
-    app.run(debug=True, port=port)
+    # With debug=True the server runs in a child process started by the reloader
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_tasks()
+    create_app().run(debug=True, port=port)
 
 if __name__ == '__main__':
     run_app()
\ No newline at end of file
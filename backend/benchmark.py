@@ -0,0 +1,885 @@
+"""Benchmark the clone -> parse -> explain pipeline without touching the network.
+
+Generates a synthetic git repository, serves it to GitParser through a
+file:// URL and points AIExplainer at a local mock of the OpenRouter API.
+
+Usage:
+    python benchmark.py pipeline --commits 200 --files 50 --diff-lines 40
+    python benchmark.py pipeline --output baseline.json
+    python benchmark.py pipeline --baseline baseline.json --tolerance 0.25
+    python benchmark.py http --calls 200
+    python benchmark.py serve --workers 1 2 4 --clients 8
+    python benchmark.py startup --baseline startup.json
+    python benchmark.py memory --sizes 64 1024 4096
+    python benchmark.py trivial https://github.com/pallets/flask ../ --commits 500
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import re
+import shutil
+import ssl
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+def create_synthetic_repo(path: str, num_commits: int = 100, num_files: int = 20,
+                          files_per_commit: int = 3, diff_lines: int = 20,
+                          lines_per_file: int = 200, seed: int = 0, time_offset: int = 0) -> str:
+    """Create a repository with a linear history of synthetic commits.
+
+    The whole history is written with a single ``git fast-import`` run, so
+    even large repositories are generated quickly. Repositories with the same
+    seed but a different ``time_offset`` contain the same changes under
+    different commit hashes, like a rebased fork.
+    """
+    rng = random.Random(seed)
+    os.makedirs(path, exist_ok=True)
+    subprocess.run(['git', 'init', '-q', '--bare', '-b', 'main', path], check=True)
+
+    files = {f"src/module_{i}.py": [f"value_{i}_{n} = {n}\n" for n in range(lines_per_file)]
+             for i in range(num_files)}
+    stream = []
+
+    def data(content: str):
+        encoded = content.encode()
+        stream.append(f"data {len(encoded)}\n".encode())
+        stream.append(encoded)
+        stream.append(b"\n")
+
+    timestamp = 1700000000 + time_offset
+    for mark in range(1, num_commits + 1):
+        stream.append(f"commit refs/heads/main\nmark :{mark}\n".encode())
+        stream.append(f"committer Bench <bench@example.com> {timestamp + mark * 60} +0000\n".encode())
+        data(f"Update modules in commit {mark}\n\nSynthetic benchmark commit.")
+        if mark > 1:
+            stream.append(f"from :{mark - 1}\n".encode())
+
+        changed = files if mark == 1 else rng.sample(sorted(files), min(files_per_commit, num_files))
+        for name in changed:
+            lines = files[name]
+            if mark > 1:
+                for _ in range(diff_lines):
+                    line = rng.randrange(len(lines))
+                    lines[line] = f"value_{line} = {rng.randrange(10 ** 6)}  # commit {mark}\n"
+            stream.append(f"M 100644 inline {name}\n".encode())
+            data(''.join(lines))
+        stream.append(b"\n")
+
+    subprocess.run(['git', '--git-dir', path, 'fast-import', '--quiet'],
+                   input=b''.join(stream), check=True)
+    return path
+
+
+def create_huge_commit_repo(path: str, size_mb: int, file_mb: int = 16, later_commits: int = 3) -> str:
+    """Create a repository with one commit adding ``size_mb`` of text, like vendoring a dependency.
+
+    The commit adds files of ``file_mb`` megabytes each, one of them a
+    single line (like minified JavaScript), and is followed by a few small
+    commits. Blobs are streamed into ``git fast-import``, so generating a
+    multi-gigabyte commit takes little memory.
+    """
+    os.makedirs(path, exist_ok=True)
+    subprocess.run(['git', 'init', '-q', '--bare', '-b', 'main', path], check=True)
+    process = subprocess.Popen(['git', '--git-dir', path, 'fast-import', '--quiet'], stdin=subprocess.PIPE)
+    out = process.stdin
+    block = b''.join(f"row {n:06d}: {'x' * 80}\n".encode() for n in range(1024 * 1024 // 96))
+    block += b'y' * (1024 * 1024 - len(block) - 1) + b'\n'  # Exactly one megabyte
+
+    def commit(mark: int, message: str):
+        out.write(f"commit refs/heads/main\nmark :{mark}\n".encode())
+        out.write(f"committer Bench <bench@example.com> {1700000000 + mark * 60} +0000\n".encode())
+        encoded = message.encode()
+        out.write(f"data {len(encoded)}\n".encode() + encoded + b"\n")
+        if mark > 1:
+            out.write(f"from :{mark - 1}\n".encode())
+
+    commit(1, "Initial commit")
+    out.write(b"M 100644 inline README.md\ndata 7\n# Demo\n\n\n")
+    commit(2, "Vendor dependencies")
+    for index in range(max(size_mb // file_mb, 1)):
+        out.write(f"M 100644 inline vendor/lib_{index}.txt\ndata {file_mb * len(block)}\n".encode())
+        for _ in range(file_mb):
+            out.write(block)
+        out.write(b"\n")
+    out.write(f"M 100644 inline vendor/bundle.min.js\ndata {file_mb * 1024 * 1024 + 1}\n".encode())
+    for _ in range(file_mb):
+        out.write(b'z' * (1024 * 1024))
+    out.write(b"\n\n")
+    for mark in range(3, later_commits + 3):
+        commit(mark, f"Update readme {mark}")
+        content = f"# Demo\n\nRevision {mark}\n".encode()
+        out.write(f"M 100644 inline README.md\ndata {len(content)}\n".encode() + content + b"\n")
+    out.close()
+    if process.wait() != 0:
+        raise RuntimeError("git fast-import failed")
+    return path
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in megabytes, where the platform reports it"""
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    divisor = 1024 ** 2 if sys.platform == 'darwin' else 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor, 1)
+
+
+class MockOpenRouterHandler(BaseHTTPRequestHandler):
+    """Chat completion endpoint returning canned explanations.
+
+    Batched prompts (those asking for a JSON response) get one explanation
+    per ``### id:`` section. Every ``rate_limit_every``-th request is
+    answered with HTTP 429. With a ``quota``, at most that many requests
+    are accepted per ``quota_window`` seconds; every response carries
+    X-RateLimit headers and requests over the quota get a 429.
+    """
+    protocol_version = 'HTTP/1.1'  # Keep connections alive like the real API
+    disable_nagle_algorithm = True  # Headers and body are separate writes; avoid delayed-ACK stalls
+    latency = 0.05
+    rate_limit_every = 0
+    retry_after = 1
+    quota = 0
+    quota_window = 1.0
+    requests_seen = 0
+    window_start = 0.0
+    window_count = 0
+    lock = threading.Lock()
+
+    def _check_quota(self) -> Dict:
+        """Count the request against the current window and return its rate limit headers"""
+        cls = type(self)
+        with self.lock:
+            now = time.time()
+            if now - cls.window_start >= self.quota_window:
+                cls.window_start, cls.window_count = now, 0
+            cls.window_count += 1
+            reset = cls.window_start + self.quota_window
+            return {
+                'X-RateLimit-Limit': str(self.quota),
+                'X-RateLimit-Remaining': str(max(0, self.quota - cls.window_count)),
+                'X-RateLimit-Reset': str(int(reset * 1000)),
+                'over_quota': cls.window_count > self.quota
+            }
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        with self.lock:
+            type(self).requests_seen += 1
+            count = type(self).requests_seen
+
+        headers = self._check_quota() if self.quota else {}
+        time.sleep(self.latency)
+        if headers.pop('over_quota', False):
+            self._send(429, {'error': 'rate limited'}, headers)
+            return
+        if self.rate_limit_every and count % self.rate_limit_every == 0:
+            self._send(429, {'error': 'rate limited'}, {'Retry-After': str(self.retry_after)})
+            return
+
+        prompt = body['messages'][-1]['content']
+        if 'response_format' in body:
+            ids = re.findall(r'^### id: (\S+)$', prompt, re.MULTILINE)
+            content = json.dumps({'explanations': [
+                {'id': commit_id, 'explanation': f"Synthetic explanation for {commit_id}."} for commit_id in ids
+            ]})
+        else:
+            content = "Synthetic explanation for a single commit."
+
+        prompt_tokens = len(prompt) // 4 + 1
+        completion_tokens = len(content) // 4 + 1
+        self._send(200, {
+            'choices': [{'message': {'role': 'assistant', 'content': content}}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                      'total_tokens': prompt_tokens + completion_tokens}
+        }, headers)
+
+    def _send(self, status: int, payload: Dict, headers: Optional[Dict] = None):
+        encoded = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(encoded)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def create_certificate(directory: str) -> str:
+    """Create a self-signed certificate for 127.0.0.1 with openssl; returns the PEM path"""
+    cert_path = os.path.join(directory, 'mock.pem')
+    subprocess.run([
+        'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+        '-subj', '/CN=127.0.0.1', '-addext', 'subjectAltName=IP:127.0.0.1',
+        '-keyout', cert_path, '-out', cert_path
+    ], check=True, capture_output=True)
+    return cert_path
+
+
+@contextmanager
+def mock_openrouter(latency: float = 0.05, rate_limit_every: int = 0, retry_after: int = 1,
+                    cert_path: Optional[str] = None, quota: int = 0, quota_window: float = 1.0) -> Iterator[str]:
+    """Run the mock API in a background thread and yield its URL.
+
+    With ``cert_path`` (a PEM file holding key and certificate) the mock
+    serves HTTPS, so connection setup includes a TLS handshake.
+    """
+    handler = type('Handler', (MockOpenRouterHandler,), {
+        'latency': latency, 'rate_limit_every': rate_limit_every,
+        'retry_after': retry_after, 'quota': quota, 'quota_window': quota_window,
+        'requests_seen': 0, 'window_start': 0.0, 'window_count': 0, 'lock': threading.Lock()
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    scheme = 'http'
+    if cert_path:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert_path)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = 'https'
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"{scheme}://127.0.0.1:{server.server_port}/api/v1/chat/completions"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class SubprocessCounter:
+    """Counts child processes started through the subprocess module, including GitPython's"""
+
+    def __init__(self):
+        self.count = 0
+        self._original = None
+
+    def __enter__(self):
+        self._original = subprocess.Popen._execute_child
+        counter = self
+
+        def execute_child(popen, *args, **kwargs):
+            counter.count += 1
+            return counter._original(popen, *args, **kwargs)
+
+        subprocess.Popen._execute_child = execute_child
+        return self
+
+    def __exit__(self, *exc):
+        subprocess.Popen._execute_child = self._original
+
+
+class StageTimer:
+    """Collects wall time, subprocess count and peak Python memory per stage"""
+
+    def __init__(self):
+        self.stages: Dict[str, Dict] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        tracemalloc.reset_peak()
+        with SubprocessCounter() as counter:
+            start = time.perf_counter()
+            yield
+            elapsed = time.perf_counter() - start
+        self.stages[name] = {
+            'seconds': round(elapsed, 4),
+            'subprocesses': counter.count,
+            'peak_python_mb': round(tracemalloc.get_traced_memory()[1] / 1024 ** 2, 2)
+        }
+
+
+def run_pipeline(repo_url: str, work_dir: str, api_url: str, num_commits: int, workers: int,
+                 clone_strategy: str = 'full', fork_url: Optional[str] = None) -> Dict:
+    """Run a cold and a warm analysis of the repository and time every stage.
+
+    With ``fork_url`` a third run analyzes a fork holding the same changes
+    under different commit hashes, against the cache the first runs filled.
+    """
+    os.environ.setdefault('OPENROUTER_API_KEY', 'benchmark')
+    os.environ['OPENROUTER_API_URL'] = api_url
+    from git_parser import GitParser
+    from ai_explainer import AIExplainer
+    from explanation_cache import ExplanationCache
+    from explain_scheduler import ExplanationScheduler
+    from diff_condenser import condense_commits
+    from rate_limiter import TokenBucket
+    from metrics import track_request
+
+    parser = GitParser(temp_dir=os.path.join(work_dir, 'temp'), mirror_dir=os.path.join(work_dir, 'mirrors'))
+    cache = ExplanationCache(os.path.join(work_dir, 'cache', 'explanations.db'))
+    explainer = AIExplainer(rate_limiter=TokenBucket(rate=1000, capacity=1000), cache=cache,
+                            max_concurrency=workers)
+    scheduler = ExplanationScheduler(explainer, max_workers=workers)
+
+    runs = {}
+    tracemalloc.start()
+    try:
+        plan = [('cold', repo_url), ('warm', repo_url)] + ([('fork', fork_url)] if fork_url else [])
+        for run, url in plan:
+            timer = StageTimer()
+            start = time.perf_counter()
+            repository_stats: Dict = {}
+            with track_request() as timings:
+                with timer.stage('sync'):
+                    context = parser.open_repo(url, strategy=clone_strategy, stats=repository_stats)
+                    repo_path = context.__enter__()
+                try:
+                    with timer.stage('parse'):
+                        commits = parser.get_recent_commits(repo_path, num_commits)
+                        parser.add_patch_ids(repo_path, commits)
+                finally:
+                    context.__exit__(None, None, None)
+                with timer.stage('condense'):
+                    condense_commits(commits)
+                with timer.stage('explain'):
+                    results, errors = scheduler.explain_all(commits)
+
+            counts = timings.to_dict()
+            runs[run] = {
+                'wall_seconds': round(time.perf_counter() - start, 4),
+                'commits': len(results),
+                'errors': len(errors),
+                'api_requests': counts.get('api_requests', 0),
+                'rate_limited': counts.get('rate_limited', 0),
+                'cache_hits': counts.get('cache_hits', 0),
+                'patch_id_hits': counts.get('patch_id_hits', 0),
+                'repository': repository_stats,
+                'stages': timer.stages
+            }
+    finally:
+        tracemalloc.stop()
+        scheduler.shutdown()
+
+    if resource is not None:
+        runs['peak_rss_mb'] = peak_rss_mb()
+    return runs
+
+
+def compare_to_baseline(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Return a description of every metric that regressed beyond the tolerance"""
+    regressions = []
+    for run in ('cold', 'warm', 'fork'):
+        if run not in baseline or run not in results:
+            continue
+        checks = [('wall_seconds', results[run]['wall_seconds'], baseline[run]['wall_seconds'])]
+        for stage, current in results[run]['stages'].items():
+            previous = baseline[run]['stages'].get(stage)
+            if previous:
+                checks.append((f"{stage}.subprocesses", current['subprocesses'], previous['subprocesses']))
+                checks.append((f"{stage}.peak_python_mb", current['peak_python_mb'], previous['peak_python_mb']))
+        for name, current, previous in checks:
+            # Small absolute values are noisy; require a minimum absolute change as well
+            if current > previous * (1 + tolerance) and current - previous > 0.05:
+                regressions.append(f"{run}.{name}: {previous} -> {current}")
+    return regressions
+
+
+def print_report(results: Dict):
+    for run in ('cold', 'warm', 'fork'):
+        if run not in results:
+            continue
+        data = results[run]
+        print(f"\n{run} run: {data['wall_seconds']:.3f}s for {data['commits']} commits "
+              f"({data['errors']} errors), {data['api_requests']} API requests "
+              f"({data.get('rate_limited', 0)} rate limited), "
+              f"{data['cache_hits']} cache hits ({data['patch_id_hits']} by patch id)")
+        print(f"  {'stage':<10}{'seconds':>10}{'subprocs':>10}{'peak MB':>10}")
+        for stage, metrics in data['stages'].items():
+            print(f"  {stage:<10}{metrics['seconds']:>10.3f}{metrics['subprocesses']:>10}"
+                  f"{metrics['peak_python_mb']:>10.2f}")
+        repository = data['repository']
+        print(f"  repository: {repository.get('operation')} ({repository.get('strategy')}), "
+              f"{repository.get('bytes_transferred', 0)} bytes")
+    if 'peak_rss_mb' in results:
+        print(f"\npeak RSS: {results['peak_rss_mb']} MB")
+
+
+def command_pipeline(args) -> int:
+    work_dir = tempfile.mkdtemp(prefix='commitmind-bench-')
+    try:
+        repo_path = os.path.join(work_dir, 'source.git')
+        start = time.perf_counter()
+        create_synthetic_repo(repo_path, args.commits, args.files, args.files_per_commit,
+                              args.diff_lines, args.lines_per_file, args.seed)
+        print(f"Generated {args.commits} commits in {time.perf_counter() - start:.2f}s")
+        # Partial clones from a local repository require the server to allow filters
+        subprocess.run(['git', '--git-dir', repo_path, 'config', 'uploadpack.allowFilter', 'true'], check=True)
+        subprocess.run(['git', '--git-dir', repo_path, 'config', 'uploadpack.allowAnySHA1InWant', 'true'], check=True)
+
+        fork_url = None
+        if args.fork:
+            # Same changes and messages, different commit hashes
+            fork_path = os.path.join(work_dir, 'fork.git')
+            create_synthetic_repo(fork_path, args.commits, args.files, args.files_per_commit,
+                                  args.diff_lines, args.lines_per_file, args.seed, time_offset=3600)
+            fork_url = f"file://{fork_path}"
+
+        with mock_openrouter(args.latency, args.rate_limit_every, args.retry_after,
+                             quota=args.quota, quota_window=args.quota_window) as api_url:
+            results = run_pipeline(f"file://{repo_path}", work_dir, api_url, args.analyze,
+                                   args.workers, args.clone_strategy, fork_url)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    results['parameters'] = vars(args).copy()
+    results['parameters'].pop('func', None)
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo regressions against baseline")
+    return 0
+
+
+def read_huge_commit(repo_url: str, work_dir: str, num_commits: int) -> Dict:
+    """Read and condense the newest commits of a repository, measuring time and memory.
+
+    Runs in a fresh process so that its peak RSS reflects this read alone.
+    """
+    from git_parser import GitParser
+    from diff_condenser import condense_commits
+
+    parser = GitParser(temp_dir=os.path.join(work_dir, 'temp'), mirror_dir=os.path.join(work_dir, 'mirrors'))
+    with parser.open_repo(repo_url) as repo_path:
+        branch, hashes = parser.list_commits(repo_path, num_commits)
+        rss_before = peak_rss_mb()
+        tracemalloc.start()
+        start = time.perf_counter()
+        commits = parser.get_commits(repo_path, hashes, branch)
+        parser.add_patch_ids(repo_path, commits)
+        condense_commits(commits)
+        elapsed = time.perf_counter() - start
+        peak_python = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    huge = max(commits, key=lambda commit: commit['diff_stats']['additions'])
+    return {
+        'seconds': round(elapsed, 2),
+        'peak_python_mb': round(peak_python / 1024 ** 2, 2),
+        'rss_growth_mb': round(peak_rss_mb() - rss_before, 1) if rss_before is not None else None,
+        'commits': len(commits),
+        'huge_commit': huge['diff_stats'],
+        'kept_diff_bytes': sum(commit['diff_bytes'] for commit in commits)
+    }
+
+
+def command_memory(args) -> int:
+    """Check that reading a huge commit takes the same memory whatever its size"""
+    results = {}
+    # A fresh interpreter per size, so the peak RSS of one size doesn't hide the next
+    context = multiprocessing.get_context('spawn')
+    for size in sorted(args.sizes):
+        work_dir = tempfile.mkdtemp(prefix='commitmind-bench-')
+        try:
+            start = time.perf_counter()
+            repo_path = create_huge_commit_repo(os.path.join(work_dir, 'source.git'), size, args.file_mb)
+            generated = time.perf_counter() - start
+            with context.Pool(1) as pool:
+                results[size] = pool.apply(read_huge_commit, (f"file://{repo_path}", work_dir, args.commits))
+            results[size]['generate_seconds'] = round(generated, 2)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"Reading {args.commits} commits, one of which adds the given amount of text")
+    print(f"  {'size MB':<10}{'seconds':>10}{'peak MB':>10}{'RSS +MB':>10}{'kept KB':>10}  huge commit")
+    for size, data in results.items():
+        huge = data['huge_commit']
+        print(f"  {size:<10}{data['seconds']:>10.2f}{data['peak_python_mb']:>10.2f}"
+              f"{data['rss_growth_mb'] if data['rss_growth_mb'] is not None else '-':>10}"
+              f"{data['kept_diff_bytes'] // 1024:>10}  {huge['files_changed']} files, +{huge['additions']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    smallest, largest = results[min(results)], results[max(results)]
+    growth = largest['peak_python_mb'] - smallest['peak_python_mb']
+    if growth > args.slack_mb:
+        print(f"\nPeak memory grew by {growth:.1f} MB from {min(results)} MB to {max(results)} MB of diff")
+        return 1
+    print(f"\nPeak memory stayed flat ({growth:+.1f} MB from {min(results)} MB to {max(results)} MB of diff)")
+    return 0
+
+
+def classify_history(repo: str, work_dir: str, num_commits: int, page_size: int = 20) -> Dict:
+    """Read the newest commits of a real repository and classify them, timing the classifier alone.
+
+    Commits are read in pages of ``page_size`` with the server's default
+    diff caps, so truncation matches what the server sees.
+    """
+    os.environ.setdefault('OPENROUTER_API_KEY', 'benchmark')
+    from git_parser import GitParser
+    from ai_explainer import AIExplainer
+    from commit_classifier import classify_commit
+    from diff_condenser import condense_commits, parse_diff
+    from explanation_cache import ExplanationCache
+
+    local = '://' not in repo and not repo.startswith('git@')
+    url = os.path.realpath(os.path.expanduser(repo)) if local else repo
+    parser = GitParser(temp_dir=os.path.join(work_dir, 'temp'), mirror_dir=os.path.join(work_dir, 'mirrors'),
+                       allowed_local_roots=[url] if local else None)
+    commits: List[Dict] = []
+    classify_seconds = 0.0
+    try:
+        with parser.open_repo(url) as repo_path:
+            branch, hashes = parser.list_commits(repo_path, num_commits)
+            for i in range(0, len(hashes), page_size):
+                page = parser.get_commits(repo_path, hashes[i:i + page_size], branch)
+                for commit in page:
+                    files = parse_diff(commit.get('diff', ''))
+                    totals = commit.get('diff_totals') if commit.get('diff_truncated') else None
+                    start = time.perf_counter()
+                    trivial = classify_commit(commit, files, totals)
+                    classify_seconds += time.perf_counter() - start
+                    condense_commits([commit], classify=False)
+                    if trivial:
+                        commit['trivial'] = trivial
+                commits.extend(page)
+    finally:
+        parser.cleanup()
+
+    # Batched API requests needed with and without templates, as the scheduler would plan them
+    explainer = AIExplainer(cache=ExplanationCache(os.path.join(work_dir, 'explanations.db')))
+    remaining = [commit for commit in commits if not commit.get('trivial')]
+    categories: Dict[str, List[str]] = {}
+    for commit in commits:
+        if commit.get('trivial'):
+            categories.setdefault(commit['trivial']['category'], []).append(
+                f"{commit['hash'][:7]} {commit['message'].splitlines()[0] if commit['message'] else ''}")
+    return {
+        'commits': len(commits),
+        'trivial': len(commits) - len(remaining),
+        'classify_ms_per_commit': round(classify_seconds * 1000 / max(len(commits), 1), 3),
+        'requests_before': len(explainer.plan_batches(commits)),
+        'requests_after': len(explainer.plan_batches(remaining)),
+        'categories': categories
+    }
+
+
+def command_trivial(args) -> int:
+    """Report how many commits of real histories are explained from templates instead of the API"""
+    results = {}
+    for repo in args.repos:
+        work_dir = tempfile.mkdtemp(prefix='commitmind-bench-')
+        try:
+            results[repo] = classify_history(repo, work_dir, args.commits)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    for repo, data in results.items():
+        share = data['trivial'] / data['commits'] if data['commits'] else 0.0
+        print(f"\n{repo}: {data['trivial']}/{data['commits']} commits trivial ({share:.1%}), "
+              f"{data['classify_ms_per_commit']:.3f} ms per commit to classify; "
+              f"batched API requests {data['requests_before']} -> {data['requests_after']}")
+        for category, subjects in sorted(data['categories'].items(), key=lambda item: -len(item[1])):
+            print(f"  {category:<14}{len(subjects):>6}")
+            for subject in subjects[:args.show]:
+                print(f"      {subject[:100]}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+def measure_calls(call, count: int) -> Dict:
+    """Time ``count`` sequential calls, returning latency percentiles in milliseconds"""
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        call().raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        'mean_ms': round(statistics.mean(latencies), 3),
+        'p50_ms': round(latencies[len(latencies) // 2], 3),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1], 3),
+    }
+
+
+def command_http(args) -> int:
+    """Compare per-call latency of one-off requests with the pooled HttpClient over TLS"""
+    import requests
+    from http_client import HttpClient
+
+    payload = {'model': 'benchmark', 'messages': [{'role': 'user', 'content': 'ping'}]}
+    work_dir = tempfile.mkdtemp(prefix='commitmind-bench-')
+    try:
+        cert_path = create_certificate(work_dir) if not args.plain else None
+        verify = cert_path or True
+        with mock_openrouter(args.latency, cert_path=cert_path) as api_url:
+            results = {
+                # Module-level requests.post opens a new connection for every call
+                'unpooled': measure_calls(lambda: requests.post(api_url, json=payload, verify=verify, timeout=15),
+                                          args.calls),
+            }
+            client = HttpClient()
+            results['pooled'] = measure_calls(lambda: client.post(api_url, json=payload, verify=verify),
+                                              args.calls)
+            client.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"{args.calls} sequential calls against a local {'HTTP' if args.plain else 'TLS'} mock")
+    print(f"  {'client':<10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, metrics in results.items():
+        print(f"  {name:<10}{metrics['mean_ms']:>10.2f}{metrics['p50_ms']:>10.2f}{metrics['p95_ms']:>10.2f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+def free_port() -> int:
+    import socket
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_server(url: str, timeout: float = 30) -> None:
+    import requests
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(url, timeout=1).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not start within {timeout}s")
+
+
+def hammer(url: str, duration: float) -> int:
+    """Request ``url`` over one keep-alive connection until ``duration`` elapses"""
+    import requests
+    session = requests.Session()
+    count = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        session.get(url, timeout=10).raise_for_status()
+        count += 1
+    return count
+
+
+def command_serve(args) -> int:
+    """Load-test gunicorn with a growing number of worker processes"""
+    results = {}
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    for workers in args.workers:
+        work_dir = tempfile.mkdtemp(prefix='commitmind-bench-')
+        port = free_port()
+        env = {
+            **os.environ,
+            'PORT': str(port),
+            'GUNICORN_WORKERS': str(workers),
+            'GUNICORN_THREADS': str(args.threads),
+            'OPENROUTER_API_KEY': os.getenv('OPENROUTER_API_KEY', 'benchmark'),
+            'RATELIMIT_ENABLED': 'false',
+            'REPO_CACHE_DIR': os.path.join(work_dir, 'repos'),
+            'EXPLANATION_CACHE_PATH': os.path.join(work_dir, 'explanations.db'),
+            'ANALYSIS_INDEX_PATH': os.path.join(work_dir, 'analyses.db'),
+            'JOB_STORE_PATH': os.path.join(work_dir, 'jobs.db'),
+        }
+        server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+                                   '--access-logfile', '/dev/null', 'wsgi:app'],
+                                  cwd=backend_dir, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            url = f"http://127.0.0.1:{port}{args.path}"
+            wait_for_server(url)
+            with multiprocessing.Pool(args.clients) as pool:
+                start = time.perf_counter()
+                counts = pool.starmap(hammer, [(url, args.duration)] * args.clients)
+                elapsed = time.perf_counter() - start
+            results[workers] = {'requests': sum(counts), 'requests_per_second': round(sum(counts) / elapsed, 1)}
+        finally:
+            server.terminate()
+            server.wait(timeout=60)
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"GET {args.path} from {args.clients} clients for {args.duration}s, {args.threads} threads per worker")
+    print(f"  {'workers':<10}{'requests':>10}{'req/s':>10}")
+    for workers, metrics in results.items():
+        print(f"  {workers:<10}{metrics['requests']:>10}{metrics['requests_per_second']:>10.1f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+# Modules that importing the app must not load; they are only needed once a request uses them
+LAZY_MODULES = ('git', 'requests', 'ai_explainer', 'git_parser', 'http_client')
+
+STARTUP_SCRIPT = """
+import json, sys, time
+import app
+imported = time.perf_counter()
+client = app.create_app().test_client()
+assert client.get('/health').status_code == 200
+print(json.dumps({
+    'first_request_ms': (time.perf_counter() - imported) * 1000,
+    'eager_modules': [name for name in %r if name in sys.modules],
+}))
+""" % (LAZY_MODULES,)
+
+
+def parse_importtime(stderr: str, module: str) -> float:
+    """Cumulative import time of a top-level module in milliseconds from -X importtime output"""
+    for line in stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[2].strip() == module and not parts[2].startswith('  '):
+            return int(parts[1]) / 1000
+    raise ValueError(f"No import time reported for {module}")
+
+
+def command_startup(args) -> int:
+    """Measure how long a fresh interpreter takes to import the app and serve its first request"""
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    # Startup must not depend on the API key; it is only needed for the first explanation
+    env = {key: value for key, value in os.environ.items() if key != 'OPENROUTER_API_KEY'}
+    env['RATELIMIT_ENABLED'] = 'false'
+    samples = []
+    for _ in range(args.runs):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT], cwd=backend_dir,
+                                env=env, capture_output=True, text=True, check=True)
+        sample = json.loads(result.stdout.strip().splitlines()[-1])
+        sample['importtime_ms'] = parse_importtime(result.stderr, 'app')
+        samples.append(sample)
+
+    results = {
+        name: round(statistics.median(sample[name] for sample in samples), 1)
+        for name in ('importtime_ms', 'first_request_ms')
+    }
+    results['eager_modules'] = sorted({name for sample in samples for name in sample['eager_modules']})
+
+    print(f"Median of {args.runs} fresh interpreters")
+    print(f"  import app:               {results['importtime_ms']:.1f} ms")
+    print(f"  create_app + GET /health: {results['first_request_ms']:.1f} ms")
+    print(f"  heavy modules loaded eagerly: {', '.join(results['eager_modules']) or 'none'}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    failures = [f"{name} imported at startup" for name in results['eager_modules']]
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for name in ('importtime_ms', 'first_request_ms'):
+            previous = baseline.get(name)
+            # Startup times are noisy; require a minimum absolute change as well
+            if previous and results[name] > previous * (1 + args.tolerance) and results[name] - previous > 20:
+                failures.append(f"{name}: {previous} -> {results[name]}")
+    if failures:
+        print("\nStartup regressions:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    pipeline = subparsers.add_parser('pipeline', help='Benchmark clone, parse, condense and explain')
+    pipeline.add_argument('--commits', type=int, default=200, help='Commits in the synthetic repository')
+    pipeline.add_argument('--files', type=int, default=50, help='Files in the synthetic repository')
+    pipeline.add_argument('--files-per-commit', type=int, default=3)
+    pipeline.add_argument('--diff-lines', type=int, default=20, help='Changed lines per file per commit')
+    pipeline.add_argument('--lines-per-file', type=int, default=200)
+    pipeline.add_argument('--seed', type=int, default=0)
+    pipeline.add_argument('--analyze', type=int, default=20, help='Commits to analyze')
+    pipeline.add_argument('--workers', type=int, default=4, help='Explanation worker threads')
+    pipeline.add_argument('--clone-strategy', default='full', choices=['full', 'blobless', 'treeless'])
+    pipeline.add_argument('--latency', type=float, default=0.05, help='Mock API latency in seconds')
+    pipeline.add_argument('--rate-limit-every', type=int, default=0,
+                          help='Answer every Nth API request with HTTP 429 (0 disables)')
+    pipeline.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with 429s')
+    pipeline.add_argument('--quota', type=int, default=0,
+                          help='Mock API requests allowed per --quota-window, with X-RateLimit headers (0 disables)')
+    pipeline.add_argument('--quota-window', type=float, default=1.0, help='Mock API quota window in seconds')
+    pipeline.add_argument('--fork', action='store_true',
+                          help='Also analyze a fork with the same changes under different hashes')
+    pipeline.add_argument('--output', help='Write results as JSON')
+    pipeline.add_argument('--baseline', help='Fail if results regress against this JSON file')
+    pipeline.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative regression')
+    pipeline.set_defaults(func=command_pipeline)
+
+    http = subparsers.add_parser('http', help='Compare pooled and one-off API calls over TLS')
+    http.add_argument('--calls', type=int, default=200, help='Sequential calls per client')
+    http.add_argument('--latency', type=float, default=0.0, help='Mock API latency in seconds')
+    http.add_argument('--plain', action='store_true', help='Serve plain HTTP instead of TLS')
+    http.add_argument('--output', help='Write results as JSON')
+    http.set_defaults(func=command_http)
+
+    serve = subparsers.add_parser('serve', help='Load-test the production server with several worker counts')
+    serve.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help='Gunicorn worker counts to try')
+    serve.add_argument('--threads', type=int, default=8, help='Threads per worker')
+    serve.add_argument('--clients', type=int, default=8, help='Concurrent client processes')
+    serve.add_argument('--duration', type=float, default=5.0, help='Seconds of load per worker count')
+    serve.add_argument('--path', default='/health', help='Endpoint to request')
+    serve.add_argument('--output', help='Write results as JSON')
+    serve.set_defaults(func=command_serve)
+
+    startup = subparsers.add_parser('startup', help='Measure import time and time to first request')
+    startup.add_argument('--runs', type=int, default=5, help='Fresh interpreters to start')
+    startup.add_argument('--output', help='Write results as JSON')
+    startup.add_argument('--baseline', help='Fail if startup regresses against this JSON file')
+    startup.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative regression')
+    startup.set_defaults(func=command_startup)
+
+    memory = subparsers.add_parser('memory', help='Check memory stays flat when reading huge commits')
+    memory.add_argument('--sizes', type=int, nargs='+', default=[64, 1024],
+                        help='Megabytes of text the huge commit adds, one run per size')
+    memory.add_argument('--file-mb', type=int, default=16, help='Size of each file in the huge commit')
+    memory.add_argument('--commits', type=int, default=5, help='Commits to read, including the huge one')
+    memory.add_argument('--slack-mb', type=float, default=8.0,
+                        help='Allowed growth of peak Python memory from the smallest to the largest size')
+    memory.add_argument('--output', help='Write results as JSON')
+    memory.set_defaults(func=command_memory)
+
+    trivial = subparsers.add_parser('trivial', help='Count commits of real histories explained without the API')
+    trivial.add_argument('repos', nargs='+', help='Repository URLs or local paths')
+    trivial.add_argument('--commits', type=int, default=500, help='Newest commits to classify per repository')
+    trivial.add_argument('--show', type=int, default=3, help='Example commits to list per category')
+    trivial.add_argument('--output', help='Write results as JSON')
+    trivial.set_defaults(func=command_trivial)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
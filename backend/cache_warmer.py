@@ -0,0 +1,80 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional
+
+from metrics import WARM_RUNS, record_time
+from repo_cache import file_lock
+
+
+class CacheWarmer:
+    """Keeps the analyses of watched repositories warm from a background thread.
+
+    Every ``interval_seconds`` each repository on the watch list is passed
+    to ``warm`` on a pool of ``max_workers`` threads. ``warm`` decides
+    whether the cached analysis is missing or due for a refresh and returns
+    a dict with its ``outcome``. With several server processes, a round
+    only runs in the process that holds the lock on ``lock_path``, so no
+    repository is warmed twice.
+    """
+
+    def __init__(self, warm: Callable[[str], Dict], repos: List[str], interval_seconds: float,
+                 max_workers: int = 2, lock_path: Optional[str] = None):
+        self.warm = warm
+        self.repos = repos
+        self.interval_seconds = interval_seconds
+        self.lock_path = lock_path
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='warm')
+        self.status: Dict[str, Dict] = {}  # Last outcome per repository, in this process
+        self._status_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if lock_path:
+            os.makedirs(os.path.dirname(os.path.abspath(lock_path)), exist_ok=True)
+
+    def start(self):
+        """Start warming rounds in the background; the first round runs immediately"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='cache-warmer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Cache warming round failed: {str(e)}")
+            self._stop.wait(self.interval_seconds)
+
+    def run_once(self) -> bool:
+        """Warm every watched repository once; returns False if another process is warming"""
+        if self.lock_path is None:
+            self._warm_all()
+            return True
+        with file_lock(self.lock_path, blocking=False) as acquired:
+            if acquired:
+                self._warm_all()
+            return acquired
+
+    def _warm_all(self):
+        start = time.monotonic()
+        wait([self.executor.submit(self._warm, repo) for repo in self.repos])
+        print(f"Warmed {len(self.repos)} watched repositories in {time.monotonic() - start:.1f}s")
+
+    def _warm(self, repo: str):
+        start = time.monotonic()
+        try:
+            result = self.warm(repo)
+        except Exception as e:
+            print(f"Failed to warm {repo}: {str(e)}")
+            result = {'outcome': 'error', 'error': str(e)}
+        seconds = time.monotonic() - start
+        WARM_RUNS.inc(outcome=result['outcome'])
+        record_time('warm', seconds)
+        with self._status_lock:
+            self.status[repo] = {**result, 'seconds': round(seconds, 3), 'warmed_at': time.time()}
+
+    def shutdown(self, wait: bool = False):
+        self._stop.set()
+        self.executor.shutdown(wait=wait, cancel_futures=True)
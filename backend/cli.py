@@ -0,0 +1,289 @@
+"""Analyze many repositories from the command line and write the results as JSON Lines.
+
+Each line of the input file is a repository URL or a local path; blank
+lines and lines starting with '#' are ignored. Local checkouts and bare
+repositories are read in place without cloning, and local .bundle files
+are unpacked into the mirror store. Git work (clone or fetch,
+reading commits, condensing diffs) runs in a pool of processes, while the
+explanations for all repositories share one pool of API workers and one
+rate limiter. Every repository produces one JSON object per line in the
+output file, written as soon as it is done.
+
+--token-budget caps the API tokens of the whole run; once it is spent, the
+remaining commits get a summary of their commit message and their
+repositories are recorded as partial, so --resume retries them.
+
+With --resume, repositories that already have a successful record in the
+output file are skipped when their remote HEAD still matches the recorded
+one; repositories whose HEAD moved, or that failed before, are analyzed
+again and a new record is appended (the last record of a repository wins).
+
+Usage:
+    python cli.py repos.txt --output results.jsonl
+    python cli.py repos.txt --output results.jsonl --resume --processes 4 --explain-workers 8
+"""
+import argparse
+import contextvars
+import json
+import multiprocessing.util
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# GitParser of the current pool process, created by _init_git_worker
+_git_parser = None
+
+
+def read_repository_list(path: str) -> List[str]:
+    """Return the repositories listed in a file, in order and without duplicates"""
+    repos: List[str] = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#') and line not in repos:
+                repos.append(line)
+    return repos
+
+
+def is_url(repo: str) -> bool:
+    return '://' in repo or repo.startswith('git@')
+
+
+def repository_url(repo: str) -> str:
+    """Turn a local path into the absolute path GitParser reads it from; URLs are returned unchanged"""
+    if is_url(repo):
+        return repo
+    path = Path(repo).expanduser()
+    if not path.exists():
+        raise ValueError(f"No such repository path: {repo}")
+    return str(path.resolve())
+
+
+def read_previous_results(path: str) -> Dict[str, Dict]:
+    """Return the last record of each repository in an existing output file.
+
+    A line cut short by an interrupted run is ignored, so the repository it
+    belonged to is analyzed again.
+    """
+    records: Dict[str, Dict] = {}
+    if not os.path.exists(path):
+        return records
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and 'repo' in record:
+                records[record['repo']] = record
+    return records
+
+
+def _init_git_worker(temp_dir: str, mirror_dir: Optional[str], clone_strategy: str, local_roots: List[str]):
+    """Create the GitParser used by one pool process and clean up its files when it exits"""
+    global _git_parser
+    from git_parser import GitParser
+    _git_parser = GitParser(temp_dir=temp_dir, mirror_dir=mirror_dir, clone_strategy=clone_strategy,
+                            allowed_local_roots=local_roots)
+    # Pool processes leave through os._exit, which skips atexit handlers
+    multiprocessing.util.Finalize(None, _git_parser.cleanup, exitpriority=10)
+
+
+def read_repository(repo: str, github_token: Optional[str], num_commits: int,
+                    known_head: Optional[str], classify: bool = True) -> Dict:
+    """Pool process entry point: sync a repository and read its commits with condensed diffs.
+
+    Returns {'head'} alone when the remote HEAD equals ``known_head``,
+    otherwise {'head', 'commits', 'repository'}.
+    """
+    from diff_condenser import condense_commits
+
+    url = repository_url(repo)
+    if known_head:
+        head = _git_parser.resolve_head(url, github_token)
+        if head == known_head:
+            return {'head': head}
+
+    stats: Dict = {}
+    with _git_parser.open_repo(url, github_token, stats=stats) as repo_path:
+        branch, hashes = _git_parser.list_commits(repo_path, num_commits)
+        commits = _git_parser.get_commits(repo_path, hashes, branch)
+        _git_parser.add_patch_ids(repo_path, commits)
+    condense_commits(commits, classify=classify)
+    return {'head': hashes[0] if hashes else None, 'commits': commits, 'repository': stats}
+
+
+class ResultWriter:
+    """Appends one JSON record per line, flushed immediately so an interrupted run can resume"""
+
+    def __init__(self, path: str, append: bool):
+        self.file = open(path, 'a' if append else 'w')
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict):
+        line = json.dumps(record)
+        with self._lock:
+            self.file.write(line + '\n')
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def explain_repository(scheduler, repo: str, data: Dict) -> Dict:
+    """Explain the commits read for a repository and build its output record"""
+    results, errors = scheduler.explain_all(data['commits'])
+    degraded = len([result for result in results if result['status'] == 'degraded'])
+    return {
+        'repo': repo,
+        'status': 'success' if not errors and not degraded else 'partial',
+        'head': data['head'],
+        'analyzed_at': datetime.now(timezone.utc).isoformat(),
+        'repository': data['repository'],
+        'total_commits': len(results),
+        'failed_commits': len(errors),
+        'degraded_commits': degraded,
+        'errors': errors or None,
+        'commits': results
+    }
+
+
+def run(args) -> int:
+    from ai_explainer import AIExplainer
+    from explain_scheduler import ExplanationScheduler
+    from explanation_cache import ExplanationCache
+    from metrics import track_request
+    from model_router import ModelRouter, ModelSpec
+    from rate_limiter import TokenBucket
+    from token_budget import TokenBudget
+
+    repos = read_repository_list(args.input)
+    previous = read_previous_results(args.output) if args.resume else {}
+    writer = ResultWriter(args.output, append=args.resume)
+    github_token = os.getenv('GITHUB_TOKEN')
+
+    router = ModelRouter(ModelSpec(args.model, float(os.getenv('OPENROUTER_MODEL_PRICE', '0'))),
+                         ModelSpec(args.large_model, float(os.getenv('OPENROUTER_LARGE_MODEL_PRICE', '0')))
+                         if args.large_model else None, args.large_model_min_tokens)
+    explainer = AIExplainer(rate_limiter=TokenBucket(args.rate_limit, args.rate_burst),
+                            cache=ExplanationCache(args.cache), max_concurrency=args.explain_workers,
+                            router=router, budget=TokenBudget(args.token_budget, scope='run'))
+    # One scheduler for every repository, so API concurrency is bounded across the whole run
+    scheduler = ExplanationScheduler(explainer, max_workers=args.explain_workers)
+    counts = {'success': 0, 'partial': 0, 'error': 0, 'unchanged': 0}
+    counts_lock = threading.Lock()
+    start = time.monotonic()
+
+    def finish(repo: str, status: str, record: Optional[Dict] = None):
+        if record is not None:
+            writer.write(record)
+        with counts_lock:
+            counts[status] += 1
+            done = sum(counts.values())
+        print(f"[{done}/{len(repos)}] {repo}: {status}", file=sys.stderr)
+
+    def explain(repo: str, data: Dict):
+        record = explain_repository(scheduler, repo, data)
+        finish(repo, record['status'], record)
+
+    # The repository list is trusted: each local path listed may be read, and nothing else
+    local_roots = [str(Path(repo).expanduser().resolve()) for repo in repos if not is_url(repo)]
+    git_pool = ProcessPoolExecutor(max_workers=args.processes, initializer=_init_git_worker,
+                                   initargs=(args.temp_dir, args.mirror_dir, args.clone_strategy, local_roots))
+    # Explaining blocks on the shared scheduler; a thread per repository in progress waits for it
+    explain_pool = ThreadPoolExecutor(max_workers=max(args.processes, 1), thread_name_prefix='repo')
+    try:
+        with track_request() as timings:
+            futures = {}
+            for repo in repos:
+                record = previous.get(repo)
+                known_head = record['head'] if record and record.get('status') == 'success' else None
+                futures[git_pool.submit(read_repository, repo, github_token, args.commits, known_head,
+                                        not args.explain_trivial)] = repo
+
+            explaining = []
+            for future in as_completed(futures):
+                repo = futures[future]
+                try:
+                    data = future.result()
+                except Exception as e:
+                    finish(repo, 'error', {'repo': repo, 'status': 'error', 'error': str(e),
+                                           'analyzed_at': datetime.now(timezone.utc).isoformat()})
+                    continue
+                if 'commits' not in data:
+                    finish(repo, 'unchanged')
+                    continue
+                # A copy of the context per repository, so API calls count towards the run's totals
+                explaining.append(explain_pool.submit(contextvars.copy_context().run, explain, repo, data))
+            for future in explaining:
+                future.result()
+    finally:
+        git_pool.shutdown()
+        explain_pool.shutdown()
+        scheduler.shutdown()
+        writer.close()
+
+    summary = timings.to_dict()
+    print(f"Done in {time.monotonic() - start:.1f}s: {counts['success']} analyzed, {counts['partial']} partial, "
+          f"{counts['unchanged']} unchanged, {counts['error']} failed; "
+          f"{summary.get('api_requests', 0)} API requests, {summary.get('cache_hits', 0)} cache hits, "
+          f"{summary.get('trivial_commits', 0)} trivial commits explained without the API, "
+          f"{summary.get('prompt_tokens', 0) + summary.get('completion_tokens', 0):g} tokens "
+          f"(${summary.get('cost_usd', 0):.4f})", file=sys.stderr)
+    return 1 if counts['error'] else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help='File with one repository URL or local path per line')
+    parser.add_argument('--output', '-o', required=True, help='JSON Lines file to write')
+    parser.add_argument('--resume', action='store_true',
+                        help='Append to the output and skip repositories whose HEAD is unchanged')
+    parser.add_argument('--commits', type=int, default=20, help='Commits to analyze per repository')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 2,
+                        help='Processes for git work')
+    parser.add_argument('--explain-workers', type=int, default=int(os.getenv('EXPLAIN_WORKERS', '4')),
+                        help='Concurrent API requests shared by all repositories')
+    parser.add_argument('--rate-limit', type=float, default=float(os.getenv('OPENROUTER_RATE_LIMIT', '2')),
+                        help='API requests per second')
+    parser.add_argument('--rate-burst', type=int, default=int(os.getenv('OPENROUTER_RATE_BURST', '4')))
+    parser.add_argument('--model', default=os.getenv('OPENROUTER_MODEL', 'gpt-3.5-turbo'),
+                        help='Model for commits with small diffs')
+    parser.add_argument('--large-model', default=os.getenv('OPENROUTER_LARGE_MODEL'),
+                        help='Model for commits whose prompt reaches --large-model-min-tokens')
+    parser.add_argument('--large-model-min-tokens', type=int,
+                        default=int(os.getenv('LARGE_MODEL_MIN_TOKENS', '400')))
+    parser.add_argument('--token-budget', type=int, default=0,
+                        help='API tokens the whole run may use (0 = unlimited)')
+    parser.add_argument('--explain-trivial', action='store_true',
+                        help='Send merges, version bumps and other trivial commits to the API too')
+    parser.add_argument('--clone-strategy', default=os.getenv('CLONE_STRATEGY', 'full'),
+                        choices=['full', 'blobless', 'treeless'])
+    parser.add_argument('--cache', default=os.getenv('EXPLANATION_CACHE_PATH',
+                                                     os.path.join(BACKEND_DIR, 'cache', 'explanations.db')),
+                        help='Explanation cache database, shared with the server by default')
+    parser.add_argument('--mirror-dir', default=os.getenv('REPO_CACHE_DIR'),
+                        help='Repository mirror store (defaults to ../repo_cache)')
+    parser.add_argument('--temp-dir', default=os.path.join(BACKEND_DIR, '..', 'temp'))
+    args = parser.parse_args(argv)
+    if args.commits < 1 or args.processes < 1 or args.explain_workers < 1 or args.rate_burst < 1 \
+            or args.rate_limit <= 0:
+        parser.error('--commits, --processes, --explain-workers, --rate-limit and --rate-burst must be positive')
+    if args.token_budget < 0:
+        parser.error('--token-budget must not be negative')
+    return run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,277 @@
+"""Recognize trivial commits and explain them from templates, without the API.
+
+A commit is trivial when its metadata and diff alone say everything worth
+saying: merges, empty commits, lockfile-only updates, dependency and
+version bumps, whitespace-only reformatting and typo fixes. Anything that
+doesn't match a category exactly is left to the model.
+"""
+import os
+import re
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Tuple
+
+from diff_condenser import classify_file
+
+# Bump when templates or rules change, so stored analyses are redone
+CLASSIFIER_VERSION = 1
+
+MANIFEST_NAMES = {
+    'package.json', 'requirements.txt', 'requirements-dev.txt', 'dev-requirements.txt', 'constraints.txt',
+    'pyproject.toml', 'setup.py', 'setup.cfg', 'pipfile', 'cargo.toml', 'go.mod', 'gemfile', 'composer.json',
+    'pom.xml', 'mix.exs', 'pubspec.yaml', 'build.gradle', 'build.gradle.kts',
+}
+WORKFLOW = re.compile(r'(?:^|/)\.github/workflows/[^/]+\.ya?ml$')
+VERSION_FILE_NAMES = {'version', 'version.txt', 'version.py', '_version.py', '__version__.py', '__init__.py'}
+CHANGELOG = re.compile(r'^(?:changelog|changes|history|news|release[-_]?notes)(?:\.\w+)?$', re.IGNORECASE)
+# Leading whitespace is significant in these files, so only trailing whitespace and blank lines may change
+INDENT_SENSITIVE = {'.py', '.pyx', '.yaml', '.yml', '.coffee', '.haml', '.slim', '.pug', '.nim', '.fs', '.mk'}
+
+VERSION = r'v?\d+(?:\.\d+)+[\w.+-]*'
+VERSION_LINES = [
+    re.compile(rf'''^\s*["']?(?:__version__|version|VERSION)["']?\s*[:=]\s*["']?({VERSION})["']?\s*[,;]?\s*$'''),
+    re.compile(rf'^\s*<version>({VERSION})</version>\s*$'),
+    re.compile(rf'^\s*({VERSION})\s*$'),
+]
+DEPENDENCY_LINES = [
+    # package.json, composer.json: "name": "^1.2.3"
+    re.compile(r'^\s*"(@?[\w.@/-]+)"\s*:\s*"([\^~<>=*]*\s*v?\d[\w.*+ <>=|^~-]*)"\s*,?\s*$'),
+    # requirements.txt, setup.py/pyproject.toml lists: name>=1.2 or "name==1.2",
+    re.compile(r'''^\s*["']?([A-Za-z0-9][\w.\[\],-]*)\s*((?:==|>=|<=|~=|!=|>|<)\s*[\w.*+!]+(?:\s*,\s*(?:==|>=|<=|~=|!=|>|<)\s*[\w.*+!]+)*)["']?\s*,?\s*$'''),
+    # Cargo.toml, Pipfile, poetry: name = "1.2"
+    re.compile(r'''^\s*([\w.-]+)\s*=\s*["']([\^~<>=*]*\s*\d[\w.*+ ,<>=^~-]*)["']\s*$'''),
+    # go.mod: require path v1.2.3
+    re.compile(r'^\s*(?:require\s+)?([\w.-]+/[\w./-]+)\s+(v\d[\w.+-]*)(?:\s*//.*)?$'),
+    # Gemfile: gem "name", "~> 1.2"
+    re.compile(r'''^\s*gem\s+["']([\w-]+)["']\s*,\s*["']([^"']+)["']'''),
+    # GitHub Actions workflows: uses: owner/action@v4
+    re.compile(r'''^\s*(?:-\s*)?uses:\s*["']?([\w.-]+/[\w./-]+)@([\w.-]+)["']?\s*(?:#.*)?$'''),
+]
+TYPO_MESSAGE = re.compile(r'\b(?:typos?|spelling|misspell\w*|misspelt)\b', re.IGNORECASE)
+MERGE_PULL_REQUEST = re.compile(r'^Merge pull request (#\d+) from (\S+)')
+MERGE_SUBJECT = re.compile(r'^Merge\b')
+MERGE_BRANCH = re.compile(r"^Merge (?:remote-tracking )?branch '([^']+)'(?: of \S+)?(?: into (\S+))?")
+WORD = re.compile(r'\w+|[^\w\s]')
+
+MAX_TYPO_LINES = 10  # Changed line pairs a typo fix may touch
+MAX_TYPO_WORDS = 2  # Words that may differ per line pair
+MAX_LISTED = 5  # Names listed in a template before "and N more"
+
+
+def _plural(count: int, word: str) -> str:
+    return f"{count} {word}{'s' if count != 1 else ''}"
+
+
+def _listing(items: List[str]) -> str:
+    listed = ', '.join(items[:MAX_LISTED])
+    if len(items) > MAX_LISTED:
+        listed += f" and {len(items) - MAX_LISTED} more"
+    return listed
+
+
+def _subject(commit: Dict) -> str:
+    lines = commit['message'].strip().splitlines()
+    return lines[0].strip() if lines else ''
+
+
+def _changed_lines(file: Dict) -> Tuple[List[str], List[str]]:
+    """Removed and added line contents of a file, without the diff markers"""
+    removed = [line[1:] for hunk in file['hunks'] for line in hunk['lines'] if line[0] == '-']
+    added = [line[1:] for hunk in file['hunks'] for line in hunk['lines'] if line[0] == '+']
+    return removed, added
+
+
+def _match(patterns: List[re.Pattern], line: str) -> Optional[re.Match]:
+    for pattern in patterns:
+        match = pattern.match(line)
+        if match:
+            return match
+    return None
+
+
+def _diff_size(files: List[Dict], totals: Optional[Dict]) -> str:
+    files_changed = totals['files_changed'] if totals else len(files)
+    additions = totals['additions'] if totals else sum(f['additions'] for f in files)
+    deletions = totals['deletions'] if totals else sum(f['deletions'] for f in files)
+    return f"{_plural(files_changed, 'file')} changed, +{additions} -{deletions}"
+
+
+def _explain_merge(commit: Dict, files: List[Dict], totals: Optional[Dict]) -> str:
+    subject = _subject(commit)
+    pull_request = MERGE_PULL_REQUEST.match(subject)
+    branch = MERGE_BRANCH.match(subject)
+    if pull_request:
+        body = [line.strip() for line in commit['message'].strip().splitlines()[1:] if line.strip()]
+        text = f"Merges pull request {pull_request.group(1)} from {pull_request.group(2)}"
+        if body:
+            text += f" ({body[0]})"
+    elif branch:
+        text = f"Merges branch '{branch.group(1)}' into {branch.group(2) or 'the current branch'}"
+    else:
+        text = f"Merge commit: {subject}" if subject else "Merge commit"
+    if files or totals:
+        return f"{text}. Compared with the first parent it brings in {_diff_size(files, totals)}."
+    return f"{text}, with no changes compared with the first parent."
+
+
+def _classify_manifests(files: List[Dict]) -> Optional[Tuple[str, str]]:
+    """Explain commits that only change versions, dependency pins and lockfiles"""
+    versions: List[Tuple[str, str]] = []
+    old_deps: Dict[str, str] = {}
+    new_deps: Dict[str, str] = {}
+    lockfiles: List[str] = []
+    changelogs = 0
+    for file in files:
+        name = os.path.basename(file['path']).lower()
+        if classify_file(file['path']) == 'lockfile':
+            lockfiles.append(file['path'])
+            continue
+        if CHANGELOG.match(name):
+            changelogs += 1
+            continue
+        manifest = name in MANIFEST_NAMES or bool(WORKFLOW.search(file['path']))
+        if file['binary'] or file['status'] != 'modified' or (not manifest and name not in VERSION_FILE_NAMES):
+            return None
+        removed, added = _changed_lines(file)
+        old_versions, new_versions = [], []
+        for lines, version_list, deps in ((removed, old_versions, old_deps), (added, new_versions, new_deps)):
+            for line in lines:
+                if not line.strip():
+                    continue
+                version = _match(VERSION_LINES, line)
+                if version:
+                    version_list.append(version.group(1))
+                    continue
+                dependency = _match(DEPENDENCY_LINES, line) if manifest else None
+                if not dependency:
+                    return None
+                deps[dependency.group(1)] = dependency.group(2).strip()
+        if new_versions and new_versions[:1] != old_versions[:1]:
+            versions.append((old_versions[0] if old_versions else '', new_versions[0]))
+
+    changes = []
+    for name in list(old_deps) + [name for name in new_deps if name not in old_deps]:
+        old, new = old_deps.get(name), new_deps.get(name)
+        if old == new:
+            continue
+        if old is None:
+            changes.append(f"adds {name} {new}")
+        elif new is None:
+            changes.append(f"removes {name}")
+        else:
+            changes.append(f"{name} {old} -> {new}")
+
+    if changes:
+        text = f"Updates dependencies: {_listing(changes)}"
+        if lockfiles:
+            text += f", and regenerates {_listing(lockfiles)}"
+        return 'dependencies', text + '.'
+    if versions:
+        old, new = versions[0]
+        text = f"Bumps the version from {old} to {new}" if old else f"Sets the version to {new}"
+        if changelogs:
+            text += " and updates the changelog"
+        return 'version_bump', text + '.'
+    if lockfiles and not changelogs and len(lockfiles) == len(files):
+        return 'lockfile', (f"Updates {_plural(len(lockfiles), 'dependency lockfile')} ({_listing(lockfiles)}) "
+                            f"without changing any dependency declarations.")
+    return None
+
+
+def _without_whitespace(lines: List[str], keep_indent: bool) -> List[str]:
+    if keep_indent:
+        return [line.rstrip() for line in lines if line.strip()]
+    # Tokens rather than characters, so joining two words doesn't count as whitespace
+    return WORD.findall(' '.join(lines))
+
+
+def _is_whitespace_only(files: List[Dict]) -> bool:
+    if not any(file['hunks'] for file in files):
+        return False  # Mode changes only
+    for file in files:
+        if file['binary'] or file['status'] != 'modified' or classify_file(file['path']):
+            return False
+        name = os.path.basename(file['path'])
+        keep_indent = os.path.splitext(name)[1].lower() in INDENT_SENSITIVE or name == 'Makefile'
+        # Per hunk, so text can't just move between distant places in the file
+        for hunk in file['hunks']:
+            removed = [line[1:] for line in hunk['lines'] if line[0] == '-']
+            added = [line[1:] for line in hunk['lines'] if line[0] == '+']
+            if _without_whitespace(removed, keep_indent) != _without_whitespace(added, keep_indent):
+                return False
+    return True
+
+
+def _typo_corrections(files: List[Dict]) -> Optional[List[str]]:
+    """The word corrections of a small diff, or None if any change is more than a spelling fix"""
+    corrections: List[str] = []
+    pairs = 0
+    for file in files:
+        if file['binary'] or file['status'] != 'modified':
+            return None
+        for hunk in file['hunks']:
+            removed = [line[1:] for line in hunk['lines'] if line[0] == '-']
+            added = [line[1:] for line in hunk['lines'] if line[0] == '+']
+            if len(removed) != len(added):
+                return None
+            pairs += len(removed)
+            if pairs > MAX_TYPO_LINES:
+                return None
+            for old_line, new_line in zip(removed, added):
+                old_words, new_words = WORD.findall(old_line), WORD.findall(new_line)
+                if len(old_words) != len(new_words):
+                    return None
+                changed = [(old, new) for old, new in zip(old_words, new_words) if old != new]
+                if len(changed) > MAX_TYPO_WORDS:
+                    return None
+                for old, new in changed:
+                    if not (old.isalpha() and new.isalpha()) or \
+                            SequenceMatcher(None, old.lower(), new.lower()).ratio() < 0.6:
+                        return None
+                    correction = f"'{old}' -> '{new}'"
+                    if correction not in corrections:
+                        corrections.append(correction)
+    return corrections or None
+
+
+def classify_commit(commit: Dict, files: List[Dict], totals: Optional[Dict] = None) -> Optional[Dict]:
+    """Return {'category', 'explanation'} for a trivial commit, or None.
+
+    ``files`` is the commit's diff parsed by diff_condenser.parse_diff; for
+    a merge it is the diff against the first parent. Merges with a message
+    of their own are treated like other commits, as they often carry the
+    change itself. ``totals`` are the counts of a truncated diff, which is
+    only classified as a merge or, when every file was seen, as a lockfile
+    update.
+    """
+    category: Optional[str] = None
+    explanation = ''
+    if len(commit.get('parents', [])) > 1 and (MERGE_SUBJECT.match(_subject(commit)) or not (files or totals)):
+        category, explanation = 'merge', _explain_merge(commit, files, totals)
+    elif totals:
+        if totals['files_changed'] == len(files) and \
+                all(classify_file(file['path']) == 'lockfile' for file in files):
+            category, explanation = 'lockfile', (
+                f"Updates {_plural(len(files), 'dependency lockfile')} ({_listing([f['path'] for f in files])}) "
+                f"without changing any dependency declarations.")
+    elif not files:
+        subject = _subject(commit)
+        category = 'empty'
+        explanation = f"Empty commit without file changes{': ' + subject if subject else ''}."
+    else:
+        manifests = _classify_manifests(files)
+        if manifests:
+            category, explanation = manifests
+        elif _is_whitespace_only(files):
+            paths = [file['path'] for file in files]
+            category = 'whitespace'
+            explanation = (f"Formatting-only change: adjusts whitespace, indentation or line breaks in "
+                           f"{_listing(paths)} without changing any code or text.")
+        elif TYPO_MESSAGE.search(commit['message']):
+            corrections = _typo_corrections(files)
+            if corrections:
+                category = 'typo'
+                explanation = (f"Fixes {_plural(len(corrections), 'typo')} ({_listing(corrections)}) in "
+                               f"{_listing([file['path'] for file in files])}.")
+    if category is None:
+        return None
+    return {'category': category, 'explanation': explanation}
@@ -0,0 +1,217 @@
+import os
+import re
+from fnmatch import fnmatch
+from typing import Dict, List, Optional, Tuple
+
+# Files whose diffs say little about intent; they are listed but not shown
+LOCKFILE_NAMES = {
+    'package-lock.json', 'yarn.lock', 'pnpm-lock.yaml', 'npm-shrinkwrap.json',
+    'poetry.lock', 'pipfile.lock', 'pdm.lock', 'uv.lock', 'cargo.lock', 'gemfile.lock',
+    'composer.lock', 'go.sum', 'mix.lock', 'podfile.lock', 'pubspec.lock', 'flake.lock',
+}
+GENERATED_PATTERNS = [
+    '*.min.js', '*.min.css', '*.map', '*.snap', '*_pb2.py', '*_pb2_grpc.py', '*.pb.go',
+    '*.generated.*', '*.g.dart', 'dist/*', 'build/*', 'vendor/*', 'node_modules/*',
+    '*/dist/*', '*/build/*', '*/vendor/*', '*/node_modules/*',
+]
+
+HUNK_HEADER = re.compile(r'^@@ -\d+(?:,\d+)? \+\d+(?:,\d+)? @@(.*)$')
+# Changed lines that introduce or modify definitions are usually the most telling
+DEFINITION = re.compile(r'^[+-]\s*(?:export\s+)?(?:async\s+)?(?:def|class|function|func|fn|interface|struct|enum|type|public|private|protected)\b')
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (about four characters per token)"""
+    return len(text) // 4 + 1
+
+
+def classify_file(path: str) -> Optional[str]:
+    """Return why a file should be skipped ('lockfile' or 'generated'), or None"""
+    name = os.path.basename(path).lower()
+    if name in LOCKFILE_NAMES:
+        return 'lockfile'
+    if any(fnmatch(path, pattern) for pattern in GENERATED_PATTERNS):
+        return 'generated'
+    return None
+
+
+def parse_diff(diff: str) -> List[Dict]:
+    """Parse a unified git diff into per-file entries with hunks and line counts"""
+    files: List[Dict] = []
+    current: Optional[Dict] = None
+    hunk: Optional[Dict] = None
+
+    for line in diff.splitlines():
+        if line.startswith('diff --git '):
+            paths = line[len('diff --git '):].split(' b/', 1)
+            old_path = paths[0][2:] if paths[0].startswith('a/') else paths[0]
+            new_path = paths[1] if len(paths) > 1 else old_path
+            current = {
+                'path': new_path,
+                'old_path': old_path,
+                'status': 'renamed' if old_path != new_path else 'modified',
+                'binary': False,
+                'additions': 0,
+                'deletions': 0,
+                'hunks': []
+            }
+            files.append(current)
+            hunk = None
+        elif current is None:
+            continue
+        elif hunk is None and line.startswith('new file mode'):
+            current['status'] = 'added'
+        elif hunk is None and line.startswith('deleted file mode'):
+            current['status'] = 'deleted'
+        elif hunk is None and (line.startswith('Binary files') or line.startswith('GIT binary patch')):
+            current['binary'] = True
+        elif HUNK_HEADER.match(line):
+            hunk = {'header': line, 'lines': [], 'additions': 0, 'deletions': 0, 'definitions': 0}
+            current['hunks'].append(hunk)
+        elif hunk is not None and line[:1] in ('+', '-'):
+            hunk['lines'].append(line)
+            key = 'additions' if line[0] == '+' else 'deletions'
+            hunk[key] += 1
+            current[key] += 1
+            if DEFINITION.match(line):
+                hunk['definitions'] += 1
+
+    return files
+
+
+def _hunk_score(hunk: Dict) -> float:
+    """Rank hunks: definitions first, then hunks with substantive changed lines"""
+    substantive = len([line for line in hunk['lines'] if line[1:].strip()])
+    return hunk['definitions'] * 10 + min(substantive, 30)
+
+
+def _format_hunk(hunk: Dict, max_lines: int) -> str:
+    lines = hunk['lines']
+    if len(lines) > max_lines:
+        lines = lines[:max_lines] + [f"... ({len(hunk['lines']) - max_lines} more changed lines)"]
+    return '\n'.join([hunk['header']] + lines)
+
+
+def condense_diff(diff: str, token_budget: int = 200, max_hunk_lines: int = 12,
+                  max_listed_files: int = 20, totals: Optional[Dict] = None,
+                  files: Optional[List[Dict]] = None) -> Dict:
+    """Condense a diff into stats plus the most informative hunks under a token budget.
+
+    Lockfiles, generated files and binary files are summarized by name only.
+    Hunks are chosen by score, but the best hunk of each file is considered
+    first so that a large change in one file can't hide every other file.
+    For a truncated diff, ``totals`` gives the file and line counts of the
+    whole diff, while excerpts come from the part that was kept.
+    ``files`` may pass the diff already parsed by parse_diff.
+    Returns a dict with the condensed ``text`` and the diff stats.
+    """
+    if files is None:
+        files = parse_diff(diff)
+    shown: List[Dict] = []
+    skipped: List[Tuple[str, str]] = []
+    for file in files:
+        reason = 'binary' if file['binary'] else classify_file(file['path'])
+        if reason:
+            skipped.append((file['path'], reason))
+        else:
+            shown.append(file)
+
+    files_changed = totals['files_changed'] if totals else len(files)
+    additions = totals['additions'] if totals else sum(f['additions'] for f in files)
+    deletions = totals['deletions'] if totals else sum(f['deletions'] for f in files)
+    header = [f"{files_changed} file{'s' if files_changed != 1 else ''} changed, +{additions} -{deletions}"]
+    if totals:
+        header.append(f"Diff too large to read in full; excerpts cover the first {len(files)} "
+                      f"file{'s' if len(files) != 1 else ''}")
+    if skipped:
+        header.append("Skipped: " + ', '.join(f"{path} ({reason})" for path, reason in skipped[:max_listed_files])
+                      + (f" and {len(skipped) - max_listed_files} more" if len(skipped) > max_listed_files else ''))
+    for file in shown[:max_listed_files]:
+        path = f"{file['old_path']} -> {file['path']}" if file['status'] == 'renamed' else file['path']
+        header.append(f"{file['status']} {path} (+{file['additions']} -{file['deletions']})")
+    if len(shown) > max_listed_files:
+        header.append(f"... and {len(shown) - max_listed_files} more files")
+
+    text = '\n'.join(header)
+    budget = token_budget - estimate_tokens(text)
+
+    # Best hunk of every file first, then all remaining hunks by score
+    ranked: List[Tuple[int, Dict]] = []
+    rest: List[Tuple[float, int, Dict]] = []
+    for index, file in enumerate(shown):
+        hunks = sorted(file['hunks'], key=_hunk_score, reverse=True)
+        if hunks:
+            ranked.append((index, hunks[0]))
+            rest.extend((_hunk_score(h), index, h) for h in hunks[1:])
+    ranked.sort(key=lambda item: _hunk_score(item[1]), reverse=True)
+    ranked.extend((index, hunk) for _, index, hunk in sorted(rest, key=lambda item: item[0], reverse=True))
+
+    selected: Dict[int, List[Dict]] = {}
+    omitted = 0
+    for index, hunk in ranked:
+        cost = estimate_tokens(_format_hunk(hunk, max_hunk_lines))
+        if index not in selected:
+            cost += estimate_tokens(f"--- {shown[index]['path']}")
+        if cost > budget:
+            omitted += 1
+            continue
+        selected.setdefault(index, []).append(hunk)
+        budget -= cost
+
+    sections = [text]
+    for index, file in enumerate(shown):
+        if index not in selected:
+            continue
+        # Keep hunks in file order so the excerpt reads naturally
+        hunks = sorted(selected[index], key=file['hunks'].index)
+        sections.append(f"--- {file['path']}\n" + '\n'.join(_format_hunk(h, max_hunk_lines) for h in hunks))
+    if omitted:
+        sections.append(f"... ({omitted} more hunk{'s' if omitted != 1 else ''} omitted)")
+
+    return {
+        'text': '\n'.join(sections),
+        'files_changed': files_changed,
+        'additions': additions,
+        'deletions': deletions,
+        'skipped_files': [path for path, _ in skipped],
+        'omitted_hunks': omitted,
+        'truncated': totals is not None
+    }
+
+
+def condense_commits(commits: List[Dict], token_budget: int = 200, classify: bool = True) -> List[Dict]:
+    """Replace each commit's diff with a condensed summary and stats, in place.
+
+    The raw diff text is dropped, so only the compact form is carried
+    through the rest of the pipeline. With ``classify``, trivial commits
+    also get a ``trivial`` entry with their category and templated
+    explanation, which is used instead of calling the API.
+    """
+    # Imported here because commit_classifier builds on this module
+    from commit_classifier import classify_commit
+
+    for commit in commits:
+        totals = commit.pop('diff_totals', None)
+        if not commit.get('diff_truncated'):
+            totals = None
+        diff = commit.pop('diff', '')
+        files = parse_diff(diff)
+        if classify:
+            trivial = classify_commit(commit, files, totals)
+            if trivial:
+                commit['trivial'] = trivial
+        condensed = condense_diff(diff, token_budget, totals=totals, files=files)
+        commit['diff_summary'] = condensed.pop('text')
+        commit['diff_stats'] = condensed
+    return commits
+
+
+def fallback_explanation(commit_data: Dict) -> str:
+    """Summary built from the commit message and diff stats, for commits the token budget left unexplained"""
+    lines = commit_data['message'].strip().splitlines()
+    summary = lines[0].strip() if lines else 'No commit message'
+    stats = commit_data.get('diff_stats')
+    if stats:
+        files = stats['files_changed']
+        summary += f" ({files} file{'s' if files != 1 else ''} changed, +{stats['additions']} -{stats['deletions']})"
+    return f"Summary from the commit message (AI explanation skipped, token budget exhausted): {summary}"
@@ -0,0 +1,123 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import contextvars
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+import traceback
+
+from diff_condenser import fallback_explanation
+
+if TYPE_CHECKING:
+    from ai_explainer import AIExplainer
+
+
+def build_commit_result(commit: Dict, explanation: Optional[str] = None,
+                        error: Optional[str] = None) -> Dict:
+    """Build the per-commit entry returned to API clients.
+
+    A missing explanation without an error means the token budget ran out;
+    the entry then carries a summary of the commit message with status
+    'degraded'. Commits explained from a template are marked with their
+    ``trivial`` category.
+    """
+    result = {
+        'hash': commit['hash'],
+        'message': commit['message'],
+        'author': commit['author'],
+        'date': commit['date'],
+    }
+    if error is not None:
+        result.update({
+            'explanation': 'Error generating explanation',
+            'status': 'error',
+            'error': error
+        })
+    elif explanation is None:
+        result.update({
+            'explanation': fallback_explanation(commit),
+            'status': 'degraded'
+        })
+    else:
+        result.update({
+            'explanation': explanation,
+            'status': 'error' if explanation.startswith('Error:') else 'success'
+        })
+        if commit.get('trivial'):
+            result['trivial'] = commit['trivial']['category']
+    return result
+
+
+def collect_errors(results: List[Dict]) -> List[str]:
+    """Collect the error messages reported for a list of commit results"""
+    errors = []
+    for result in results:
+        if 'error' in result:
+            errors.append(f"Failed to explain commit {result['hash']}: {result['error']}")
+        elif result['status'] == 'error':
+            errors.append(result['explanation'])
+    return errors
+
+
+class ExplanationScheduler:
+    """Dispatches commit explanations to a bounded worker pool.
+
+    The pool is shared by all requests, so ``max_workers`` caps the number of
+    in-flight API calls for the whole process. Request pacing is left to the
+    explainer's shared rate limiter.
+    """
+
+    def __init__(self, explainer: 'AIExplainer', max_workers: int = 4):
+        self.explainer = explainer
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='explain')
+
+    def _explain_batch(self, indexed: List[Tuple[int, Dict]]) -> List[Tuple[int, Dict]]:
+        commits = [commit for _, commit in indexed]
+        try:
+            # Cache hits and misses were already counted by iter_explanations
+            explanations = self.explainer.explain_commits(commits, record_stats=False)
+            return [(i, build_commit_result(commit, explanation))
+                    for (i, commit), explanation in zip(indexed, explanations)]
+        except Exception as e:
+            print(f"Error explaining batch of {len(commits)} commits: {str(e)}")
+            print(traceback.format_exc())
+            return [(i, build_commit_result(commit, error=str(e))) for i, commit in indexed]
+
+    def iter_explanations(self, commits: List[Dict]) -> Iterator[Tuple[int, Dict]]:
+        """Yield (index, result) pairs as soon as each explanation is ready.
+
+        Cache hits are resolved up front on the calling thread and yielded
+        first; the remaining commits are grouped into prompt batches and
+        submitted to the worker pool.
+        """
+        try:
+            cached = self.explainer.get_cached_explanations(commits)
+        except Exception as e:
+            print(f"Cache lookup failed: {str(e)}")
+            cached = {}
+
+        misses = []
+        for i, commit in enumerate(commits):
+            if cached.get(commit['hash']):
+                yield i, build_commit_result(commit, cached[commit['hash']])
+            else:
+                misses.append((i, commit))
+
+        index_by_hash = {commit['hash']: (i, commit) for i, commit in misses}
+        futures = []
+        for batch in self.explainer.plan_batches([commit for _, commit in misses]):
+            indexed = [index_by_hash[commit['hash']] for commit in batch]
+            # Run in a copy of the caller's context so the request's timings include the batch
+            futures.append(self.executor.submit(contextvars.copy_context().run, self._explain_batch, indexed))
+
+        for future in as_completed(futures):
+            yield from future.result()
+
+    def explain_all(self, commits: List[Dict]) -> Tuple[List[Dict], List[str]]:
+        """Explain all commits, returning results in input order plus error messages"""
+        results: List[Optional[Dict]] = [None] * len(commits)
+        for i, result in self.iter_explanations(commits):
+            print(f"Explained commit {i + 1}/{len(commits)}: {result['hash'][:7]}")
+            results[i] = result
+
+        return results, collect_errors(results)
+
+    def shutdown(self, wait: bool = False):
+        self.executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,181 @@
+import os
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# SQLite limits the number of bound parameters per statement
+MAX_QUERY_PARAMS = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS explanations (
+    cache_key TEXT PRIMARY KEY,
+    commit_hash TEXT NOT NULL,
+    explanation TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_explanations_accessed_at ON explanations (accessed_at);
+CREATE TABLE IF NOT EXISTS cache_meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class ExplanationCache:
+    """SQLite-backed store of commit explanations.
+
+    The database runs in WAL mode so readers never block the writer, and
+    every write is a transaction, so a crash can't leave a partial entry
+    behind. Entries expire after ``ttl_seconds``. When the table grows past
+    ``max_entries``, the least recently read entries are evicted.
+    """
+
+    def __init__(self, db_path: str, ttl_seconds: float = 24 * 3600, max_entries: int = 100000):
+        self.db_path = os.path.abspath(db_path)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+
+        self._local = threading.local()
+        self._writes_since_evict = 0
+        self._evict_lock = threading.Lock()
+
+        conn = self._connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _chunks(self, items: List[str]) -> Iterable[List[str]]:
+        for i in range(0, len(items), MAX_QUERY_PARAMS):
+            yield items[i:i + MAX_QUERY_PARAMS]
+
+    def get(self, cache_key: str) -> Optional[str]:
+        """Return a single unexpired explanation"""
+        return self.get_many([cache_key]).get(cache_key)
+
+    def get_many(self, cache_keys: List[str]) -> Dict[str, str]:
+        """Return unexpired explanations for all keys present, in one query per chunk"""
+        keys = list(dict.fromkeys(cache_keys))
+        if not keys:
+            return {}
+
+        conn = self._connect()
+        now = time.time()
+        found: Dict[str, str] = {}
+        for chunk in self._chunks(keys):
+            placeholders = ','.join('?' * len(chunk))
+            rows = conn.execute(
+                f"SELECT cache_key, explanation FROM explanations "
+                f"WHERE cache_key IN ({placeholders}) AND created_at > ?",
+                (*chunk, now - self.ttl_seconds)
+            ).fetchall()
+            found.update(rows)
+
+        if found:
+            hits = list(found)
+            with conn:
+                for chunk in self._chunks(hits):
+                    placeholders = ','.join('?' * len(chunk))
+                    conn.execute(
+                        f"UPDATE explanations SET accessed_at = ? WHERE cache_key IN ({placeholders})",
+                        (now, *chunk)
+                    )
+        return found
+
+    def put(self, cache_key: str, commit_hash: str, explanation: str):
+        """Store a single explanation"""
+        self.put_many([(cache_key, commit_hash, explanation)])
+
+    def put_many(self, entries: List[Tuple[str, str, str]], created_at: Optional[float] = None):
+        """Store (cache_key, commit_hash, explanation) entries in one transaction"""
+        if not entries:
+            return
+        now = time.time()
+        created_at = created_at or now
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO explanations "
+                "(cache_key, commit_hash, explanation, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                [(key, commit_hash, explanation, created_at, now) for key, commit_hash, explanation in entries]
+            )
+
+        with self._evict_lock:
+            self._writes_since_evict += len(entries)
+            due = self._writes_since_evict >= 100
+        if due:
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the least recently read ones beyond max_entries"""
+        with self._evict_lock:
+            self._writes_since_evict = 0
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM explanations WHERE created_at <= ?",
+                             (time.time() - self.ttl_seconds,))
+                count = conn.execute("SELECT COUNT(*) FROM explanations").fetchone()[0]
+                if count > self.max_entries:
+                    conn.execute(
+                        "DELETE FROM explanations WHERE cache_key IN ("
+                        "SELECT cache_key FROM explanations ORDER BY accessed_at LIMIT ?)",
+                        (count - self.max_entries,)
+                    )
+
+    def import_legacy_json(self, cache_dir: str, key_prefix: str = 'legacy:') -> int:
+        """Import entries from the old one-JSON-file-per-commit cache.
+
+        Legacy files are keyed by an md5 of the commit contents rather than
+        the commit hash, so they are stored under ``key_prefix + md5`` and
+        existing entries are never overwritten. Empty or corrupted files are
+        skipped. The import runs once per database; later calls return 0.
+        Returns the number of entries imported.
+        """
+        conn = self._connect()
+        if conn.execute("SELECT 1 FROM cache_meta WHERE name = 'legacy_json_imported'").fetchone():
+            return 0
+
+        entries = []
+        names = os.listdir(cache_dir) if os.path.isdir(cache_dir) else []
+        for name in names:
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(cache_dir, name), 'r') as f:
+                    cached_data = json.load(f)
+                created_at = datetime.fromisoformat(cached_data['timestamp']).timestamp()
+                entries.append((key_prefix + name[:-5], '', cached_data['explanation'], created_at, created_at))
+            except (OSError, json.JSONDecodeError, KeyError, ValueError, TypeError):
+                continue
+
+        with conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO explanations "
+                "(cache_key, commit_hash, explanation, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                entries
+            )
+            imported = conn.total_changes - before
+            conn.execute("INSERT OR REPLACE INTO cache_meta (name, value) VALUES ('legacy_json_imported', ?)",
+                         (str(time.time()),))
+        return imported
+
+    def has_prefix(self, key_prefix: str) -> bool:
+        """Check whether any entry key starts with the given prefix"""
+        row = self._connect().execute(
+            "SELECT 1 FROM explanations WHERE cache_key >= ? AND cache_key < ? LIMIT 1",
+            (key_prefix, key_prefix + '\uffff')
+        ).fetchone()
+        return row is not None
@@ -1,24 +1,51 @@
 import os
 import shutil
-from git import Repo, GitCommandError, InvalidGitRepositoryError
-from git.exc import GitError
-from typing import List, Dict, Optional
+from git import Git, Repo, GitCommandError, InvalidGitRepositoryError
+from typing import List, Dict, Iterator, Optional, Tuple
+from contextlib import contextmanager, ExitStack
 import tempfile
 import logging
 from datetime import datetime
 import re
+import subprocess
+import time
+from repo_cache import (RepoMirrorStore, CLONE_STRATEGIES, GitError, auth_env, authenticated_url, get_dir_size,
+                        bundle_head, is_bundle, is_local_source, resolve_local_source)
+from metrics import timed
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class GitError(Exception):
-    """Custom exception for Git-related errors"""
-    pass
+# Per-commit diff bytes kept in memory; the rest of a huge diff is discarded while streaming
+DEFAULT_MAX_DIFF_BYTES = 256 * 1024
+# Diff bytes kept for all the commits read by one call, however many there are
+DEFAULT_MAX_REQUEST_DIFF_BYTES = 4 * 1024 * 1024
+# Longer diff lines (minified files, data blobs) are cut; the rest is read in chunks and dropped
+MAX_DIFF_LINE_BYTES = 64 * 1024
+
+# Upper bound on how deep a shallow mirror is extended to serve a requested page
+DEFAULT_MAX_HISTORY_DEPTH = 5000
+
+# git log header: a record separator followed by NUL-terminated fields
+RECORD_SEPARATOR = b'\x1e'
+LOG_FORMAT = '%x1e%H%x00%P%x00%an%x00%ae%x00%cI%x00%B%x00'
+LOG_FIELD_COUNT = 6
+
+
+class CutLine(bytes):
+    """A diff line cut at MAX_DIFF_LINE_BYTES, whose rest was dropped"""
 
 class GitParser:
-    def __init__(self, temp_dir: str = "../temp"):
-        """Initialize GitParser with a temporary directory"""
+    def __init__(self, temp_dir: str = "../temp", mirror_dir: Optional[str] = None,
+                 mirror_max_bytes: int = 2 * 1024 ** 3, clone_strategy: str = 'full',
+                 max_history_depth: int = DEFAULT_MAX_HISTORY_DEPTH,
+                 allowed_local_roots: Optional[List[str]] = None):
+        """Initialize GitParser with a temporary directory and a mirror store.
+
+        Local repositories and bundles are only opened from inside
+        ``allowed_local_roots``; without roots only URLs are accepted.
+        """
         self.temp_dir = os.path.abspath(temp_dir)
         try:
             if not os.path.exists(temp_dir):
@@ -31,6 +58,15 @@ class GitParser:
         except Exception as e:
             raise GitError(f"Failed to initialize temporary directory: {str(e)}")
 
+        # Mirrors live next to the temporary directory so cleanup() never touches them
+        if mirror_dir is None:
+            mirror_dir = os.path.join(os.path.dirname(self.temp_dir), 'repo_cache')
+        self.mirror_store = RepoMirrorStore(mirror_dir, max_bytes=mirror_max_bytes)
+        self.clone_strategy = clone_strategy
+        self.max_history_depth = max_history_depth
+        self.allowed_local_roots = list(allowed_local_roots or [])
+        self._open_repos: Dict[str, Dict] = {}
+
     def _sanitize_repo_name(self, repo_url: str) -> str:
         """Sanitize repository name to prevent path traversal"""
         repo_name = repo_url.split('/')[-1].replace('.git', '')
@@ -41,9 +77,8 @@ class GitParser:
     def _create_temp_dir(self) -> str:
         """Create a unique temporary directory"""
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        unique_dir = os.path.join(self.temp_dir, f"repo_{timestamp}_{os.getpid()}")
-        os.makedirs(unique_dir, exist_ok=True)
-        return unique_dir
+        # mkdtemp adds a random suffix so concurrent clones never share a directory
+        return tempfile.mkdtemp(prefix=f"repo_{timestamp}_{os.getpid()}_", dir=self.temp_dir)
 
     def clone_repo(self, repo_url: str, github_token: Optional[str] = None) -> str:
         """Clone a repository and return its path with improved error handling"""
@@ -61,73 +96,282 @@ class GitParser:
                 shutil.rmtree(repo_path)
 
             # Modify URL to include token if provided
-            clone_url = repo_url
-            if github_token:
-                # Extract the repository path
-                if repo_url.startswith('https://github.com/'):
-                    clone_url = f'https://{github_token}@github.com/{repo_url[19:]}'
+            clone_url = authenticated_url(repo_url, github_token)
 
             # Clone with progress
-            repo = Repo.clone_from(
-                clone_url,
-                repo_path,
-                depth=50,  # Limit history for faster cloning
-                no_single_branch=True  # Fetch all branches
-            )
+            with timed('clone'):
+                repo = Repo.clone_from(
+                    clone_url,
+                    repo_path,
+                    depth=50,  # Limit history for faster cloning
+                    no_single_branch=True  # Fetch all branches
+                )
             return repo_path
 
         except GitCommandError as e:
-            error_msg = str(e)
-            if "not found" in error_msg.lower():
-                raise GitError(f"Repository not found: {repo_url}")
-            elif "authentication" in error_msg.lower():
-                raise GitError(f"Authentication failed for repository: {repo_url}")
-            else:
-                raise GitError(f"Failed to clone repository: {error_msg}")
+            raise self._clone_error(repo_url, e, github_token)
         except Exception as e:
             raise GitError(f"Unexpected error while cloning repository: {str(e)}")
 
-    def get_recent_commits(self, repo_path: str, num_commits: int = 10) -> List[Dict]:
-        """Get information about recent commits with improved error handling"""
+    @contextmanager
+    def open_repo(self, repo_url: str, github_token: Optional[str] = None,
+                  strategy: Optional[str] = None, stats: Optional[Dict] = None) -> Iterator[str]:
+        """Yield the path of a cached, freshly fetched mirror of the repository.
+
+        Concurrent callers for the same repository share one mirror and are
+        serialized while inside the ``with`` block. ``strategy`` selects one
+        of the CLONE_STRATEGIES; ``stats`` receives clone/fetch timings and
+        bytes transferred, including blobs fetched later for partial clones.
+        ``repo_url`` may also be an absolute path inside the allowed local
+        roots; see ``_open_local``.
+        """
+        if not isinstance(repo_url, str) or not repo_url.strip():
+            raise ValueError("Repository URL must be a non-empty string")
+        if is_local_source(repo_url):
+            with self._open_local(repo_url, stats) as repo_path:
+                yield repo_path
+            return
+        strategy = strategy or self.clone_strategy
+        if strategy not in CLONE_STRATEGIES:
+            raise ValueError(f"Unknown clone strategy: {strategy}")
+
+        with ExitStack() as stack:
+            try:
+                with timed('sync'):
+                    repo_path = stack.enter_context(
+                        self.mirror_store.mirror(repo_url, github_token, strategy, stats))
+            except GitCommandError as e:
+                raise self._clone_error(repo_url, e, github_token)
+            except Exception as e:
+                raise GitError(f"Unexpected error while cloning repository: {str(e)}")
+
+            # Remembered while the mirror is locked so reads can fetch missing objects
+            self._open_repos[repo_path] = {
+                'repo_url': repo_url,
+                'token': github_token,
+                'strategy': strategy,
+                'env': auth_env(repo_url, github_token),
+                'stats': stats if stats is not None else {},
+                'partial': strategy != 'full'
+            }
+            try:
+                yield repo_path
+            finally:
+                self._open_repos.pop(repo_path, None)
+
+    @contextmanager
+    def _open_local(self, path: str, stats: Optional[Dict] = None) -> Iterator[str]:
+        """Yield the path to read a local repository or bundle from.
+
+        A checkout or bare repository is read in place: nothing is cloned or
+        fetched, and a shallow checkout is analyzed as far as its history
+        goes. A ``.bundle`` file is cloned once into the mirror store, with
+        all its history, and fetched from again on later calls.
+        """
+        real_path = resolve_local_source(path, self.allowed_local_roots)
+        if is_bundle(real_path):
+            with ExitStack() as stack:
+                try:
+                    with timed('sync'):
+                        repo_path = stack.enter_context(self.mirror_store.mirror(real_path, None, 'full', stats))
+                except GitCommandError as e:
+                    raise self._clone_error(path, e)
+                yield repo_path
+            return
+
+        if stats is not None:
+            stats.update({'strategy': 'local', 'operation': 'local', 'seconds': 0.0, 'bytes_transferred': 0})
+        yield real_path
+
+    def resolve_head(self, repo_url: str, github_token: Optional[str] = None) -> str:
+        """Resolve the commit the remote HEAD points to with git ls-remote, without cloning"""
+        if is_local_source(repo_url):
+            repo_url = resolve_local_source(repo_url, self.allowed_local_roots)
+            if is_bundle(repo_url):
+                # Bundles created from a branch name have no HEAD; use their branch instead
+                return bundle_head(repo_url)[1]
+        try:
+            output = Git().ls_remote(authenticated_url(repo_url, github_token), 'HEAD')
+        except GitCommandError as e:
+            raise self._clone_error(repo_url, e, github_token)
+        if not output.strip():
+            raise GitError(f"Could not resolve HEAD for repository: {repo_url}")
+        return output.split()[0]
+
+    def _clone_error(self, repo_url: str, error: GitCommandError,
+                     github_token: Optional[str] = None) -> GitError:
+        """Translate a git command failure into a GitError without leaking the token"""
+        error_msg = str(error)
+        if github_token:
+            error_msg = error_msg.replace(github_token, '***')
+        if "not found" in error_msg.lower():
+            return GitError(f"Repository not found: {repo_url}")
+        elif "authentication" in error_msg.lower():
+            return GitError(f"Authentication failed for repository: {repo_url}")
+        else:
+            return GitError(f"Failed to clone repository: {error_msg}")
+
+    def _open_repo_at(self, repo_path: str) -> Repo:
+        """Validate a repository path and open it"""
         if not isinstance(repo_path, str) or not os.path.exists(repo_path):
             raise ValueError("Invalid repository path")
-        if not isinstance(num_commits, int) or num_commits <= 0:
-            raise ValueError("Number of commits must be a positive integer")
-
         try:
-            repo = Repo(repo_path)
+            return Repo(repo_path)
         except (InvalidGitRepositoryError, GitError) as e:
             raise GitError(f"Invalid Git repository: {str(e)}")
 
+    def get_recent_commits(self, repo_path: str, num_commits: int = 10,
+                           max_diff_bytes: int = DEFAULT_MAX_DIFF_BYTES,
+                           max_request_diff_bytes: int = DEFAULT_MAX_REQUEST_DIFF_BYTES) -> List[Dict]:
+        """Get information about recent commits with improved error handling"""
+        if not isinstance(num_commits, int) or num_commits <= 0:
+            raise ValueError("Number of commits must be a positive integer")
+        repo = self._open_repo_at(repo_path)
+
         try:
             # Determine the default branch with better error handling
             default_branch = self._get_default_branch(repo)
             logger.info(f"Using default branch: {default_branch}")
+            return self._read_commits(repo_path, [default_branch], default_branch, num_commits, max_diff_bytes,
+                                      max_request_diff_bytes)
+        except Exception as e:
+            raise GitError(f"Failed to get commits: {str(e)}")
 
-            commits = []
-            for commit in repo.iter_commits(default_branch, max_count=num_commits):
-                try:
-                    # Get the diff with better error handling
-                    diff = self._get_commit_diff(repo, commit)
-
-                    commits.append({
-                        'hash': commit.hexsha,
-                        'message': commit.message.strip(),
-                        'author': f"{commit.author.name} <{commit.author.email}>",
-                        'date': commit.committed_datetime.isoformat(),
-                        'diff': diff,
-                        'branch': default_branch
-                    })
-                except Exception as e:
-                    logger.warning(f"Error processing commit {commit.hexsha}: {str(e)}")
-                    # Continue with next commit instead of failing entirely
-                    continue
+    def list_commits(self, repo_path: str, num_commits: int = 10, revs: Optional[List[str]] = None,
+                     skip: int = 0, paths: Optional[List[str]] = None) -> Tuple[str, List[str]]:
+        """Return the branch and the hashes of one page of commits, without diffs.
 
-            return commits
+        ``revs`` defaults to the default branch; ``skip`` commits are passed
+        over and only commits touching ``paths`` are listed. When the page
+        reaches past the history of a shallow mirror opened with
+        ``open_repo``, the mirror is deepened until the page is full, the
+        root commit is reached or ``max_history_depth`` is exceeded.
+        """
+        if not isinstance(num_commits, int) or num_commits <= 0:
+            raise ValueError("Number of commits must be a positive integer")
+        repo = self._open_repo_at(repo_path)
+
+        try:
+            branch = self._get_default_branch(repo)
+            revs = revs or [branch]
+            args = revs + [f'--max-count={num_commits}', f'--skip={skip}', '--format=%H', '--'] + (paths or [])
+            hashes = repo.git.log(*args).split()
+
+            opened = self._open_repos.get(repo_path)
+            while opened and len(hashes) < num_commits and self.mirror_store.is_shallow(repo_path):
+                depth = int(repo.git.rev_list('--count', *revs))
+                if depth >= self.max_history_depth:
+                    logger.info(f"Not deepening past {self.max_history_depth} commits")
+                    break
+                # Double the history each round; path filters make the needed depth unknown
+                deepen_by = min(max(depth, skip + num_commits - len(hashes)), self.max_history_depth - depth)
+                with timed('deepen'):
+                    self.mirror_store.deepen(repo_path, opened['repo_url'], opened['token'],
+                                             opened['strategy'], deepen_by)
+                if int(repo.git.rev_list('--count', *revs)) == depth:
+                    break
+                hashes = repo.git.log(*args).split()
+            return branch, hashes
+        except GitCommandError as e:
+            raise GitError(f"Failed to list commits: {str(e)}")
+
+    def resolve_revision(self, repo_path: str, revision: str) -> str:
+        """Resolve a branch, tag or commit to a commit hash.
+
+        Revisions the mirror doesn't have, such as tags, are fetched from the
+        remote when the mirror was opened with ``open_repo``.
+        """
+        if not revision or revision.startswith('-') or any(c.isspace() for c in revision):
+            raise GitError(f"Invalid revision: {revision}")
+
+        commit_hash = self._rev_parse(repo_path, revision)
+        opened = self._open_repos.get(repo_path)
+        if commit_hash is None and opened:
+            try:
+                fetched = self.mirror_store.fetch_revision(repo_path, opened['repo_url'], opened['token'],
+                                                           opened['strategy'], revision)
+                commit_hash = self._rev_parse(repo_path, fetched)
+            except GitCommandError as e:
+                logger.info(f"Could not fetch {revision}: {self._clone_error(opened['repo_url'], e, opened['token'])}")
+        if commit_hash is None:
+            raise GitError(f"Revision not found: {revision}")
+        return commit_hash
+
+    def _rev_parse(self, repo_path: str, revision: str) -> Optional[str]:
+        """Return the commit a revision points to, or None if the repository lacks it"""
+        result = self._run_git(repo_path, ['rev-parse', '--verify', '--quiet', f'{revision}^{{commit}}'], [])
+        return result.stdout.decode().strip() if result.returncode == 0 else None
 
+    def get_commits(self, repo_path: str, hashes: List[str], branch: str,
+                    max_diff_bytes: int = DEFAULT_MAX_DIFF_BYTES,
+                    max_request_diff_bytes: int = DEFAULT_MAX_REQUEST_DIFF_BYTES) -> List[Dict]:
+        """Read the given commits and their diffs, in the order given"""
+        if not hashes:
+            return []
+        self._open_repo_at(repo_path)
+        try:
+            return self._read_commits(repo_path, hashes, branch, None, max_diff_bytes, max_request_diff_bytes,
+                                      no_walk=True)
         except Exception as e:
             raise GitError(f"Failed to get commits: {str(e)}")
 
+    def add_patch_ids(self, repo_path: str, commits: List[Dict]) -> List[Dict]:
+        """Set each commit's 'patch_id' with a single ``git patch-id --stable`` process.
+
+        The patch id is the same for every copy of a change, so cherry-picks,
+        rebases and forks share it. Commits with an empty or truncated diff
+        get no patch id.
+        """
+        lines = []
+        for commit in commits:
+            if commit.get('diff') and not commit.get('diff_truncated'):
+                lines.append(f"commit {commit['hash']}")
+                lines.append(commit['diff'])
+        if not lines:
+            return commits
+
+        with timed('patch_id'):
+            result = self._run_git(repo_path, ['patch-id', '--stable'], lines + [''])
+        if result.returncode != 0:
+            logger.warning(f"git patch-id failed: {result.stderr.decode('utf-8', 'replace').strip()}")
+            return commits
+
+        patch_ids = {}
+        for line in result.stdout.decode().splitlines():
+            patch_id, commit_hash = line.split()
+            patch_ids[commit_hash] = patch_id
+        for commit in commits:
+            if commit['hash'] in patch_ids:
+                commit['patch_id'] = patch_ids[commit['hash']]
+        return commits
+
+    def is_ancestor(self, repo_path: str, ancestor: str, descendant: str) -> bool:
+        """Check whether ``ancestor`` is reachable from ``descendant``.
+
+        Returns False when either commit is unknown to the repository, e.g.
+        after a force-push dropped the old history.
+        """
+        result = self._run_git(repo_path, ['merge-base', '--is-ancestor', ancestor, descendant], [],
+                               self._open_repos.get(repo_path, {}).get('env'))
+        return result.returncode == 0
+
+    def _read_commits(self, repo_path: str, revs: List[str], branch: str, max_count: Optional[int],
+                      max_diff_bytes: int, max_request_diff_bytes: int, no_walk: bool = False) -> List[Dict]:
+        """Read commits and diffs with one git log pass, prefetching blobs for partial clones"""
+        opened = self._open_repos.get(repo_path, {})
+        env = opened.get('env')
+        if opened.get('partial'):
+            with timed('prefetch'):
+                self._prefetch_blobs(repo_path, revs, max_count, env, opened['stats'], no_walk)
+
+        commits = []
+        with timed('parse'):
+            for commit in self._iter_log(repo_path, revs, max_count, max_diff_bytes, env, no_walk,
+                                         max_request_diff_bytes):
+                commit['branch'] = branch
+                commits.append(commit)
+        return commits
+
     def _get_default_branch(self, repo: Repo) -> str:
         """Determine the default branch of the repository"""
         try:
@@ -144,26 +388,256 @@ class GitParser:
                     continue
             raise GitError("Could not determine default branch")
 
-    def _get_commit_diff(self, repo: Repo, commit) -> str:
-        """Get the diff for a commit with proper error handling"""
+    def _iter_log(self, repo_path: str, revs: List[str], max_count: Optional[int],
+                  max_diff_bytes: int = DEFAULT_MAX_DIFF_BYTES,
+                  env: Optional[Dict[str, str]] = None, no_walk: bool = False,
+                  max_request_diff_bytes: Optional[int] = None) -> Iterator[Dict]:
+        """Stream commits and their diffs from a single ``git log -p`` process.
+
+        Each commit is diffed against its first parent, like ``git diff
+        <parent> <commit>``, and root commits show their full patch. Diff text
+        beyond ``max_diff_bytes`` per commit, or ``max_request_diff_bytes``
+        for all commits together, is read from the pipe but never kept; a
+        truncated commit gets 'diff_totals' with the file and changed line
+        counts of its whole diff.
+        With ``no_walk`` only the given commits are shown, in the given order.
+        """
+        cmd = [Git.GIT_PYTHON_GIT_EXECUTABLE or 'git', '-C', repo_path, 'log'] + \
+            self._walk_args(revs, max_count, no_walk) + \
+            [f'--format={LOG_FORMAT}', '--patch', '--diff-merges=first-parent', '--no-color', '--no-ext-diff', '--']
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   env={**os.environ, **env} if env else None)
         try:
-            if commit.parents:
-                return repo.git.diff(commit.parents[0].hexsha, commit.hexsha)
-            else:
-                # For initial commit
-                return repo.git.show('--pretty=format:', '--patch', commit.hexsha)
-        except Exception as e:
-            logger.warning(f"Failed to get diff for commit {commit.hexsha}: {str(e)}")
-            return "Error: Could not retrieve diff"
+            commit = None
+            remaining = max_request_diff_bytes
+            lines = self._read_lines(process.stdout)
+            for line in lines:
+                if line.startswith(RECORD_SEPARATOR):
+                    if commit is not None:
+                        yield self._finish_commit(commit)
+                        if remaining is not None:
+                            remaining -= commit['diff_bytes']
+                    commit = self._read_log_header(line, lines)
+                    limit = max_diff_bytes if remaining is None else min(max_diff_bytes, remaining)
+                elif commit is not None:
+                    self._append_diff_line(commit, line, limit)
+            if commit is not None:
+                yield self._finish_commit(commit)
+
+            stderr = process.stderr.read().decode('utf-8', 'replace')
+            if process.wait() != 0:
+                raise GitError(f"git log failed: {stderr.strip()}")
+        finally:
+            if process.poll() is None:
+                # The consumer stopped early; don't leave git blocked on a full pipe
+                process.kill()
+                process.wait()
+            process.stdout.close()
+            process.stderr.close()
+
+    def _read_lines(self, stream, max_line_bytes: int = MAX_DIFF_LINE_BYTES,
+                    chunk_bytes: int = 64 * 1024) -> Iterator[bytes]:
+        """Yield the lines of a stream without their line breaks, cutting any line longer than ``max_line_bytes``.
+
+        The stream is read in chunks, so a file with no line breaks is never
+        held in memory at its full size; the rest of a cut line is dropped and
+        the kept part is yielded as a CutLine.
+        """
+        pending = b''
+        skipping = False
+        while True:
+            chunk = stream.read1(chunk_bytes)
+            if not chunk:
+                break
+            lines = (pending + chunk).split(b'\n')
+            pending = lines.pop()
+            if skipping and lines:
+                # The end of a line that was already cut
+                del lines[0]
+                skipping = False
+            for line in lines:
+                yield CutLine(line[:max_line_bytes]) if len(line) > max_line_bytes else line
+            if len(pending) > max_line_bytes:
+                if not skipping:
+                    yield CutLine(pending[:max_line_bytes])
+                    skipping = True
+                pending = b''
+        if pending and not skipping:
+            yield pending
+
+    def _walk_args(self, revs: List[str], max_count: Optional[int], no_walk: bool = False) -> List[str]:
+        """Revision arguments shared by git log and rev-list"""
+        args = list(revs)
+        if max_count is not None:
+            args.append(f'--max-count={max_count}')
+        if no_walk:
+            args.append('--no-walk=unsorted')
+        return args
+
+    def _prefetch_blobs(self, repo_path: str, revs: List[str], max_count: Optional[int],
+                        env: Optional[Dict[str, str]], stats: Dict, no_walk: bool = False):
+        """Fetch the blobs the analyzed diffs need from a partial clone in one request.
+
+        Without this, git would fetch each missing blob lazily with a separate
+        round trip while producing the diffs.
+        """
+        git = Git(repo_path)
+        start = time.monotonic()
+
+        # Tree diffs list the blob ids on both sides of every change
+        walk = self._walk_args(revs, max_count, no_walk)
+        raw = git.log(*walk, '--format=', '--raw', '--no-abbrev',
+                      '--no-renames', '--diff-merges=first-parent', env=env)
+        oids = set()
+        for line in raw.splitlines():
+            if not line.startswith(':'):
+                continue
+            old_mode, new_mode, old_oid, new_oid = line[1:].split(None, 4)[:4]
+            # Skip absent sides and submodule commits
+            for mode, oid in ((old_mode, old_oid), (new_mode, new_oid)):
+                if mode != '160000' and oid.strip('0'):
+                    oids.add(oid)
+        if not oids:
+            return
+
+        # rev-list reports missing objects without triggering a lazy fetch
+        listing = git.rev_list(*walk, '--objects', '--missing=print', env=env)
+        missing = [line[1:] for line in listing.splitlines() if line.startswith('?') and line[1:] in oids]
+        if not missing:
+            return
+
+        size_before = get_dir_size(os.path.join(repo_path, 'objects'))
+        fetch = self._run_git(repo_path, [
+            '-c', 'fetch.negotiationAlgorithm=noop', 'fetch', 'origin', '--no-tags',
+            '--no-write-fetch-head', '--recurse-submodules=no', '--filter=blob:none', '--stdin'
+        ], missing, env)
+        if fetch.returncode != 0:
+            # Git still fetches anything missing lazily while diffing
+            logger.warning(f"Blob prefetch failed: {fetch.stderr.decode('utf-8', 'replace').strip()}")
+            return
+
+        fetched_bytes = get_dir_size(os.path.join(repo_path, 'objects')) - size_before
+        stats['blobs_fetched'] = stats.get('blobs_fetched', 0) + len(missing)
+        stats['bytes_transferred'] = stats.get('bytes_transferred', 0) + max(0, fetched_bytes)
+        stats['prefetch_seconds'] = round(time.monotonic() - start, 3)
+        logger.info(f"Prefetched {len(missing)} blobs for analyzed diffs")
+
+    def _run_git(self, repo_path: str, args: List[str], lines, env: Optional[Dict[str, str]] = None):
+        """Run a git command that reads object names or refspecs from stdin"""
+        return subprocess.run(
+            [Git.GIT_PYTHON_GIT_EXECUTABLE or 'git', '-C', repo_path] + args,
+            input='\n'.join(lines).encode(), capture_output=True,
+            env={**os.environ, **env} if env else None
+        )
+
+    def _read_log_header(self, line: bytes, lines: Iterator[bytes]) -> Dict:
+        """Parse the NUL-separated header written by LOG_FORMAT.
+
+        The commit message may span several lines, so lines are taken from
+        ``lines`` until all header fields are present.
+        """
+        header = line[len(RECORD_SEPARATOR):]
+        while header.count(b'\x00') < LOG_FIELD_COUNT:
+            next_line = next(lines, None)
+            if next_line is None:
+                raise GitError("Unexpected end of git log output")
+            header += b'\n' + next_line
+
+        commit_hash, parents, name, email, date, message = [
+            field.decode('utf-8', 'replace') for field in header.split(b'\x00', LOG_FIELD_COUNT)[:LOG_FIELD_COUNT]
+        ]
+        return {
+            'hash': commit_hash,
+            'parents': parents.split(),
+            'message': message.strip(),
+            'author': f"{name} <{email}>",
+            'date': date,
+            'diff_lines': [],
+            'diff_bytes': 0,
+            'diff_truncated': False,
+            'lines_cut': False
+        }
+
+    def _append_diff_line(self, commit: Dict, line: bytes, max_diff_bytes: int):
+        """Add a diff line to the commit until its byte budget is used up, then only count it"""
+        if isinstance(line, CutLine):
+            commit['lines_cut'] = True
+        if commit['diff_truncated']:
+            self._count_diff_line(commit['diff_totals'], line)
+            return
+        size = len(line) + 1  # Including the line break
+        if commit['diff_bytes'] + size > max_diff_bytes:
+            commit['diff_truncated'] = True
+            # Count the kept lines once; from here on every line is counted as it streams past
+            totals = commit['diff_totals'] = {'files_changed': 0, 'additions': 0, 'deletions': 0, 'in_hunk': False}
+            for kept in commit['diff_lines']:
+                self._count_diff_line(totals, kept)
+            self._count_diff_line(totals, line)
+            return
+        commit['diff_lines'].append(line)
+        commit['diff_bytes'] += size
+
+    def _count_diff_line(self, totals: Dict, line: bytes):
+        """Update the file and changed line counts of a diff with one of its lines"""
+        marker = line[:1]
+        if marker == b'+' or marker == b'-':
+            # File headers ('--- a/x', '+++ b/x') come before the first hunk
+            if totals['in_hunk']:
+                totals['additions' if marker == b'+' else 'deletions'] += 1
+        elif line.startswith(b'diff --git '):
+            totals['files_changed'] += 1
+            totals['in_hunk'] = False
+        elif line.startswith(b'@@'):
+            totals['in_hunk'] = True
+
+    def _finish_commit(self, commit: Dict) -> Dict:
+        """Assemble the collected diff lines into the commit's diff text.
+
+        A diff with cut lines is kept whole otherwise, but is marked truncated
+        like one that ran out of bytes, since its text no longer matches the
+        change (and must not get a patch id).
+        """
+        out_of_bytes = commit['diff_truncated']
+        if commit.pop('lines_cut') and not out_of_bytes:
+            commit['diff_truncated'] = True
+            # Every line was kept, so their counts are those of the whole diff
+            totals = commit['diff_totals'] = {'files_changed': 0, 'additions': 0, 'deletions': 0, 'in_hunk': False}
+            for kept in commit['diff_lines']:
+                self._count_diff_line(totals, kept)
+        if commit['diff_truncated']:
+            del commit['diff_totals']['in_hunk']
+        diff = b'\n'.join(commit.pop('diff_lines')).decode('utf-8', 'replace').strip('\n')
+        if out_of_bytes:
+            diff += f"\n... (diff truncated at {commit['diff_bytes']} bytes)"
+        elif commit['diff_truncated']:
+            diff += f"\n... (lines longer than {MAX_DIFF_LINE_BYTES} bytes cut)"
+        commit['diff'] = diff
+        return commit
 
     def cleanup(self):
-        """Clean up temporary directory with improved error handling"""
+        """Remove the temporary clones made by this process.
+
+        Other server worker processes share the temporary directory, so only
+        directories carrying this process id are removed.
+        """
         if not os.path.exists(self.temp_dir):
             return
 
+        marker = f"_{os.getpid()}_"
+        try:
+            for name in os.listdir(self.temp_dir):
+                if name.startswith('repo_') and marker in name:
+                    self._remove_tree(os.path.join(self.temp_dir, name))
+            logger.info("Successfully cleaned up temporary directory")
+        except Exception as e:
+            logger.error(f"Error during cleanup: {str(e)}")
+            # Don't raise the error as this is a cleanup operation
+
+    def _remove_tree(self, path: str):
+        """Delete a directory tree, clearing read-only attributes git sets on objects"""
         try:
             # Remove read-only attributes if they exist
-            for root, dirs, files in os.walk(self.temp_dir, topdown=False):
+            for root, dirs, files in os.walk(path, topdown=False):
                 for name in files:
                     try:
                         os.chmod(os.path.join(root, name), 0o666)
@@ -175,9 +649,6 @@ class GitParser:
                     except:
                         pass
 
-            shutil.rmtree(self.temp_dir, ignore_errors=True)
-            os.makedirs(self.temp_dir, exist_ok=True)
-            logger.info("Successfully cleaned up temporary directory")
+            shutil.rmtree(path, ignore_errors=True)
         except Exception as e:
-            logger.error(f"Error during cleanup: {str(e)}")
-            # Don't raise the error as this is a cleanup operation
\ No newline at end of file
+            logger.error(f"Error removing {path}: {str(e)}")
\ No newline at end of file
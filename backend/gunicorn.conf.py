@@ -0,0 +1,31 @@
+import os
+
+# Gunicorn settings for serving wsgi:app in production
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('GUNICORN_WORKERS', '2'))
+# Threads let one worker stream several SSE responses and poll jobs concurrently
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+# Clones and cold analyses can take a while; graceful_timeout bounds shutdown
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = 5
+# Services are built lazily on first request, so the app can be imported once in the
+# master and forked; new workers then start without re-importing anything
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() != 'false'
+accesslog = '-'
+
+# Workers split the OpenRouter rate limit between them
+os.environ['SERVER_WORKERS'] = str(workers)
+
+
+def post_fork(server, worker):
+    """Start warming watched repositories; workers take turns through a file lock"""
+    import app
+    app.start_background_tasks()
+
+
+def worker_exit(server, worker):
+    """Let the exiting worker finish its jobs and remove its temporary files"""
+    import app
+    app.shutdown(wait=True)
@@ -0,0 +1,71 @@
+from http.cookiejar import CookiePolicy
+from typing import Dict, Optional, Tuple, Union
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+
+Timeout = Union[float, Tuple[float, float]]
+
+# (connect, read) timeouts in seconds for hosts without a specific entry
+DEFAULT_TIMEOUT = (5, 30)
+
+
+class NoCookies(CookiePolicy):
+    """Cookie policy that never stores or sends cookies.
+
+    The session is shared by every request the server handles, so a cookie
+    set while serving one user must never be replayed for another.
+    """
+    netscape = True
+    rfc2965 = hide_cookie2 = False
+
+    def set_ok(self, cookie, request):
+        return False
+
+    def return_ok(self, cookie, request):
+        return False
+
+    def domain_return_ok(self, domain, request):
+        return False
+
+    def path_return_ok(self, path, request):
+        return False
+
+
+class HttpClient:
+    """Thread-safe HTTP client that keeps connections alive between calls.
+
+    One requests.Session is shared by all threads; its urllib3 pools keep up
+    to ``pool_size`` idle connections per host, so repeated calls skip the
+    DNS lookup and TCP/TLS handshakes. Timeouts can be set per host and are
+    applied to every call that doesn't pass its own.
+    """
+
+    def __init__(self, pool_size: int = 10, timeouts: Optional[Dict[str, Timeout]] = None,
+                 default_timeout: Timeout = DEFAULT_TIMEOUT):
+        self.timeouts = timeouts or {}
+        self.default_timeout = default_timeout
+
+        self.session = requests.Session()
+        self.session.cookies.set_policy(NoCookies())
+        # Each adapter keeps one pool per host; pool_size bounds the idle connections kept
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def timeout_for(self, url: str) -> Timeout:
+        """Return the configured timeout for the URL's host"""
+        return self.timeouts.get(urlparse(url).hostname or '', self.default_timeout)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout_for(url))
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        self.session.close()
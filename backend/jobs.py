@@ -0,0 +1,279 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+JOB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    job_key TEXT NOT NULL,
+    state TEXT NOT NULL,
+    active INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_key ON jobs (job_key, active);
+"""
+
+
+class Job:
+    """State of one repository analysis, updated by the worker as it progresses"""
+
+    def __init__(self, key: str, params: Dict):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.params = params
+        self.status = 'queued'
+        self.stage = 'queued'
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.total = 0
+        self.results: List[Optional[Dict]] = []
+        self.summary: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.status_code: Optional[int] = None
+        self.store: Optional['JobStore'] = None
+        self._lock = threading.Lock()
+
+    def set_stage(self, stage: str):
+        with self._lock:
+            self.stage = stage
+            self.updated_at = time.time()
+        self._save()
+
+    def start(self):
+        with self._lock:
+            self.status = self.stage = 'running'
+            self.updated_at = time.time()
+        self._save()
+
+    def complete(self, summary: Optional[Dict]):
+        with self._lock:
+            self.summary = summary
+            self.status = 'completed'
+            self.stage = 'done'
+            self.updated_at = time.time()
+        self._save()
+
+    def fail(self, error: str, status_code: int):
+        with self._lock:
+            self.error = error
+            self.status_code = status_code
+            self.status = self.stage = 'failed'
+            self.updated_at = time.time()
+        self._save()
+
+    def set_commits(self, total: int):
+        """Record how many commits will be explained"""
+        with self._lock:
+            self.total = total
+            self.results = [None] * total
+            self.updated_at = time.time()
+        self._save()
+
+    def add_result(self, index: int, result: Dict):
+        with self._lock:
+            self.results[index] = result
+            self.updated_at = time.time()
+        self._save()
+
+    def _save(self):
+        if self.store is not None:
+            self.store.save(self)
+
+    @property
+    def finished(self) -> bool:
+        with self._lock:
+            return self.status in ('completed', 'failed')
+
+    def to_dict(self, include_results: bool = True) -> Dict:
+        """Serialize the job for API responses; request parameters are never exposed"""
+        with self._lock:
+            data = {
+                'job_id': self.id,
+                'status': self.status,
+                'stage': self.stage,
+                'created_at': self.created_at,
+                'updated_at': self.updated_at,
+                'total_commits': self.total,
+                'completed_commits': len([r for r in self.results if r is not None]),
+            }
+            if include_results:
+                # Partial results keep their position so clients can render in order
+                data['commits'] = [dict(r, index=i) for i, r in enumerate(self.results) if r is not None]
+            if self.summary is not None:
+                data['summary'] = self.summary
+            if self.error is not None:
+                data['error'] = self.error
+                data['status_code'] = self.status_code
+            return data
+
+    def to_state(self) -> Dict:
+        """Everything needed to rebuild the job in another process, without its parameters"""
+        with self._lock:
+            return {
+                'key': self.key, 'status': self.status, 'stage': self.stage,
+                'created_at': self.created_at, 'updated_at': self.updated_at,
+                'total': self.total, 'results': list(self.results), 'summary': self.summary,
+                'error': self.error, 'status_code': self.status_code
+            }
+
+    @classmethod
+    def from_state(cls, job_id: str, state: Dict) -> 'Job':
+        job = cls(state['key'], {})
+        job.id = job_id
+        for name in ('status', 'stage', 'created_at', 'updated_at', 'total', 'results',
+                     'summary', 'error', 'status_code'):
+            setattr(job, name, state[name])
+        return job
+
+
+class JobStore:
+    """SQLite-backed job state shared by every server worker process.
+
+    Any worker can answer a status request for a job another worker runs,
+    and identical submissions are deduplicated across workers. Active jobs
+    that stop being updated for ``stale_after`` seconds (e.g. because their
+    worker died) no longer count for deduplication.
+    """
+
+    def __init__(self, db_path: str, stale_after: float = 600):
+        self.db_path = os.path.abspath(db_path)
+        self.stale_after = stale_after
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(JOB_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def save(self, job: Job):
+        state = job.to_state()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, job_key, state, active, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (job.id, job.key, json.dumps(state), 0 if job.finished else 1, state['updated_at'])
+            )
+
+    def load(self, job_id: str) -> Optional[Job]:
+        row = self._connect().execute("SELECT state FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return Job.from_state(job_id, json.loads(row[0])) if row else None
+
+    def find_active(self, key: str) -> Optional[Job]:
+        """Return a queued or running job with this key that is still being updated"""
+        row = self._connect().execute(
+            "SELECT job_id, state FROM jobs WHERE job_key = ? AND active = 1 AND updated_at > ? "
+            "ORDER BY updated_at DESC LIMIT 1",
+            (key, time.time() - self.stale_after)
+        ).fetchone()
+        return Job.from_state(row[0], json.loads(row[1])) if row else None
+
+    def prune(self, cutoff: float):
+        """Forget finished jobs last updated before the cutoff, and abandoned active ones"""
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM jobs WHERE updated_at < ? AND (active = 0 OR updated_at < ?)",
+                         (cutoff, time.time() - self.stale_after))
+
+
+class JobManager:
+    """Runs analysis jobs on a local worker pool and deduplicates in-flight work.
+
+    Jobs submitted with the key of a queued or running job are attached to
+    that job instead of starting new work. Finished jobs are kept for
+    ``job_ttl`` seconds so clients can fetch their results. With a
+    ``store``, job state is shared with the other server processes.
+    """
+
+    def __init__(self, runner: Callable[[Job], Optional[Dict]], max_workers: int = 2,
+                 job_ttl: float = 3600, store: Optional[JobStore] = None):
+        self.runner = runner
+        self.job_ttl = job_ttl
+        self.store = store
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis')
+        self._jobs: Dict[str, Job] = {}
+        self._active: Dict[str, Job] = {}
+        self._futures: Dict[str, Future] = {}  # Queued or running jobs by id
+        self._lock = threading.Lock()
+
+    def submit(self, key: str, params: Dict) -> Tuple[Job, bool]:
+        """Queue a job, returning (job, created) where created is False for a duplicate"""
+        with self._lock:
+            self._prune()
+            existing = self._active.get(key)
+            if existing is None and self.store is not None:
+                existing = self.store.find_active(key)
+            if existing is not None:
+                return existing, False
+
+            job = Job(key, params)
+            job.store = self.store
+            self._jobs[job.id] = job
+            self._active[key] = job
+            job._save()
+            self._futures[job.id] = self.executor.submit(self._run, job)
+        return job, True
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            job = self.store.load(job_id)
+        return job
+
+    def _run(self, job: Job):
+        job.start()
+        try:
+            job.complete(self.runner(job))
+        except Exception as e:
+            print(f"Error in job {job.id}: {str(e)}")
+            print(traceback.format_exc())
+            job.fail(str(e), getattr(e, 'status_code', 500))
+        finally:
+            # Drop the request parameters (including any token) once they are no longer needed
+            job.params = {}
+            with self._lock:
+                if self._active.get(job.key) is job:
+                    del self._active[job.key]
+                self._futures.pop(job.id, None)
+
+    def _prune(self):
+        """Forget finished jobs older than the TTL; caller must hold the lock"""
+        cutoff = time.time() - self.job_ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished and job.updated_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+        if self.store is not None:
+            self.store.prune(cutoff)
+
+    def shutdown(self, wait: bool = False):
+        """Stop the pool; with ``wait``, let running jobs finish.
+
+        Queued jobs are dropped and marked failed, so clients polling them
+        get an answer and their key no longer deduplicates new submissions.
+        """
+        with self._lock:
+            cancelled = [self._jobs[job_id] for job_id, future in self._futures.items() if future.cancel()]
+            for job in cancelled:
+                del self._futures[job.id]
+                if self._active.get(job.key) is job:
+                    del self._active[job.key]
+        for job in cancelled:
+            job.params = {}
+            job.fail('Server shutting down; please submit the job again', 503)
+        self.executor.shutdown(wait=wait, cancel_futures=True)
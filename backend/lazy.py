@@ -0,0 +1,36 @@
+import threading
+from typing import Any, Callable, Generic, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+class Lazy(Generic[T]):
+    """Stand-in for a service that is only built when it is first used.
+
+    Attribute access is forwarded to the object ``factory`` returns; the
+    factory runs once, under a lock, on the first access from any thread.
+    Keeping heavy imports inside the factory means importing a module that
+    holds Lazy services doesn't pay for them. Only ``loaded`` and ``load``
+    are handled by the proxy itself, so services must not define
+    attributes with those names.
+    """
+
+    def __init__(self, factory: Callable[[], T]):
+        self._factory = factory
+        self._instance: Optional[T] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._instance is not None
+
+    def load(self) -> T:
+        """Return the service, building it on first use"""
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+        return self._instance
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.load(), name)
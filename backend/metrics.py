@@ -0,0 +1,247 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Upper bounds in seconds, from cache lookups up to slow clones
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _format_labels(labelnames: Sequence[str], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    """Base class for metrics with an optional fixed set of label names"""
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._label_values(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                    for key, value in sorted(self._values.items())]
+
+
+class Gauge(Metric):
+    """Value computed when the metrics are scraped"""
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, function: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.function = function
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name} {_format_value(self.function())}"]
+
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple[str, ...], Dict] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            data = self._values.setdefault(key, {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data['counts'][i] += 1
+            data['sum'] += value
+            data['count'] += 1
+
+    def _samples(self) -> List[str]:
+        samples = []
+        with self._lock:
+            for key, data in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, data['counts']):
+                    labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                    samples.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+                samples.append(f"{self.name}_bucket{labels} {data['count']}")
+                labels = _format_labels(self.labelnames, key)
+                samples.append(f"{self.name}_sum{labels} {round(data['sum'], 6)}")
+                samples.append(f"{self.name}_count{labels} {data['count']}")
+        return samples
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'commitmind_stage_seconds', 'Time spent in each analysis stage', ['stage']))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    'commitmind_explanation_cache_lookups_total', 'Explanation cache lookups by result', ['result']))
+CACHE_TIER_HITS = REGISTRY.register(Counter(
+    'commitmind_explanation_cache_tier_hits_total', 'Explanation cache hits by cache tier', ['tier']))
+API_REQUESTS = REGISTRY.register(Counter(
+    'commitmind_openrouter_requests_total', 'OpenRouter API responses by HTTP status', ['status']))
+API_RETRIES = REGISTRY.register(Counter(
+    'commitmind_openrouter_retries_total', 'OpenRouter API requests retried, by reason', ['reason']))
+ANALYSES = REGISTRY.register(Counter(
+    'commitmind_analyses_total', 'Repository analyses by endpoint and outcome', ['endpoint', 'outcome']))
+RESULT_CACHE_LOOKUPS = REGISTRY.register(Counter(
+    'commitmind_result_cache_lookups_total', 'Analysis response cache lookups by result', ['result']))
+API_TOKENS = REGISTRY.register(Counter(
+    'commitmind_openrouter_tokens_total', 'Tokens used by OpenRouter requests, by model and kind', ['model', 'kind']))
+API_COST = REGISTRY.register(Counter(
+    'commitmind_openrouter_cost_usd_total', 'Estimated cost of OpenRouter requests in USD, by model', ['model']))
+BUDGET_EXHAUSTED = REGISTRY.register(Counter(
+    'commitmind_budget_exhausted_total', 'API requests skipped because a token budget was exhausted', ['scope']))
+WARM_RUNS = REGISTRY.register(Counter(
+    'commitmind_cache_warm_total', 'Background warming of watched repositories by outcome', ['outcome']))
+TRIVIAL_COMMITS = REGISTRY.register(Counter(
+    'commitmind_trivial_commits_total', 'Commits explained from a template without the API, by category',
+    ['category']))
+
+
+def _cache_hit_ratio() -> float:
+    hits = CACHE_LOOKUPS.value(result='hit')
+    total = hits + CACHE_LOOKUPS.value(result='miss')
+    return hits / total if total else 0.0
+
+
+CACHE_HIT_RATIO = REGISTRY.register(Gauge(
+    'commitmind_explanation_cache_hit_ratio', 'Share of explanation cache lookups that were hits',
+    _cache_hit_ratio))
+
+
+class RequestTimings:
+    """Per-request breakdown of stage timings and counters.
+
+    Stages that run on several worker threads at once (API calls, rate
+    limit waits) add up their time, so their totals can exceed wall time.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.stages: Dict[str, float] = {}
+        self.counts: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add_time(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def add_count(self, name: str, amount: float = 1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + amount
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            data = {
+                'total_seconds': round(time.monotonic() - self.started, 3),
+                'stages': {stage: round(seconds, 3) for stage, seconds in self.stages.items()},
+                **{name: round(value, 6) if isinstance(value, float) else value
+                   for name, value in self.counts.items()}
+            }
+        lookups = data.get('cache_hits', 0) + data.get('cache_misses', 0)
+        if lookups:
+            data['cache_hit_ratio'] = round(data.get('cache_hits', 0) / lookups, 3)
+        return data
+
+
+_current_timings: ContextVar[Optional[RequestTimings]] = ContextVar('request_timings', default=None)
+
+
+@contextmanager
+def track_request() -> Iterator[RequestTimings]:
+    """Collect timings of everything instrumented within the block for one request.
+
+    Work handed to thread pools is included when submitted with a copy of
+    the current context (``contextvars.copy_context().run``).
+    """
+    timings = RequestTimings()
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Time a block into the stage histogram and the current request's breakdown"""
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        record_time(stage, time.monotonic() - start)
+
+
+def record_time(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add_time(stage, seconds)
+
+
+def record_count(counter: Counter, name: str, amount: float = 1, **labels):
+    """Increment a counter and the matching count in the current request's breakdown"""
+    if amount:
+        counter.inc(amount, **labels)
+        timings = _current_timings.get()
+        if timings is not None:
+            timings.add_count(name, amount)
@@ -0,0 +1,39 @@
+from typing import Optional
+
+
+class ModelSpec:
+    """A model to send prompts to and its blended price in USD per million tokens"""
+
+    def __init__(self, name: str, price_per_million: float = 0.0):
+        self.name = name
+        self.price_per_million = price_per_million
+
+    def cost(self, tokens: int) -> float:
+        return tokens * self.price_per_million / 1_000_000
+
+
+class ModelRouter:
+    """Chooses the model for a prompt by its estimated size.
+
+    Prompts of fewer than ``large_min_tokens`` estimated input tokens go to
+    the ``small`` model, which is meant to be cheap and fast; larger ones go
+    to the ``large`` model, meant for its longer context. Without a large
+    model every prompt goes to the small one.
+    """
+
+    def __init__(self, small: ModelSpec, large: Optional[ModelSpec] = None, large_min_tokens: int = 400):
+        self.small = small
+        self.large = large if large is not None and large.name != small.name else None
+        self.large_min_tokens = large_min_tokens
+
+    def route(self, prompt_tokens: int) -> ModelSpec:
+        if self.large is not None and prompt_tokens >= self.large_min_tokens:
+            return self.large
+        return self.small
+
+    @property
+    def signature(self) -> str:
+        """Identifies the routing, so results are only reused under the same models"""
+        if self.large is None:
+            return self.small.name
+        return f"{self.small.name}|{self.large.name}@{self.large_min_tokens}"
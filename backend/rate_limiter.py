@@ -0,0 +1,178 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Mapping, Optional
+
+# Responses that mean the provider is overloaded rather than that the request was bad
+OVERLOAD_STATUSES = (429, 502, 503, 504)
+
+
+class TokenBucket:
+    """Thread-safe token bucket shared by every worker calling the same API.
+
+    Tokens refill continuously at ``rate`` per second up to ``capacity``, so
+    short bursts are allowed while the long-run request rate stays bounded.
+    """
+
+    def __init__(self, rate: float, capacity: int = 1):
+        if rate <= 0:
+            raise ValueError("Rate must be positive")
+        if capacity < 1:
+            raise ValueError("Capacity must be at least 1")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Take one token, returning how long the caller must wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Going negative reserves a future token, which keeps waiters in FIFO order
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self) -> float:
+        """Block until a token is available and return the time spent waiting"""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header, given as seconds or an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_reset(value: Optional[str]) -> Optional[float]:
+    """Seconds until a rate limit window resets.
+
+    Providers send X-RateLimit-Reset either as a Unix timestamp (in seconds
+    or milliseconds) or as seconds from now.
+    """
+    if not value:
+        return None
+    try:
+        reset = float(value)
+    except ValueError:
+        return None
+    if reset > 1e12:
+        reset /= 1000
+    if reset > 1e9:
+        reset -= time.time()
+    return max(0.0, reset)
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """Exponential backoff with full jitter, so retrying workers don't wake in lockstep"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class AdaptiveLimiter:
+    """Concurrency and pacing for a rate-limited API, tuned from its responses.
+
+    The number of requests in flight is capped by a limit that follows AIMD:
+    it starts low and doubles every round of requests until the first sign
+    of overload, after which every successful response raises it by about
+    one per round, and a 429, an overloaded gateway or a timeout halves it. Requests are
+    also paced by the token bucket. When responses report the remaining
+    quota (``X-RateLimit-Remaining`` and ``X-RateLimit-Reset``), no more
+    requests than that are started before the window resets, and after a
+    429 (honouring Retry-After) every caller is held back until the quota
+    resets, plus a little jitter so they don't all retry at once.
+    """
+
+    def __init__(self, rate_limiter: TokenBucket, max_concurrency: int = 8, min_concurrency: int = 1,
+                 initial_concurrency: int = 2, decrease_factor: float = 0.5,
+                 default_pause: float = 2.0, jitter: float = 0.25):
+        if not 1 <= min_concurrency <= max_concurrency:
+            raise ValueError("Concurrency bounds must satisfy 1 <= min <= max")
+        self.rate_limiter = rate_limiter
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.limit = float(min(max(initial_concurrency, min_concurrency), max_concurrency))
+        self.slow_start = True
+        self.decrease_factor = decrease_factor
+        self.default_pause = default_pause
+        self.jitter = jitter
+        self.in_flight = 0
+        self._paused_until = 0.0
+        # Requests the provider still accepts before _window_reset, if it told us
+        self._remaining: Optional[int] = None
+        self._window_reset = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> float:
+        """Block until a request may be sent and return the time spent waiting"""
+        start = time.monotonic()
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                if self._remaining is not None and now >= self._window_reset:
+                    self._remaining = None
+                if self._remaining is not None and self._remaining <= 0:
+                    self._paused_until = max(self._paused_until, self._window_reset)
+                if now < self._paused_until:
+                    self._condition.wait(self._paused_until - now + random.uniform(0, self.jitter))
+                elif self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    if self._remaining is not None:
+                        self._remaining -= 1
+                    break
+                else:
+                    self._condition.wait()
+        self.rate_limiter.acquire()
+        return time.monotonic() - start
+
+    def release(self, status: Optional[int] = None, headers: Optional[Mapping[str, str]] = None):
+        """Record the outcome of a request sent after acquire().
+
+        ``status`` is None when the request timed out or couldn't connect,
+        which is treated as a sign of overload, like 429 and gateway errors.
+        Only 2xx responses raise the limit; other statuses leave it as it is.
+        """
+        headers = headers or {}
+        with self._condition:
+            self.in_flight -= 1
+            if status is None or status in OVERLOAD_STATUSES:
+                self.limit = max(self.min_concurrency, self.limit * self.decrease_factor)
+                self.slow_start = False
+            elif 200 <= status < 300:
+                self.limit = min(self.max_concurrency, self.limit + (1 if self.slow_start else 1 / self.limit))
+
+            now = time.monotonic()
+            reset = parse_reset(headers.get('X-RateLimit-Reset'))
+            try:
+                remaining = int(headers.get('X-RateLimit-Remaining', ''))
+            except ValueError:
+                remaining = None
+            if remaining is not None and reset is not None:
+                # Requests still in flight may not be counted in the header yet
+                self._remaining = remaining - self.in_flight
+                self._window_reset = now + reset
+            if status == 429:
+                pause = parse_retry_after(headers.get('Retry-After')) or reset or self.default_pause
+                self._paused_until = max(self._paused_until, now + pause)
+            self._condition.notify_all()
+
+    def cancel(self):
+        """Give back the slot of a request that failed locally, without adjusting the limit"""
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
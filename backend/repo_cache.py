@@ -0,0 +1,417 @@
+import os
+import shutil
+import hashlib
+import threading
+import logging
+import time
+import base64
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; mirrors are then only locked within a process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Refspec used to keep a bare mirror's branches in sync with the remote
+BRANCH_REFSPEC = '+refs/heads/*:refs/heads/*'
+# Ref that receives revisions fetched on request, e.g. tags or commits outside the branches
+REQUESTED_REF = 'refs/commitmind/requested'
+
+# Partial clone filters per clone strategy; 'full' fetches every branch with all blobs
+CLONE_STRATEGIES = {
+    'full': None,
+    'blobless': 'blob:none',
+    'treeless': 'tree:0',
+}
+
+
+class GitError(Exception):
+    """Custom exception for Git-related errors"""
+    pass
+
+
+def open_git_repo(repo_path: str):
+    """Open a repository with GitPython, which is imported on first use because it is slow to load"""
+    from git import Repo
+    return Repo(repo_path)
+
+
+def is_local_source(source: str) -> bool:
+    """Whether a repository source is a local path (a checkout, bare repository or bundle) rather than a URL"""
+    return os.path.isabs(source)
+
+
+def is_bundle(source: str) -> bool:
+    return source.endswith('.bundle')
+
+
+def resolve_local_source(path: str, allowed_roots: List[str]) -> str:
+    """Return the real path of a local repository or bundle inside one of the allowed roots.
+
+    Symlinks and '..' are resolved before the check, so a path can't point
+    outside the allowed roots. Raises GitError if local sources are
+    disabled (no roots), the path is outside the roots or it doesn't exist.
+    """
+    if not allowed_roots:
+        raise GitError("Local repositories are not enabled on this server")
+    real_path = os.path.realpath(path)
+    roots = [os.path.realpath(root) for root in allowed_roots]
+    if not any(os.path.commonpath([root, real_path]) == root for root in roots):
+        raise GitError(f"Permission denied: {path} is not in an allowed local root")
+    if is_bundle(real_path):
+        if not os.path.isfile(real_path):
+            raise GitError(f"Bundle not found: {path}")
+    elif not os.path.isdir(real_path):
+        raise GitError(f"Repository not found: {path}")
+    return real_path
+
+
+def bundle_head(path: str) -> Tuple[str, str]:
+    """Return the ref a bundle's history is read from and the commit it points at.
+
+    ``git bundle create x.bundle main`` records only ``refs/heads/main``
+    and no HEAD. Without HEAD the bundle's only branch is used, or with
+    several branches the default one (``init.defaultBranch``, then main,
+    then master). Raises GitError if none of them is in the bundle.
+    """
+    from git import Git, GitCommandError
+
+    try:
+        output = Git().bundle('list-heads', path)
+    except GitCommandError as e:
+        raise GitError(f"Could not read bundle {path}: {e.stderr.strip() if e.stderr else e}")
+    heads = {}
+    for line in output.splitlines():
+        sha, ref = line.split(maxsplit=1)
+        heads[ref] = sha
+    if 'HEAD' in heads:
+        return 'HEAD', heads['HEAD']
+
+    branches = [ref for ref in heads if ref.startswith('refs/heads/')]
+    if len(branches) == 1:
+        return branches[0], heads[branches[0]]
+    try:
+        default_branch = Git().config('--get', 'init.defaultBranch')
+    except GitCommandError:
+        default_branch = None
+    for name in (default_branch, 'main', 'master'):
+        if name and f'refs/heads/{name}' in heads:
+            return f'refs/heads/{name}', heads[f'refs/heads/{name}']
+    raise GitError(f"Could not resolve HEAD for bundle {path}: it has no HEAD and no default branch")
+
+
+def normalize_repo_url(repo_url: str) -> str:
+    """Normalize a repository URL so equivalent spellings share one mirror"""
+    repo_url = repo_url.strip()
+    parsed = urlparse(repo_url)
+    if parsed.scheme not in ('http', 'https'):
+        return repo_url.rstrip('/')
+
+    # Drop credentials and the www. prefix, ignore trailing slashes and .git
+    host = parsed.netloc.rsplit('@', 1)[-1].lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    path = parsed.path.rstrip('/')
+    if path.endswith('.git'):
+        path = path[:-4]
+    # GitHub owner and repository names are case-insensitive
+    if host == 'github.com':
+        path = path.lower()
+    return f"https://{host}{path}"
+
+
+def authenticated_url(repo_url: str, github_token: Optional[str] = None) -> str:
+    """Return the URL to hand to git, embedding the token for GitHub remotes"""
+    if github_token and repo_url.startswith('https://github.com/'):
+        return f'https://{github_token}@github.com/{repo_url[19:]}'
+    return repo_url
+
+
+def auth_env(repo_url: str, github_token: Optional[str] = None) -> Dict[str, str]:
+    """Environment that passes the token to git as an HTTP header for GitHub remotes.
+
+    Partial clones fetch missing objects from the configured ``origin``
+    remote, so the token can't travel in the URL; git reads the header from
+    GIT_CONFIG_* variables instead, which also keeps it off the command line.
+    """
+    if not github_token or not repo_url.startswith('https://github.com/'):
+        return {}
+    credentials = base64.b64encode(f"x-access-token:{github_token}".encode()).decode()
+    return {
+        'GIT_CONFIG_COUNT': '1',
+        'GIT_CONFIG_KEY_0': 'http.https://github.com/.extraheader',
+        'GIT_CONFIG_VALUE_0': f'Authorization: Basic {credentials}',
+    }
+
+
+@contextmanager
+def file_lock(path: str, blocking: bool = True) -> Iterator[bool]:
+    """Hold an exclusive advisory lock on ``path`` across processes.
+
+    Yields whether the lock was acquired; without ``blocking`` the block
+    runs immediately and yields False if another process holds the lock.
+    """
+    if fcntl is None:
+        yield True
+        return
+    with open(path, 'a') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def get_dir_size(path: str) -> int:
+    """Total size in bytes of the files below a directory"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class RepoMirrorStore:
+    """Keyed on-disk store of bare repository mirrors.
+
+    Each normalized repository URL maps to one bare mirror that is cloned on
+    first use and fetched incrementally afterwards. Access to a mirror is
+    serialized with a per-repository lock, held both between threads and,
+    through a lock file, between server worker processes. The least recently
+    used mirrors are evicted once the store grows beyond ``max_bytes``.
+
+    Mirrors are created with one of the ``CLONE_STRATEGIES``. Partial
+    strategies clone only the default branch and leave out blobs (or trees),
+    which git then fetches on demand from ``origin``.
+    """
+
+    def __init__(self, root_dir: str, max_bytes: int = 2 * 1024 ** 3, clone_depth: int = 50):
+        self.root_dir = os.path.abspath(root_dir)
+        self.max_bytes = max_bytes
+        self.clone_depth = clone_depth
+        os.makedirs(self.root_dir, exist_ok=True)
+
+        self._registry_lock = threading.Lock()
+        self._locks: Dict[str, threading.Lock] = {}
+        self._in_use: Dict[str, int] = {}
+        self._sizes: Dict[str, int] = {}
+
+    def _get_key(self, repo_url: str, strategy: str = 'full') -> str:
+        """Generate the store key for a repository URL and clone strategy"""
+        name = normalize_repo_url(repo_url)
+        if strategy != 'full':
+            name = f"{name}#{strategy}"
+        return hashlib.md5(name.encode()).hexdigest()
+
+    def _get_path(self, key: str) -> str:
+        return os.path.join(self.root_dir, f"{key}.git")
+
+    def _get_lock_path(self, key: str) -> str:
+        return os.path.join(self.root_dir, f"{key}.lock")
+
+    @contextmanager
+    def mirror(self, repo_url: str, github_token: Optional[str] = None, strategy: str = 'full',
+               stats: Optional[Dict] = None) -> Iterator[str]:
+        """Yield the path of an up-to-date bare mirror of the repository.
+
+        The per-repository lock is held until the context exits, so callers
+        should only read from the mirror inside the ``with`` block. If
+        ``stats`` is given it receives the operation, its duration and the
+        bytes of objects transferred.
+        """
+        if strategy not in CLONE_STRATEGIES:
+            raise ValueError(f"Unknown clone strategy: {strategy}")
+
+        key = self._get_key(repo_url, strategy)
+        with self._registry_lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+            self._in_use[key] = self._in_use.get(key, 0) + 1
+
+        try:
+            with lock, file_lock(self._get_lock_path(key)):
+                repo_path = self._get_path(key)
+                start = time.monotonic()
+                if os.path.isdir(repo_path):
+                    operation = 'fetch'
+                    size_before = get_dir_size(os.path.join(repo_path, 'objects'))
+                    self._fetch(repo_path, repo_url, github_token, strategy)
+                else:
+                    operation = 'clone'
+                    size_before = 0
+                    self._clone(repo_path, repo_url, github_token, strategy)
+                if is_bundle(repo_url):
+                    self._set_bundle_head(repo_path, repo_url)
+                os.utime(repo_path)
+                self._sizes[key] = get_dir_size(repo_path)
+
+                if stats is not None:
+                    stats.update({
+                        'strategy': strategy,
+                        'operation': operation,
+                        'seconds': round(time.monotonic() - start, 3),
+                        'bytes_transferred': max(0, get_dir_size(os.path.join(repo_path, 'objects')) - size_before)
+                    })
+                yield repo_path
+        finally:
+            with self._registry_lock:
+                self._in_use[key] -= 1
+                if not self._in_use[key]:
+                    del self._in_use[key]
+            self.evict()
+
+    def _clone(self, repo_path: str, repo_url: str, github_token: Optional[str], strategy: str = 'full'):
+        """Create a new bare mirror, publishing it only once the clone succeeded"""
+        staging_path = f"{repo_path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        shutil.rmtree(staging_path, ignore_errors=True)
+        logger.info(f"Creating {strategy} mirror for {normalize_repo_url(repo_url)}")
+        from git import Repo
+
+        try:
+            if strategy == 'full':
+                repo = Repo.clone_from(
+                    authenticated_url(repo_url, github_token),
+                    staging_path,
+                    bare=True,
+                    # A bundle is already on disk; take all of its history rather than deepening later
+                    depth=None if is_local_source(repo_url) else self.clone_depth,
+                    no_single_branch=True
+                )
+                # Never persist the access token in the mirror's config
+                repo.git.remote('set-url', 'origin', repo_url)
+            else:
+                # Only the default branch, without the objects excluded by the filter
+                Repo.clone_from(
+                    repo_url,
+                    staging_path,
+                    bare=True,
+                    depth=self.clone_depth,
+                    single_branch=True,
+                    filter=CLONE_STRATEGIES[strategy],
+                    env=auth_env(repo_url, github_token)
+                )
+            os.rename(staging_path, repo_path)
+        finally:
+            shutil.rmtree(staging_path, ignore_errors=True)
+
+    def _fetch(self, repo_path: str, repo_url: str, github_token: Optional[str], strategy: str = 'full'):
+        """Bring an existing mirror up to date with the remote.
+
+        The fetch always goes to the network with the caller's credentials, so
+        a mirror of a private repository is only served to callers who can
+        still read it.
+        """
+        logger.info(f"Fetching updates for {normalize_repo_url(repo_url)}")
+        repo = open_git_repo(repo_path)
+        if strategy == 'full':
+            repo.git.fetch(
+                '--prune', '--no-tags',
+                authenticated_url(repo_url, github_token),
+                BRANCH_REFSPEC
+            )
+        else:
+            # Partial clones must fetch from origin, where the filter is configured
+            branch = repo.git.symbolic_ref('--short', 'HEAD')
+            repo.git.fetch(
+                '--prune', '--no-tags', 'origin',
+                f'+refs/heads/{branch}:refs/heads/{branch}',
+                env=auth_env(repo_url, github_token)
+            )
+
+    def _set_bundle_head(self, repo_path: str, bundle_path: str):
+        """Point the mirror's HEAD at the bundle's branch when the bundle records no HEAD"""
+        ref, _ = bundle_head(bundle_path)
+        if ref != 'HEAD':
+            open_git_repo(repo_path).git.symbolic_ref('HEAD', ref)
+
+    def is_shallow(self, repo_path: str) -> bool:
+        return os.path.exists(os.path.join(repo_path, 'shallow'))
+
+    def deepen(self, repo_path: str, repo_url: str, github_token: Optional[str], strategy: str, commits: int):
+        """Fetch ``commits`` more commits of history below the shallow boundary.
+
+        Must be called while the mirror is held through ``mirror()``.
+        """
+        logger.info(f"Deepening {normalize_repo_url(repo_url)} by {commits} commits")
+        repo = open_git_repo(repo_path)
+        if strategy == 'full':
+            repo.git.fetch(f'--deepen={commits}', '--no-tags', authenticated_url(repo_url, github_token),
+                           BRANCH_REFSPEC)
+        else:
+            branch = repo.git.symbolic_ref('--short', 'HEAD')
+            repo.git.fetch(f'--deepen={commits}', '--no-tags', 'origin',
+                           f'+refs/heads/{branch}:refs/heads/{branch}', env=auth_env(repo_url, github_token))
+        self._sizes.pop(self._key_for_path(repo_path), None)
+
+    def fetch_revision(self, repo_path: str, repo_url: str, github_token: Optional[str], strategy: str,
+                       revision: str) -> str:
+        """Fetch a ref or commit the mirror lacks into REQUESTED_REF and return that ref.
+
+        Must be called while the mirror is held through ``mirror()``.
+        """
+        logger.info(f"Fetching {revision} for {normalize_repo_url(repo_url)}")
+        repo = open_git_repo(repo_path)
+        args = ['--no-tags']
+        if self.is_shallow(repo_path):
+            args.append(f'--depth={self.clone_depth}')
+        if strategy == 'full':
+            repo.git.fetch(*args, authenticated_url(repo_url, github_token), f'+{revision}:{REQUESTED_REF}')
+        else:
+            repo.git.fetch(*args, 'origin', f'+{revision}:{REQUESTED_REF}', env=auth_env(repo_url, github_token))
+        self._sizes.pop(self._key_for_path(repo_path), None)
+        return REQUESTED_REF
+
+    def _key_for_path(self, repo_path: str) -> str:
+        return os.path.basename(repo_path)[:-len('.git')]
+
+    def evict(self):
+        """Remove least recently used mirrors until the store fits in max_bytes"""
+        trash = []
+        with self._registry_lock:
+            mirrors = []
+            for name in os.listdir(self.root_dir):
+                if not name.endswith('.git'):
+                    continue
+                key = name[:-4]
+                path = self._get_path(key)
+                if key not in self._sizes:
+                    self._sizes[key] = get_dir_size(path)
+                try:
+                    last_used = os.path.getmtime(path)
+                except OSError:
+                    continue
+                mirrors.append((last_used, key, path))
+
+            total = sum(self._sizes.get(key, 0) for _, key, _ in mirrors)
+            for _, key, path in sorted(mirrors):
+                if total <= self.max_bytes:
+                    break
+                if self._in_use.get(key):
+                    continue
+                # Renaming is atomic, so the slow delete can happen outside the lock
+                trash_path = f"{path}.evicted-{time.time_ns()}"
+                with file_lock(self._get_lock_path(key), blocking=False) as acquired:
+                    if not acquired:
+                        continue  # In use by another worker process
+                    try:
+                        os.rename(path, trash_path)
+                    except OSError as e:
+                        logger.warning(f"Failed to evict mirror {key}: {str(e)}")
+                        continue
+                total -= self._sizes.pop(key, 0)
+                self._locks.pop(key, None)
+                trash.append(trash_path)
+
+        for path in trash:
+            shutil.rmtree(path, ignore_errors=True)
+            logger.info(f"Evicted mirror {os.path.basename(path)}")
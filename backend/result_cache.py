@@ -0,0 +1,103 @@
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    request_key TEXT PRIMARY KEY,
+    etag TEXT NOT NULL,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_results_created_at ON results (created_at);
+"""
+
+
+def make_etag(body: str) -> str:
+    """Strong ETag for a serialized response body"""
+    return '"' + hashlib.sha256(body.encode()).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header value lists the ETag"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or etag in tags or f"W/{etag}" in tags
+
+
+class ResultCache:
+    """SQLite-backed cache of complete analysis responses.
+
+    Entries are keyed by a request key that pins the repository state (the
+    resolved HEAD), the options and the caller's token identity, so an
+    entry never has to be invalidated: a push changes HEAD and therefore
+    the key. Entries expire after ``ttl_seconds`` and only the
+    ``max_entries`` newest are kept.
+    """
+
+    def __init__(self, db_path: str, ttl_seconds: float = 24 * 3600, max_entries: int = 1000):
+        self.db_path = os.path.abspath(db_path)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, request_key: str) -> Optional[Tuple[str, Dict]]:
+        """Return (etag, response) for the request key, or None"""
+        row = self._connect().execute(
+            "SELECT etag, response FROM results WHERE request_key = ? AND created_at > ?",
+            (request_key, time.time() - self.ttl_seconds)
+        ).fetchone()
+        if row is None:
+            return None
+        try:
+            return row[0], json.loads(row[1])
+        except ValueError:
+            return None
+
+    def age(self, request_key: str) -> Optional[float]:
+        """Seconds since the unexpired response for the request key was stored, or None"""
+        row = self._connect().execute(
+            "SELECT created_at FROM results WHERE request_key = ? AND created_at > ?",
+            (request_key, time.time() - self.ttl_seconds)
+        ).fetchone()
+        return time.time() - row[0] if row else None
+
+    def put(self, request_key: str, response: Dict) -> str:
+        """Store a response and return its ETag.
+
+        The ETag is a hash of the stored body, so a response replaced under
+        the same key (e.g. with explanations that were missing) gets a new one.
+        """
+        body = json.dumps(response, sort_keys=True)
+        etag = make_etag(body)
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (request_key, etag, response, created_at) VALUES (?, ?, ?, ?)",
+                (request_key, etag, body, time.time())
+            )
+            conn.execute(
+                "DELETE FROM results WHERE created_at <= ? OR request_key IN ("
+                "SELECT request_key FROM results ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (time.time() - self.ttl_seconds, self.max_entries)
+            )
+        return etag
@@ -0,0 +1,123 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+
+class BudgetExceeded(Exception):
+    """Raised when a request doesn't fit in what is left of a token or cost budget"""
+    def __init__(self, scope: str):
+        super().__init__(f"The {scope} token budget is exhausted")
+        self.scope = scope
+
+
+class TokenBudget:
+    """Allowance of API tokens and cost, optionally renewed every ``period_seconds``.
+
+    Callers reserve an estimate before a request and settle it with the
+    usage the API reports afterwards, so concurrent requests can't overspend
+    the allowance between them. A limit of 0 means unlimited.
+    """
+
+    def __init__(self, max_tokens: int = 0, max_cost: float = 0.0, period_seconds: Optional[float] = None,
+                 scope: str = 'period'):
+        self.max_tokens = max_tokens
+        self.max_cost = max_cost
+        self.period_seconds = period_seconds
+        self.scope = scope
+        self.tokens = 0
+        self.cost = 0.0
+        self._period_start = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def limited(self) -> bool:
+        return bool(self.max_tokens or self.max_cost)
+
+    def _renew(self):
+        """Start a new period once the current one is over; caller must hold the lock"""
+        if self.period_seconds and time.monotonic() - self._period_start >= self.period_seconds:
+            self._period_start = time.monotonic()
+            self.tokens, self.cost = 0, 0.0
+
+    def reserve(self, tokens: int, cost: float) -> bool:
+        """Set aside an estimated amount, returning False if it doesn't fit what is left"""
+        with self._lock:
+            self._renew()
+            if (self.max_tokens and self.tokens + tokens > self.max_tokens) or \
+                    (self.max_cost and self.cost + cost > self.max_cost):
+                return False
+            self.tokens += tokens
+            self.cost += cost
+            return True
+
+    def settle(self, reserved_tokens: int, reserved_cost: float, tokens: int, cost: float):
+        """Replace a reservation by the amount actually used (0 to release it)"""
+        with self._lock:
+            self.tokens = max(0, self.tokens - reserved_tokens + tokens)
+            self.cost = max(0.0, self.cost - reserved_cost + cost)
+
+    def remaining(self) -> Dict:
+        """Tokens and cost left in the current period; None where unlimited"""
+        with self._lock:
+            self._renew()
+            return {
+                'tokens': self.max_tokens - self.tokens if self.max_tokens else None,
+                'cost': round(self.max_cost - self.cost, 6) if self.max_cost else None
+            }
+
+
+class Reservation:
+    """Amount reserved in one or more budgets for a single API request"""
+
+    def __init__(self, budgets: List[TokenBudget], tokens: int, cost: float):
+        self.budgets = budgets
+        self.tokens = tokens
+        self.cost = cost
+
+    def settle(self, tokens: int, cost: float):
+        for budget in self.budgets:
+            budget.settle(self.tokens, self.cost, tokens, cost)
+
+    def release(self):
+        self.settle(0, 0.0)
+
+
+def reserve(budgets: List[Optional[TokenBudget]], tokens: int, cost: float) -> Reservation:
+    """Reserve the amount in every budget, or in none of them.
+
+    Raises BudgetExceeded naming the first budget without room left.
+    """
+    reserved: List[TokenBudget] = []
+    for budget in budgets:
+        if budget is None or not budget.limited:
+            continue
+        if not budget.reserve(tokens, cost):
+            for done in reserved:
+                done.settle(tokens, cost, 0, 0.0)
+            raise BudgetExceeded(budget.scope)
+        reserved.append(budget)
+    return Reservation(reserved, tokens, cost)
+
+
+_request_budget: ContextVar[Optional[TokenBudget]] = ContextVar('request_budget', default=None)
+
+
+@contextmanager
+def request_budget(max_tokens: int = 0, max_cost: float = 0.0) -> Iterator[TokenBudget]:
+    """Limit the tokens and cost of the API requests made within the block for one request.
+
+    Like request timings, the budget follows work handed to thread pools
+    with a copy of the current context.
+    """
+    budget = TokenBudget(max_tokens, max_cost, scope='request')
+    token = _request_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _request_budget.reset(token)
+
+
+def current_request_budget() -> Optional[TokenBudget]:
+    return _request_budget.get()
@@ -18,6 +18,9 @@ document.addEventListener('DOMContentLoaded', () => {
     // Configuration
     const API_PORTS = [5001, 5002, 5003, 5004, 5005];
     let API_BASE_URL = null;
+    let currentCommits = [];
+    // Last complete result per repository and token, revalidated with its ETag
+    const cachedAnalyses = new Map();
 
     // GitHub authentication state
     let githubToken = localStorage.getItem('github_token');
@@ -196,24 +199,28 @@ document.addEventListener('DOMContentLoaded', () => {
     dateFilter.addEventListener('change', filterCommits);
     searchFilter.addEventListener('input', filterCommits);
 
+    function renderCommit(commit) {
+        const template = document.getElementById('commit-template');
+        const commitElement = template.content.cloneNode(true);
+
+        commitElement.querySelector('.commit-title').textContent = commit.message;
+        commitElement.querySelector('.commit-author').textContent = commit.author;
+        commitElement.querySelector('.commit-date').textContent = new Date(commit.date).toLocaleDateString();
+        commitElement.querySelector('.commit-hash span').textContent = commit.hash.substring(0, 7);
+        commitElement.querySelector('.commit-explanation').textContent = commit.explanation;
+
+        return commitElement;
+    }
+
     function displayCommits(commits, isNewAnalysis = false) {
         if (isNewAnalysis) {
             currentCommits = commits;
         }
 
         commitsContainer.innerHTML = '';
-        const template = document.getElementById('commit-template');
 
         commits.forEach(commit => {
-            const commitElement = template.content.cloneNode(true);
-
-            commitElement.querySelector('.commit-title').textContent = commit.message;
-            commitElement.querySelector('.commit-author').textContent = commit.author;
-            commitElement.querySelector('.commit-date').textContent = new Date(commit.date).toLocaleDateString();
-            commitElement.querySelector('.commit-hash span').textContent = commit.hash.substring(0, 7);
-            commitElement.querySelector('.commit-explanation').textContent = commit.explanation;
-
-            commitsContainer.appendChild(commitElement);
+            commitsContainer.appendChild(renderCommit(commit));
         });
 
         if (commits.length === 0) {
@@ -221,6 +228,49 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    // Insert a streamed commit card, keeping cards in repository order
+    function appendCommit(commit, index) {
+        const commitElement = renderCommit(commit);
+        const card = commitElement.querySelector('.commit-card');
+        card.dataset.index = index;
+
+        const next = Array.from(commitsContainer.querySelectorAll('.commit-card'))
+            .find(element => Number(element.dataset.index) > index);
+        commitsContainer.insertBefore(commitElement, next || null);
+    }
+
+    // Read Server-Sent Events from a fetch response body
+    async function readEventStream(response, onEvent) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const message = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let event = 'message';
+                const dataLines = [];
+                message.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) {
+                        event = line.slice(6).trim();
+                    } else if (line.startsWith('data:')) {
+                        dataLines.push(line.slice(5).trim());
+                    }
+                });
+                if (dataLines.length > 0) {
+                    onEvent(event, JSON.parse(dataLines.join('\n')));
+                }
+            }
+        }
+    }
+
     function updateProgress(status, detail, progress) {
         progressStatus.textContent = status;
         progressDetail.textContent = detail;
@@ -256,11 +306,14 @@ document.addEventListener('DOMContentLoaded', () => {
 
             updateProgress('Analyzing repository...', 'This may take a few minutes', 0);
 
-            const response = await fetch(`${API_BASE_URL}/analyze`, {
+            const cacheKey = `${repoUrl}#${githubToken || ''}`;
+            const cached = cachedAnalyses.get(cacheKey);
+            const response = await fetch(`${API_BASE_URL}/analyze/stream`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
-                    ...(githubToken && { 'Authorization': `Bearer ${githubToken}` })
+                    ...(githubToken && { 'Authorization': `Bearer ${githubToken}` }),
+                    ...(cached && { 'If-None-Match': cached.etag })
                 },
                 body: JSON.stringify({
                     repo_url: repoUrl,
@@ -268,17 +321,69 @@ document.addEventListener('DOMContentLoaded', () => {
                 })
             });
 
+            if (response.status === 304 && cached) {
+                // Repository unchanged since the last analysis
+                currentCommits = cached.commits.slice();
+                currentCommits.forEach((commit, index) => appendCommit(commit, index));
+                filterSection.style.display = 'block';
+                shareButton.style.display = 'block';
+                return;
+            }
+
             if (!response.ok) {
                 const error = await response.json();
                 throw new Error(error.error || 'Failed to analyze repository');
             }
 
-            const data = await response.json();
-            if (data.errors && data.errors.length > 0) {
-                console.warn('Some commits could not be analyzed:', data.errors);
+            currentCommits = [];
+            let total = 0;
+            let received = 0;
+            let streamError = null;
+            let etag = null;
+
+            await readEventStream(response, (event, data) => {
+                switch (event) {
+                    case 'status':
+                        if (data.stage === 'cloning') {
+                            updateProgress('Fetching repository...', 'Syncing the latest commits', 5);
+                        } else if (data.stage === 'cloned') {
+                            updateProgress('Reading commits...', 'Repository is up to date', 10);
+                        }
+                        break;
+                    case 'commits':
+                        total = data.total;
+                        updateProgress('Generating explanations...', `0 of ${total} commits explained`, 10);
+                        break;
+                    case 'commit':
+                        received += 1;
+                        currentCommits[data.index] = data.commit;
+                        appendCommit(data.commit, data.index);
+                        shareButton.style.display = 'block';
+                        updateProgress('Generating explanations...', `${received} of ${total} commits explained`,
+                            10 + Math.round(90 * received / Math.max(total, 1)));
+                        break;
+                    case 'done':
+                        etag = data.etag;
+                        if (data.errors && data.errors.length > 0) {
+                            console.warn('Some commits could not be analyzed:', data.errors);
+                        }
+                        break;
+                    case 'error':
+                        streamError = data.error;
+                        break;
+                }
+            });
+
+            if (streamError) {
+                throw new Error(streamError);
             }
 
-            displayCommits(data.commits, true);
+            currentCommits = currentCommits.filter(Boolean);
+            if (etag) {
+                cachedAnalyses.set(cacheKey, { etag, commits: currentCommits.slice() });
+            } else {
+                cachedAnalyses.delete(cacheKey);
+            }
             filterSection.style.display = 'block';
             shareButton.style.display = 'block';
         } catch (error) {